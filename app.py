@@ -2,6 +2,7 @@ import streamlit as st
 import subprocess
 import re
 import os
+import uuid
 from dotenv import load_dotenv
 from pathlib import Path
 import sys
@@ -145,6 +146,12 @@ with st.sidebar:
             help='Aktiviert die Nutzung von Proxy-Servern für anonymere Recherche. Kann die Geschwindigkeit reduzieren, aber Geo-Blocking umgehen. Standard: Aktiviert für bessere Anonymität.'
         )
         
+        prefetch_results = st.checkbox(
+            '⚡ Top-Suchergebnisse vorab laden',
+            value=False,
+            help='Lädt die ersten Treffer jeder Suche im Hintergrund, während der Agent die Ergebnisliste liest. Spart Wartezeit beim Seitenbesuch, erzeugt aber zusätzliche Anfragen.'
+        )
+        
         st.markdown("---")
         st.markdown("**🔄 Recherche-Runden Konfiguration**")
         
@@ -262,7 +269,7 @@ def run_research_query(model: str, question: str, max_steps: int, verbosity: int
                text_limit: int, reasoning_effort: str, max_completion_tokens: int,
                ddg_max_results: int, ddg_region: str, ddg_safesearch: str, use_proxy: bool = False,
                max_search_rounds: int = 5, api_key: str = '', hf_token: str = '',
-               status_callback=None):
+               prefetch_results: bool = False, status_callback=None):
     import threading
     import litellm
     from dotenv import load_dotenv
@@ -270,16 +277,29 @@ def run_research_query(model: str, question: str, max_steps: int, verbosity: int
     from scripts.text_inspector_tool import TextInspectorTool
     from scripts.text_web_browser import (
         ArchiveSearchTool,
+        BatchSearchTool,
         FinderTool,
         FindNextTool,
         PageDownTool,
         PageUpTool,
+        RelevantSectionTool,
         SearchInformationTool,
         SimpleTextBrowser,
+        VisitPagesTool,
         VisitTool,
     )
     from scripts.visual_qa import visualizer
+    from scripts.browser_tabs import TabbedBrowser
     from scripts.proxy_manager import ProxyManager
+    from scripts.http_pool import get_pool
+    from scripts.domain_health import get_domain_health
+    from scripts.http_cache import HttpCache
+    from scripts.http_retry import RetryPolicy
+    from scripts.near_duplicates import NearDuplicates, get_fingerprint_store
+    from scripts.page_cache import PageCache
+    from scripts.prefetch import Prefetcher
+    from scripts.search_results import SearchReranker
+    from scripts.single_flight import single_flight_stats
     from smolagents import (
         CodeAgent,
         LiteLLMModel,
@@ -454,22 +474,47 @@ def run_research_query(model: str, question: str, max_steps: int, verbosity: int
             **proxy_kwargs  # Verwende leeres Dict als Fallback
         },
         "serpapi_key": os.getenv("SERPAPI_API_KEY"),
+        "prefetcher": Prefetcher(top_n=3) if prefetch_results else None,
+        # Gemeinsame, persistente Statistik je Domain: langsame/blockierte Quellen werden gemieden
+        "domain_health": get_domain_health(),
+        # Von allen Tabs gemeinsam genutzter Seiten-Cache
+        "page_cache": PageCache(),
+        # Fast identische Seiten (Syndizierung, Spiegel) nur einmal lesen; Fingerprints sitzungsübergreifend
+        "near_duplicates": NearDuplicates(get_fingerprint_store()),
+        # Suchergebnisse lokal nach Relevanz für Frage und Rundenstrategie sortieren (BM25 + Domain-Health)
+        "search_reranker": SearchReranker(),
     }
     os.makedirs(f"./{BROWSER_CONFIG['downloads_folder']}", exist_ok=True)
+    # Gemeinsamer Antwort-Cache für alle Sessions und Streamlit-Worker
+    http_pool = get_pool()
+    if http_pool.cache is None:
+        http_pool.cache = HttpCache("http_cache")
     progress("Browser wird initialisiert...")
-    browser = SimpleTextBrowser(**BROWSER_CONFIG)
-    browser.ddg_max_results = ddg_max_results
-    browser.ddg_region = ddg_region
-    browser.ddg_safesearch = ddg_safesearch
+
+    def new_tab():
+        tab = SimpleTextBrowser(**BROWSER_CONFIG)
+        tab.ddg_max_results = ddg_max_results
+        tab.ddg_region = ddg_region
+        tab.ddg_safesearch = ddg_safesearch
+        return tab
+
+    # Ein Tab je parallelem Tool-Aufruf, damit sich gleichzeitige Seitenaufrufe nicht überschreiben
+    browser = TabbedBrowser(new_tab)
     progress("Recherche-Tools werden initialisiert...")
     document_inspection_tool = TextInspectorTool(model_instance, text_limit)
     WEB_TOOLS = [
         SearchInformationTool(browser),
-        VisitTool(browser),
+        # Mehrere Suchanfragen parallel, Ergebnisse nach kanonischer URL zusammengeführt
+        BatchSearchTool(browser),
+        # Langsame Seiten: nach p95-Latenz des Hosts einen zweiten Versuch parallel starten
+        VisitTool(browser, retry_policy=RetryPolicy(hedge=True)),
+        # Mehrere Seiten gleichzeitig laden und jeweils nur einen Ausschnitt zurückgeben
+        VisitPagesTool(browser, retry_policy=RetryPolicy(hedge=True)),
         PageUpTool(browser),
         PageDownTool(browser),
         FinderTool(browser),
         FindNextTool(browser),
+        RelevantSectionTool(browser),
         ArchiveSearchTool(browser),
         document_inspection_tool,
     ]
@@ -572,6 +617,7 @@ Fokus für Runde {round_num}:
 """
             
             clean_question = safe_unicode_convert(search_strategy)
+            BROWSER_CONFIG["search_reranker"].set_context(question, clean_question)
             
             progress(f"🔍 Runde {round_num}: Search-Agent startet Internetrecherche...")
             
@@ -675,6 +721,20 @@ Der Report soll strukturiert und informativ sein, auch wenn keine aktuellen Inte
 
 Falls das Problem weiterhin besteht, wenden Sie sich an den Support."""
     
+    pool_stats = http_pool.stats()
+    progress(f"🔌 HTTP-Pool: {pool_stats['requests']} Anfragen, {pool_stats['reused_connections']} wiederverwendete Verbindungen")
+    if browser.prefetcher is not None:
+        prefetch_stats = browser.prefetcher.stats()
+        progress(f"⚡ Vorab geladen: {prefetch_stats['completed']} Seiten, Trefferquote {prefetch_stats['hit_rate']:.0%}")
+        browser.prefetcher.close()
+    if pool_stats["cache"]:
+        progress(f"💾 HTTP-Cache: {pool_stats['cache']['hits'] + pool_stats['cache']['revalidated']} Treffer, {pool_stats['cache']['misses']} Fehlzugriffe")
+    coalesced = {name: s["coalesced"] for name, s in single_flight_stats().items() if s["coalesced"]}
+    if coalesced:
+        progress("🔁 Zusammengelegte Anfragen: " + ", ".join(f"{name} {count}" for name, count in coalesced.items()))
+    throttled = {host: s for host, s in pool_stats["rate_limits"].items() if s["waited"] or s["deferrals"]}
+    if throttled:
+        progress("🚦 Rate-Limits: " + ", ".join(f"{host} {s['wait_seconds']:.1f}s gewartet" for host, s in throttled.items()))
     progress("🎉 Recherche abgeschlossen! Report wird angezeigt.")
     return answer
 
@@ -754,7 +814,9 @@ if submitted:
             if progress_value > current_progress:
                 progress_bar.progress(progress_value)
                 status_callback._current_progress = progress_value
-        with st.spinner('⏳ Bitte warten, die Anfrage wird bearbeitet...'):
+        from scripts.rate_limiter import rate_limit_session
+        # Eigene Rate-Limit-Session je Anfrage, damit parallele Nutzer fair bedient werden
+        with st.spinner('⏳ Bitte warten, die Anfrage wird bearbeitet...'), rate_limit_session(str(uuid.uuid4())):
             result = run_research_query(
                 model, question, max_steps, verbosity, planning_interval,
                 text_limit, reasoning_effort, max_completion_tokens,
@@ -763,6 +825,7 @@ if submitted:
                 ddg_safesearch=safesearch,
                 use_proxy=use_proxy,
                 max_search_rounds=max_search_rounds,
+                prefetch_results=prefetch_results,
                 api_key=api_key,
                 hf_token=hf_token,
                 status_callback=status_callback
@@ -0,0 +1,80 @@
+"""Benchmark of the viewport pagination on large page texts.
+
+Compares the previous character-by-character _split_pages loop with ViewportPages on prose and
+on text without whitespace (minified scripts, broken PDF extraction), 10 to 50 MB each.
+
+    python -m benchmarks.bench_split_pages [--sizes 10 25 50] [--skip-legacy]
+"""
+import argparse
+import random
+import string
+import time
+from typing import Callable, List, Tuple
+
+from scripts.viewport import ViewportPages
+
+VIEWPORT_SIZE = 1024 * 8
+
+
+def legacy_split_pages(content: str, viewport_size: int) -> List[Tuple[int, int]]:
+    """The loop SimpleTextBrowser._split_pages used before ViewportPages."""
+    if len(content) == 0:
+        return [(0, 0)]
+    pages = []
+    start_idx = 0
+    while start_idx < len(content):
+        end_idx = min(start_idx + viewport_size, len(content))
+        while end_idx < len(content) and content[end_idx - 1] not in [" ", "\t", "\r", "\n"]:
+            end_idx += 1
+        pages.append((start_idx, end_idx))
+        start_idx = end_idx
+    return pages
+
+
+def prose(size: int) -> str:
+    rng = random.Random(0)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 12))) for _ in range(5000)]
+    parts, length = [], 0
+    while length < size:
+        word = rng.choice(words) + (" " if rng.random() > 0.05 else "\n")
+        parts.append(word)
+        length += len(word)
+    return "".join(parts)[:size]
+
+
+def minified(size: int) -> str:
+    block = "".join(random.Random(1).choices(string.ascii_letters + string.digits + "{}();=.,", k=1024 * 1024))
+    return (block * (size // len(block) + 1))[:size]
+
+
+def timed(fn: Callable[[], object]) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50], help="Text sizes in MB")
+    parser.add_argument("--skip-legacy", action="store_true", help="Do not run the old loop (slow on minified text)")
+    args = parser.parse_args()
+
+    print(f"{'text':<10} {'MB':>4} {'pages':>7} {'first page':>11} {'all pages':>10} {'legacy':>9}")
+    for size in args.sizes:
+        for name, make in (("prose", prose), ("minified", minified)):
+            content = make(size * 1024 * 1024)
+            first, _ = timed(lambda: ViewportPages(content, VIEWPORT_SIZE)[0])
+            pages = ViewportPages(content, VIEWPORT_SIZE)
+            total, count = timed(lambda: len(pages))
+            legacy = "-"
+            if not args.skip_legacy:
+                seconds, expected = timed(lambda: legacy_split_pages(content, VIEWPORT_SIZE))
+                legacy = f"{seconds * 1000:.0f} ms"
+                if name == "prose":
+                    # Same bounds wherever the old loop found whitespace within the overshoot cap
+                    assert list(pages) == expected, "ViewportPages differs from the old pagination"
+            print(f"{name:<10} {size:>4} {count:>7} {first * 1000:>8.2f} ms {total * 1000:>7.1f} ms {legacy:>9}")
+
+
+if __name__ == "__main__":
+    main()
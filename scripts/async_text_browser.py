@@ -0,0 +1,254 @@
+"""Asyncio variant of SimpleTextBrowser.
+
+Network waits are awaited on an httpx.AsyncClient instead of blocking an OS thread, so one process
+can drive dozens of research sessions concurrently. Paging and find_on_page are inherited from
+SimpleTextBrowser unchanged: they never touch the network. CPU-heavy document conversion and the
+(synchronous) DDGS search run in worker threads via asyncio.to_thread.
+"""
+import asyncio
+import importlib.util
+import time
+from typing import Any, Dict, Optional, Union
+from urllib.parse import urlparse
+
+import httpx
+from loguru import logger
+
+from .domain_health import http_failure
+from .http_pool import DEFAULT_USER_AGENT
+from .mdconvert import FileConversionException, UnsupportedFormatException
+from .rate_limiter import get_rate_limiter
+from .text_web_browser import LoadedPage, SearchInformationTool, SimpleTextBrowser, VisitTool
+
+
+def make_async_client(
+    request_kwargs: Optional[Dict[str, Any]] = None,
+    http2: bool = False,
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+) -> httpx.AsyncClient:
+    """Create an httpx.AsyncClient configured like the browser's request_kwargs (headers, cookies, proxy, timeout).
+
+    A single client may be shared by many AsyncTextBrowser instances running on the same event loop.
+    HTTP/2 needs the optional ``h2`` package; without it the client falls back to HTTP/1.1.
+    """
+    request_kwargs = request_kwargs or {}
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    proxies = request_kwargs.get("proxies") or {}
+    headers = {"User-Agent": DEFAULT_USER_AGENT}
+    headers.update(request_kwargs.get("headers") or {})
+    return httpx.AsyncClient(
+        http2=http2,
+        headers=headers,
+        cookies=request_kwargs.get("cookies"),
+        proxy=proxies.get("https", proxies.get("http")),
+        timeout=request_kwargs.get("timeout", 300),
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+    )
+
+
+class AsyncTextBrowser(SimpleTextBrowser):
+    """SimpleTextBrowser whose navigation (visit, search) is asynchronous.
+
+    Use ``await browser.avisit_page(...)`` / ``await browser.aset_address(...)``. Viewport, paging and
+    find semantics are identical to SimpleTextBrowser.
+    """
+
+    def __init__(
+        self,
+        start_page: Optional[str] = None,
+        viewport_size: Optional[int] = 1024 * 8,
+        downloads_folder: Optional[Union[str, None]] = None,
+        serpapi_key: Optional[Union[str, None]] = None,
+        request_kwargs: Optional[Union[Dict[str, Any], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        http2: bool = False,
+        **kwargs: Any,
+    ):
+        # The synchronous constructor must not fetch anything: start on about:blank, the caller awaits the start page
+        super().__init__(
+            start_page=None,
+            viewport_size=viewport_size,
+            downloads_folder=downloads_folder,
+            serpapi_key=serpapi_key,
+            request_kwargs=request_kwargs,
+            **kwargs,
+        )
+        self.start_page = start_page if start_page else "about:blank"
+        self._owns_client = client is None
+        self.client = client if client is not None else make_async_client(self.request_kwargs, http2=http2)
+
+    async def aset_address(self, uri_or_path: str, filter_year: Optional[int] = None) -> None:
+        self.history.visit(uri_or_path)
+        await self._anavigate(uri_or_path, filter_year=filter_year)
+
+    async def aback(self) -> Optional[str]:
+        """Async variant of back()."""
+        address = self.history.back()
+        if address is None:
+            return None
+        await self._anavigate(address, restore_position=True)
+        return self.viewport
+
+    async def aforward(self) -> Optional[str]:
+        """Async variant of forward()."""
+        address = self.history.forward()
+        if address is None:
+            return None
+        await self._anavigate(address, restore_position=True)
+        return self.viewport
+
+    async def _anavigate(self, uri_or_path: str, filter_year: Optional[int] = None, restore_position: bool = False) -> None:
+        self._leave_page()
+        self.viewport_current_page = 0
+
+        # Handle special URIs
+        if uri_or_path == "about:blank":
+            self._set_page_content("")
+        elif uri_or_path.startswith("google:"):
+            query = uri_or_path[len("google:") :].strip()
+            results = await asyncio.to_thread(self._serpapi_results, query, filter_year)
+            self._show_serpapi_results(query, results)
+        elif uri_or_path.startswith("duckduckgo:"):
+            query = uri_or_path[len("duckduckgo:") :].strip()
+            results, error_msg, proxy_info = await asyncio.to_thread(self._ddg_results, query)
+            self._show_ddg_results(query, results, error_msg, proxy_info)
+        else:
+            url = self._qualify_address(uri_or_path)
+            if not self._show_cached(url, restore_position):
+                await self._afetch_page(url)
+
+        self.find_on_page_query = None
+        self.find_on_page_viewport = None
+
+    async def avisit_page(self, path_or_uri: str, filter_year: Optional[int] = None) -> str:
+        """Update the address, visit the page, and return the content of the viewport."""
+        await self.aset_address(path_or_uri, filter_year=filter_year)
+        return self.viewport
+
+    async def _afetch_page(self, url: str) -> None:
+        page = None
+        if self.prefetcher is not None and (url.startswith("http:") or url.startswith("https:")):
+            page = await asyncio.to_thread(self.prefetcher.take, url)
+        if page is None:
+            page = await self._aload_page(url)
+        self._show_page(url, page)
+
+    async def _aload_page(self, url: str) -> LoadedPage:
+        if not (url.startswith("http:") or url.startswith("https:")):
+            # Local files need no network, only conversion
+            return await asyncio.to_thread(self._load_page, url)
+        if self.domain_health is None:
+            return await self._afetch_and_convert(url)
+
+        # Fail fast on domains that keep failing
+        reason = self.domain_health.check(url)
+        if reason is not None:
+            return LoadedPage("Error", f"## Error\n\nNot visiting {url}: {reason}. Try another source.", error=True)
+        start = time.monotonic()
+        page = await self._afetch_and_convert(url)
+        self.domain_health.record(url, time.monotonic() - start, page.failure)
+        return page
+
+    async def _afetch_and_convert(self, url: str) -> LoadedPage:
+        # The site adapters use the synchronous session, their requests are small
+        res = await asyncio.to_thread(self._adapted_page, url)
+        if res is not None:
+            return LoadedPage(res.title, res.text_content)
+        try:
+            await get_rate_limiter().aacquire(urlparse(url).hostname or "")
+            async with self.client.stream("GET", url) as response:
+                get_rate_limiter().observe(response.url.host, response.status_code, response.headers)
+                content_type = response.headers.get("content-type", "")
+                content_disposition = response.headers.get("content-disposition", "")
+
+                body = self.response_limits.body(response)
+                if response.is_error:
+                    content = b"".join([chunk async for chunk in body])
+                    return await asyncio.to_thread(
+                        self._error_page, response.status_code, content_type, content, str(response.url)
+                    )
+
+                # Text or HTML
+                if "text/" in content_type.lower():
+                    content = b"".join([chunk async for chunk in body])
+                    res = await asyncio.to_thread(
+                        self._mdconvert.convert_content, content, content_type, content_disposition, str(response.url)
+                    )
+                    if body.truncated:
+                        res.mark_truncated(body.truncated)
+                    return LoadedPage(res.title, res.text_content, truncated=res.truncated)
+
+                # A download
+                too_large = self.response_limits.declared_too_large(response.headers)
+                if too_large:
+                    return LoadedPage("Download skipped", f"# Download skipped\n\nNot downloading {url}: {too_large}.")
+                chunks = body.__aiter__()
+                head = await anext(chunks, b"")
+                extensions = self._download_extensions(url, response.headers)
+                declined = self._probe_download(url, response.headers, head, extensions)
+                if declined is not None:
+                    return declined
+                store = self._download_store()
+                with store.writer() as download:
+                    download.write(head)
+                    async for chunk in chunks:
+                        download.write(chunk)
+                download_path = store.commit(
+                    download, self._download_name(url, content_type, response.headers.get("content-disposition", ""))
+                )
+                if body.truncated:
+                    return LoadedPage(
+                        "Download truncated",
+                        f"# Download truncated\n\nStopped the download because the {body.truncated}. The partial file was saved to '{download_path}'.",
+                        truncated=body.truncated,
+                    )
+        except (UnsupportedFormatException, FileConversionException) as e:
+            logger.error(e)
+            return LoadedPage("Error", f"## Error\n\nCould not convert {url}", error=True, failure="conversion")
+        except httpx.HTTPError as e:
+            failure = "timeout" if isinstance(e, httpx.TimeoutException) else "network"
+            return LoadedPage("Error", f"## Error\n\n{str(e)}", error=True, failure=failure)
+
+        # Render it
+        return await asyncio.to_thread(self._render_download, download, extensions)
+
+    def _error_page(self, status_code: int, content_type: str, body: bytes, url: str) -> LoadedPage:
+        # If the error was rendered in HTML we might as well render it
+        if "text/html" in content_type.lower():
+            try:
+                text = self._mdconvert.convert_content(body, content_type, url=url).text_content
+            except (UnsupportedFormatException, FileConversionException):
+                text = body.decode("utf-8", errors="replace")
+        else:
+            text = body.decode("utf-8", errors="replace")
+        return LoadedPage(
+            f"Error {status_code}", f"## Error {status_code}\n\n{text}", error=True, failure=http_failure(status_code)
+        )
+
+    async def aclose(self) -> None:
+        """Close the HTTP client if this browser created it."""
+        if self._owns_client:
+            await self.client.aclose()
+
+
+class AsyncSearchInformationTool(SearchInformationTool):
+    """web_search for an AsyncTextBrowser: forward() is a coroutine. Tabs are not supported, each task uses its own browser."""
+
+    async def forward(self, query: str, filter_year: Optional[int] = None, tab: Optional[str] = None) -> str:
+        await self.browser.avisit_page(f"google: {query}", filter_year=filter_year)
+        header, content = self.browser._state()
+        return header.strip() + "\n=======================\n" + content
+
+
+class AsyncVisitTool(VisitTool):
+    """visit_page for an AsyncTextBrowser: forward() is a coroutine."""
+
+    async def forward(self, url: str, tab: Optional[str] = None) -> str:
+        await self.browser.avisit_page(url)
+        header, content = self.browser._state()
+        return header.strip() + "\n=======================\n" + content
@@ -0,0 +1,108 @@
+"""Navigation history of a text browser.
+
+Long research sessions make hundreds of tool calls, and every call reports whether the current
+page was visited before. The history therefore keeps an index from url to its last visit next to
+the (bounded) list of entries, so neither that lookup nor back/forward needs to scan the list.
+"""
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Iterator, Optional
+
+
+class HistoryEntry:
+    """One visit: the url, when it happened, and when the url was visited before (if at all)."""
+
+    __slots__ = ("url", "timestamp", "previous_visit")
+
+    def __init__(self, url: str, timestamp: float, previous_visit: Optional[float] = None):
+        self.url = url
+        self.timestamp = timestamp
+        self.previous_visit = previous_visit
+
+    def __repr__(self) -> str:
+        return f"HistoryEntry({self.url!r}, {self.timestamp})"
+
+
+class NavigationHistory:
+    """Back/forward stack of visited addresses plus an index of the last visit per url.
+
+    Args:
+        max_entries: Number of entries kept for back navigation; older ones are dropped.
+        max_urls: Number of urls whose last visit time is remembered.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_urls: int = 10000):
+        self.max_entries = max_entries
+        self.max_urls = max_urls
+        self._entries: Deque[HistoryEntry] = deque(maxlen=max_entries)
+        self._cursor = -1  # Index of the current entry
+        self._last_visit: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        return iter(self._entries)
+
+    @property
+    def current(self) -> Optional[HistoryEntry]:
+        return self._entries[self._cursor] if self._cursor >= 0 else None
+
+    @property
+    def previous(self) -> Optional[HistoryEntry]:
+        """The entry before the current one, i.e. where a back navigation would go."""
+        return self._entries[self._cursor - 1] if self._cursor >= 1 else None
+
+    def last_visit(self, url: str) -> Optional[float]:
+        """Timestamp of the most recent visit of url (including the current one)."""
+        return self._last_visit.get(url)
+
+    def _record_visit(self, entry: HistoryEntry) -> None:
+        entry.previous_visit = self._last_visit.get(entry.url)
+        self._last_visit[entry.url] = entry.timestamp
+        self._last_visit.move_to_end(entry.url)
+        while len(self._last_visit) > self.max_urls:
+            self._last_visit.popitem(last=False)
+
+    def visit(self, url: str, timestamp: Optional[float] = None) -> HistoryEntry:
+        """Add a visit after the current entry, discarding any entries forward of it."""
+        while len(self._entries) > self._cursor + 1:
+            self._entries.pop()
+        entry = HistoryEntry(url, timestamp if timestamp is not None else time.time())
+        self._record_visit(entry)
+        self._entries.append(entry)  # Drops the oldest entry once max_entries is reached
+        self._cursor = len(self._entries) - 1
+        return entry
+
+    def replace_current(self, url: str) -> None:
+        """Change the url of the current entry, e.g. after resolving a relative address."""
+        entry = self.current
+        if entry is None or entry.url == url:
+            return
+        # Undo the index update for the old url
+        if self._last_visit.get(entry.url) == entry.timestamp:
+            if entry.previous_visit is None:
+                del self._last_visit[entry.url]
+            else:
+                self._last_visit[entry.url] = entry.previous_visit
+        entry.url = url
+        self._record_visit(entry)
+
+    def _move(self, offset: int) -> Optional[str]:
+        target = self._cursor + offset
+        if target < 0 or target >= len(self._entries):
+            return None
+        self._cursor = target
+        # Returning to a page counts as a visit
+        entry = self._entries[target]
+        entry.timestamp = time.time()
+        self._record_visit(entry)
+        return entry.url
+
+    def back(self) -> Optional[str]:
+        """Step back and return the url to show, or None if there is no previous entry."""
+        return self._move(-1)
+
+    def forward(self) -> Optional[str]:
+        """Step forward (after back()) and return the url to show, or None."""
+        return self._move(1)
@@ -0,0 +1,141 @@
+"""Browser tabs, so that parallel tool calls of one agent step do not share a current page.
+
+A SimpleTextBrowser has one current page, viewport and find state. ToolCallingAgent runs the tool
+calls of a step in parallel threads, so with a single browser they would overwrite each other's
+page. The TabbedBrowser keeps one browser per named tab; a tool call runs in its tab (holding
+that tab's lock) and reaches the tab's browser through the TabbedBrowser, which forwards attribute
+access to the browser of the tab active in the current context. The tabs share the HTTP session,
+caches and scoreboards, which do their own locking.
+"""
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional
+
+from loguru import logger
+
+DEFAULT_TAB = "main"
+
+
+class _Tab:
+    __slots__ = ("name", "browser", "lock", "owner", "ready")
+
+    def __init__(self, name: str, browser: Any, owner: "TabbedBrowser"):
+        self.name = name
+        self.browser = browser  # None while it is being created, and if that failed
+        self.lock = threading.Lock()  # Held while a tool call runs in the tab
+        self.owner = owner
+        self.ready = threading.Event()  # Set once the browser was created or creating it failed
+
+
+_current_tab: ContextVar[Optional[_Tab]] = ContextVar("browser_tab", default=None)
+
+
+class TabbedBrowser:
+    """A set of browser tabs that behaves like the browser of the current tab.
+
+    Args:
+        browser_factory: Creates the browser of a new tab. Pass the shared session, page cache,
+            prefetcher etc. to it, so that all tabs profit from each other's work.
+        max_tabs: Tabs kept open; the least recently used idle tab is closed beyond that.
+    """
+
+    def __init__(self, browser_factory: Callable[[], Any], max_tabs: int = 8):
+        self._factory = browser_factory
+        self.max_tabs = max_tabs
+        self._lock = threading.Lock()
+        self._tabs: "OrderedDict[str, _Tab]" = OrderedDict()
+        self._numbers = itertools.count(2)
+        self._tab(DEFAULT_TAB)
+
+    def _tab(self, name: str) -> _Tab:
+        while True:
+            with self._lock:
+                tab = self._tabs.get(name)
+                if tab is None:
+                    tab = self._tabs[name] = _Tab(name, None, self)
+                    tab.lock.acquire()  # Until the tab has its browser
+                    self._close_idle_tabs()
+                    break
+                self._tabs.move_to_end(name)
+            # Another thread may still be creating the tab's browser; if that fails, start over
+            tab.ready.wait()
+            if tab.browser is not None:
+                return tab
+
+        # Creating a browser may take a moment, don't block the other tabs meanwhile
+        try:
+            browser = self._factory()
+            browser.tab_name = name
+            tab.browser = browser
+        except Exception:
+            with self._lock:
+                if self._tabs.get(name) is tab:
+                    del self._tabs[name]
+            raise
+        finally:
+            tab.ready.set()
+            tab.lock.release()
+        return tab
+
+    def _close_idle_tabs(self) -> None:
+        for name in list(self._tabs):
+            if len(self._tabs) <= self.max_tabs:
+                return
+            tab = self._tabs[name]
+            if name == DEFAULT_TAB or not tab.lock.acquire(blocking=False):
+                continue
+            try:
+                del self._tabs[name]
+            finally:
+                tab.lock.release()
+            logger.debug(f"Closed browser tab {name}")
+
+    def _free_tab_name(self) -> str:
+        with self._lock:
+            while True:
+                name = f"tab-{next(self._numbers)}"
+                if name not in self._tabs:
+                    return name
+
+    @contextmanager
+    def use_tab(self, name: Optional[str] = None, new_if_busy: bool = False) -> Iterator[Any]:
+        """Run the body in a tab (the default one if name is None) and yield its browser.
+
+        With new_if_busy, a call without a tab name that finds the default tab busy gets a new tab
+        instead of waiting for it; calls that navigate use this to run in parallel.
+        """
+        tab = self._tab(name or DEFAULT_TAB)
+        if name is None and new_if_busy and tab.lock.locked():
+            tab = self._tab(self._free_tab_name())
+        with tab.lock:
+            token = _current_tab.set(tab)
+            try:
+                yield tab.browser
+            finally:
+                _current_tab.reset(token)
+
+    def current(self) -> Any:
+        """The browser of the tab active in this context, else the default tab's."""
+        tab = _current_tab.get()
+        if tab is None or tab.owner is not self:
+            tab = self._tab(DEFAULT_TAB)
+        return tab.browser
+
+    def tabs(self) -> List[str]:
+        with self._lock:
+            return list(self._tabs)
+
+    def close_tab(self, name: str) -> bool:
+        if name == DEFAULT_TAB:
+            return False
+        with self._lock:
+            return self._tabs.pop(name, None) is not None
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes the TabbedBrowser itself lacks: address, visit_page, _state, ...
+        if name.startswith("__") or name in ("_factory", "_lock", "_tabs", "_numbers", "max_tabs"):
+            raise AttributeError(name)
+        return getattr(self.current(), name)
@@ -0,0 +1,279 @@
+"""Persistent per-domain health scoreboard with a circuit breaker.
+
+Every page load records its latency and, if it failed, the kind of failure (network error,
+timeout, HTTP status, conversion failure) for the page's domain. Domains that keep failing to
+answer trip a circuit breaker: further visits fail fast until a cooldown has passed, then a
+single trial visit decides whether the breaker closes again. The samples live in SQLite, so what
+one session learned about a domain helps the next one; breakers are re-read from it on every
+check, so processes sharing the file also share open breakers.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from loguru import logger
+
+# A half-open trial that has not reported back after this many seconds is given up
+TRIAL_TIMEOUT = 300.0
+
+# Failures that say the domain is down or overloaded; a 403 or an unconvertible page is about one page
+BREAKER_FAILURES = ("network", "timeout", "http_429", "http_5xx")
+
+
+def http_failure(status_code: int) -> str:
+    """Failure kind for an HTTP error status."""
+    if status_code >= 500:
+        return "http_5xx"
+    return f"http_{status_code}"
+
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class _Breaker:
+    __slots__ = ("opened_at", "cooldown", "trial_at")
+
+    def __init__(self, opened_at: float, cooldown: float):
+        self.opened_at = opened_at
+        self.cooldown = cooldown
+        self.trial_at: Optional[float] = None  # Start of the half-open trial visit, if one is in flight
+
+
+class DomainHealth:
+    """Latency percentiles, error rates and circuit breakers per domain.
+
+    Args:
+        path: SQLite file holding the samples; several processes may share it.
+        window: Number of recent visits per domain the statistics are computed over.
+        min_samples: Visits needed before a domain can be judged (or its breaker trip).
+        failure_threshold: Failure rate in the window that trips the breaker.
+        consecutive_failures: Failures in a row that trip the breaker regardless of the rate.
+        cooldown: Seconds a tripped breaker stays open before a trial visit is allowed.
+        slow_seconds: Domains whose p95 latency exceeds this are marked as slow.
+        max_age: Samples older than this many seconds are ignored and eventually deleted.
+    """
+
+    def __init__(
+        self,
+        path: str = "domain_health.sqlite",
+        window: int = 50,
+        min_samples: int = 3,
+        failure_threshold: float = 0.6,
+        consecutive_failures: int = 3,
+        cooldown: float = 15 * 60,
+        slow_seconds: float = 10.0,
+        max_age: float = 7 * 24 * 3600,
+    ):
+        self.path = os.path.abspath(path)
+        self.window = window
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.consecutive_failures = consecutive_failures
+        self.cooldown = cooldown
+        self.slow_seconds = slow_seconds
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._samples: Dict[str, Deque[Tuple[float, Optional[str]]]] = {}
+        self._breakers: Dict[str, _Breaker] = {}
+        self._inserts = 0
+
+        with self._connection() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS samples (
+                    domain TEXT NOT NULL,
+                    at REAL NOT NULL,
+                    latency REAL NOT NULL,
+                    failure TEXT
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS samples_domain_at ON samples (domain, at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS breakers (domain TEXT PRIMARY KEY, opened_at REAL NOT NULL, cooldown REAL NOT NULL)"
+            )
+        self._load()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self) -> None:
+        conn = self._connection()
+        since = time.time() - self.max_age
+        for domain, latency, failure in conn.execute(
+            "SELECT domain, latency, failure FROM samples WHERE at >= ? ORDER BY at", (since,)
+        ):
+            self._samples.setdefault(domain, deque(maxlen=self.window)).append((latency, failure))
+        for domain, opened_at, cooldown in conn.execute("SELECT domain, opened_at, cooldown FROM breakers"):
+            self._breakers[domain] = _Breaker(opened_at, cooldown)
+
+    def record(self, url: str, latency: float, failure: Optional[str] = None) -> None:
+        """Record one visit of url; failure is None for success, else e.g. "network", "timeout", "http_403", "conversion"."""
+        domain = domain_of(url)
+        if not domain:
+            return
+        now = time.time()
+        with self._lock:
+            samples = self._samples.setdefault(domain, deque(maxlen=self.window))
+            samples.append((latency, failure))
+            breaker_change = self._update_breaker(domain, samples, failure, now)
+            self._inserts += 1
+            prune = self._inserts % 500 == 0
+
+        try:
+            with self._connection() as conn:
+                conn.execute("INSERT INTO samples VALUES (?, ?, ?, ?)", (domain, now, latency, failure))
+                if breaker_change == "open":
+                    breaker = self._breakers[domain]
+                    conn.execute("INSERT OR REPLACE INTO breakers VALUES (?, ?, ?)", (domain, breaker.opened_at, breaker.cooldown))
+                elif breaker_change == "close":
+                    conn.execute("DELETE FROM breakers WHERE domain = ?", (domain,))
+                if prune:
+                    conn.execute("DELETE FROM samples WHERE at < ?", (now - self.max_age,))
+        except sqlite3.Error as e:
+            logger.warning(f"Domain health: could not store sample for {domain}: {e}")
+
+    def _update_breaker(self, domain: str, samples: Deque[Tuple[float, Optional[str]]], failure: Optional[str], now: float) -> Optional[str]:
+        counts = failure in BREAKER_FAILURES
+        breaker = self._breakers.get(domain)
+        if breaker is not None and breaker.trial_at is not None:
+            # Outcome of the half-open trial visit
+            if counts:
+                self._breakers[domain] = _Breaker(now, breaker.cooldown)
+                logger.info(f"Circuit breaker for {domain} stays open")
+                return "open"
+            del self._breakers[domain]
+            logger.info(f"Circuit breaker for {domain} closed")
+            return "close"
+        if not counts or breaker is not None:
+            return None
+
+        recent = list(samples)
+        failures = sum(1 for _, f in recent if f in BREAKER_FAILURES)
+        streak = 0
+        for _, f in reversed(recent):
+            if f not in BREAKER_FAILURES:
+                break
+            streak += 1
+        if streak >= self.consecutive_failures or (
+            len(recent) >= self.min_samples and failures / len(recent) >= self.failure_threshold
+        ):
+            self._breakers[domain] = _Breaker(now, self.cooldown)
+            logger.warning(f"Circuit breaker for {domain} opened ({failures} of {len(recent)} recent visits failed)")
+            return "open"
+        return None
+
+    def _stored_breaker(self, domain: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """Read the domain's breaker from SQLite: (read succeeded, (opened_at, cooldown) or None if closed)."""
+        try:
+            row = self._connection().execute("SELECT opened_at, cooldown FROM breakers WHERE domain = ?", (domain,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Domain health: could not read breaker for {domain}: {e}")
+            return False, None
+        return True, row
+
+    def check(self, url: str) -> Optional[str]:
+        """Return a reason to fail fast if the domain's breaker is open, else None (also when a trial is allowed)."""
+        domain = domain_of(url)
+        # Another process sharing the file may have opened or closed the breaker meanwhile
+        read, stored = self._stored_breaker(domain)
+        with self._lock:
+            breaker = self._breakers.get(domain)
+            if read:
+                if stored is None:
+                    self._breakers.pop(domain, None)
+                    breaker = None
+                elif breaker is None or breaker.opened_at != stored[0]:
+                    breaker = self._breakers[domain] = _Breaker(*stored)
+            if breaker is None:
+                return None
+            now = time.time()
+            remaining = breaker.opened_at + breaker.cooldown - now
+            # Half-open: let one visit through (another one if the trial never reported back)
+            if remaining <= 0 and (breaker.trial_at is None or now - breaker.trial_at > TRIAL_TIMEOUT):
+                breaker.trial_at = now
+                return None
+            stats = self._domain_stats(domain)
+        return (
+            f"{domain} failed {stats['failures']} of its last {stats['samples']} visits "
+            f"(mostly {stats['top_failure']}); skipping it for another {math.ceil(max(remaining, 1) / 60)} min"
+        )
+
+    def _domain_stats(self, domain: str) -> Dict[str, Any]:
+        samples = list(self._samples.get(domain, ()))
+        latencies = sorted(latency for latency, _ in samples)
+        failures: Dict[str, int] = {}
+        for _, failure in samples:
+            if failure is not None:
+                failures[failure] = failures.get(failure, 0) + 1
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(int(len(latencies) * q), len(latencies) - 1)]
+
+        return {
+            "samples": len(samples),
+            "failures": sum(failures.values()),
+            "error_rate": sum(failures.values()) / len(samples) if samples else 0.0,
+            "failure_kinds": failures,
+            "top_failure": max(failures, key=failures.get) if failures else None,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "breaker_open": domain in self._breakers,
+        }
+
+    def stats(self, url_or_domain: str) -> Dict[str, Any]:
+        domain = domain_of(url_or_domain) if "://" in url_or_domain else url_or_domain
+        with self._lock:
+            return self._domain_stats(domain)
+
+    def describe(self, url: str) -> Tuple[int, Optional[str]]:
+        """Rank and describe a result's domain: (0 healthy or unknown, 1 slow or unreliable, 2 breaker open; note)."""
+        domain = domain_of(url)
+        with self._lock:
+            if domain not in self._samples:
+                return 0, None
+            stats = self._domain_stats(domain)
+        if stats["breaker_open"]:
+            return 2, f"source currently unreachable or blocked ({stats['top_failure']}), skipped on visit"
+        if stats["samples"] < self.min_samples:
+            return 0, None
+        notes = []
+        if stats["error_rate"] >= 0.3:
+            notes.append(f"unreliable, {stats['error_rate']:.0%} of recent visits failed")
+        if stats["p95"] is not None and stats["p95"] > self.slow_seconds:
+            notes.append(f"slow, p95 {stats['p95']:.0f} s")
+        if notes:
+            return 1, "; ".join(notes)
+        return 0, None
+
+    def scoreboard(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {domain: self._domain_stats(domain) for domain in self._samples}
+
+
+_shared_health: Optional[DomainHealth] = None
+_shared_health_lock = threading.Lock()
+
+
+def get_domain_health(path: str = "domain_health.sqlite") -> DomainHealth:
+    """Return the process-wide scoreboard, so all sessions of the process share what they learn."""
+    global _shared_health
+    with _shared_health_lock:
+        if _shared_health is None:
+            _shared_health = DomainHealth(path)
+        return _shared_health
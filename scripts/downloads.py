@@ -0,0 +1,227 @@
+"""Single-pass writing of downloaded files and the content-addressed downloads folder.
+
+A download is written to disk exactly once: while the chunks stream in, the file type is sniffed
+from the first bytes and a content hash is computed, so the converter neither has to re-read the
+file for puremagic nor copy it through another temporary file. The DownloadStore then files it
+under its hash, so downloading the same bytes again does not create another copy.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+import puremagic
+from loguru import logger
+
+# puremagic only looks at fixed offsets near the start of a file
+SNIFF_BYTES = 8 * 1024
+WRITE_BUFFER = 1024 * 1024
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """Guess a file extension (e.g. ".pdf") from the first bytes of a file, like MarkdownConverter._guess_ext_magic."""
+    if not head:
+        return None
+    try:
+        guesses = puremagic.magic_string(head)
+    except (puremagic.PureError, ValueError):
+        return None
+    if len(guesses) > 0:
+        ext = guesses[0].extension.strip()
+        if len(ext) > 0:
+            return ext
+    return None
+
+
+class DownloadWriter:
+    """Writes a file from chunks with a large write buffer, sniffing and hashing on the way.
+
+    After close(), ``size``, ``sha256`` and ``magic_extension`` describe the written file.
+
+    Args:
+        path: Target path, truncated if it exists.
+        buffer_size: Size of the write buffer; chunks are collected into few large write syscalls.
+    """
+
+    def __init__(self, path: str, buffer_size: int = WRITE_BUFFER):
+        self.path = path
+        self.size = 0
+        self.magic_extension: Optional[str] = None
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._sniffed = False
+        self._fh = open(path, "wb", buffering=buffer_size)
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self._fh.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if not self._sniffed:
+            self._head += chunk[: SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._sniff()
+
+    def _sniff(self) -> None:
+        self.magic_extension = sniff_extension(self._head)
+        self._sniffed = True
+        self._head = b""
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def close(self) -> None:
+        if not self._sniffed:
+            self._sniff()  # Files smaller than SNIFF_BYTES
+        self._fh.close()
+
+    def __enter__(self) -> "DownloadWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def stream_to_file(chunks: Iterable[bytes], path: str, buffer_size: int = WRITE_BUFFER) -> DownloadWriter:
+    """Write all chunks to path and return the closed DownloadWriter."""
+    with DownloadWriter(path, buffer_size=buffer_size) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer
+
+
+class DownloadStore:
+    """Downloads folder that stores files by content hash, with an index from file names to hashes.
+
+    A file lands in ``<folder>/<sha256[:16]>/<name>``: identical bytes under the same name always map
+    to the same path (a re-download is a no-op), different bytes never collide, so no free name has
+    to be searched. The same bytes under another name are hard-linked instead of copied. Least
+    recently used files are deleted once the folder exceeds ``max_bytes``.
+
+    Args:
+        folder: The downloads folder. Several processes may share it.
+        max_bytes: Upper bound for the total size of all distinct downloaded files.
+    """
+
+    def __init__(self, folder: str, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.folder = os.path.abspath(folder)
+        self.incoming_dir = os.path.join(self.folder, ".incoming")
+        self.max_bytes = max_bytes
+        os.makedirs(self.incoming_dir, exist_ok=True)
+
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self.counters: Dict[str, int] = {"stored": 0, "deduplicated": 0, "linked": 0, "evictions": 0}
+
+        with self._connection() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_name ON files (name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_digest ON files (digest)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection to the index (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.folder, ".index.sqlite"), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def writer(self, buffer_size: int = WRITE_BUFFER) -> DownloadWriter:
+        """Open a DownloadWriter on a temporary file, to be passed to commit() once written."""
+        return DownloadWriter(os.path.join(self.incoming_dir, uuid.uuid4().hex), buffer_size=buffer_size)
+
+    def commit(self, download: DownloadWriter, name: str) -> str:
+        """File a closed download under its hash and name. Updates and returns ``download.path``."""
+        digest = download.sha256
+        path = os.path.join(self.folder, digest[:16], name)
+        conn = self._connection()
+        now = time.time()
+
+        if os.path.exists(path):
+            os.remove(download.path)
+            self._count("deduplicated")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            row = conn.execute("SELECT path FROM files WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+            linked = False
+            if row is not None and os.path.exists(row["path"]):
+                try:
+                    os.link(row["path"], path)
+                    os.remove(download.path)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                os.replace(download.path, path)
+            self._count("linked" if linked else "stored")
+
+        with conn:
+            conn.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET last_access = excluded.last_access",
+                (path, name, digest, download.size, now, now),
+            )
+            # Every file of the same content counts as used
+            conn.execute("UPDATE files SET last_access = ? WHERE digest = ?", (now, digest))
+        download.path = path
+        try:
+            self._evict(keep=digest)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Download store: eviction failed: {e}")
+        return path
+
+    def _total_bytes(self, conn: sqlite3.Connection) -> int:
+        # Hard links share their data, so every content counts once
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM files GROUP BY digest)").fetchone()[0]
+
+    def _evict(self, keep: str) -> None:
+        """Delete the least recently used contents until the folder is below its size limit."""
+        conn = self._connection()
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        with conn:
+            rows = conn.execute(
+                "SELECT digest, MAX(size) AS size FROM files GROUP BY digest ORDER BY MAX(last_access) ASC"
+            ).fetchall()
+            for row in rows:
+                if total <= target:
+                    break
+                if row["digest"] == keep:
+                    continue
+                # All names of one content live in the same directory
+                shutil.rmtree(os.path.join(self.folder, row["digest"][:16]), ignore_errors=True)
+                conn.execute("DELETE FROM files WHERE digest = ?", (row["digest"],))
+                total -= row["size"]
+                self._count("evictions")
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        row = conn.execute("SELECT COUNT(*), COUNT(DISTINCT digest) FROM files").fetchone()
+        with self._counter_lock:
+            stats: Dict[str, Any] = dict(self.counters)
+        stats["files"] = row[0]
+        stats["contents"] = row[1]
+        stats["bytes"] = self._total_bytes(conn)
+        return stats
@@ -0,0 +1,421 @@
+"""On-disk HTTP response cache shared by all processes that use the same cache directory.
+
+Response bodies are stored content-addressed (``blobs/<sha256>``), the metadata lives in a small
+SQLite index. The cache honours Cache-Control/Expires, revalidates stale entries with
+ETag/Last-Modified and evicts least recently used entries once the size limit is exceeded.
+
+Being shared by all sessions, it is a shared cache in the sense of RFC 9111: requests with
+credentials or cookies bypass it, and private responses or responses setting cookies are not stored.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from loguru import logger
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Headers that describe the wire encoding and must not be replayed with the decoded body
+_HOP_HEADERS = ["content-encoding", "transfer-encoding", "content-length", "connection", "keep-alive"]
+
+# Requests with these headers may get personalized answers, which must not reach other sessions
+_PRIVATE_REQUEST_HEADERS = ["authorization", "proxy-authorization", "cookie"]
+
+# Bodies without Content-Length are only read into memory for these (usually small) types
+_TEXTUAL_TYPES = ["text/", "json", "xml", "javascript"]
+
+
+def _parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CacheEntry:
+    """Metadata of one cached response. The body is loaded lazily from the blob store."""
+
+    def __init__(self, row: sqlite3.Row):
+        self.key: str = row["key"]
+        self.url: str = row["url"]
+        self.status: int = row["status"]
+        self.headers: Dict[str, str] = json.loads(row["headers"])
+        self.vary: Dict[str, Optional[str]] = json.loads(row["vary"])
+        self.blob: str = row["blob"]
+        self.size: int = row["size"]
+        self.fresh_until: float = row["fresh_until"]
+
+    @property
+    def etag(self) -> Optional[str]:
+        return CaseInsensitiveDict(self.headers).get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return CaseInsensitiveDict(self.headers).get("last-modified")
+
+    def has_validators(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+
+class _TeeRaw:
+    """Wraps a urllib3 response and hands the decoded body to ``on_complete`` once it was read to the end."""
+
+    def __init__(self, raw: Any, max_bytes: int, on_complete: Any):
+        self._raw = raw
+        self._max_bytes = max_bytes
+        self._on_complete = on_complete
+        self._chunks: Optional[list] = []
+        self._size = 0
+
+    def _collect(self, chunk: bytes) -> None:
+        if self._chunks is None:
+            return
+        self._size += len(chunk)
+        if self._size > self._max_bytes:
+            self._chunks = None  # Too large for the cache, stop collecting
+        else:
+            self._chunks.append(chunk)
+
+    def _finish(self) -> None:
+        if self._chunks is not None:
+            body = b"".join(self._chunks)
+            self._chunks = None
+            self._on_complete(body)
+
+    def stream(self, amt: int = 2**16, decode_content: Optional[bool] = None):
+        if not decode_content:
+            # Raw (still encoded) bytes must not end up in the cache
+            self._chunks = None
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            self._collect(chunk)
+            yield chunk
+        self._finish()
+
+    def read(self, amt: Optional[int] = None, decode_content: Optional[bool] = None, **kwargs: Any) -> bytes:
+        if not decode_content:
+            self._chunks = None
+        data = self._raw.read(amt, decode_content=decode_content, **kwargs)
+        self._collect(data)
+        if amt is None or not data:
+            self._finish()
+        return data
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+
+class HttpCache:
+    """Content-addressed response cache with conditional revalidation and LRU eviction.
+
+    Args:
+        cache_dir: Directory for the SQLite index and the blob store. Several processes may share it.
+        max_bytes: Upper bound for the total size of all cached bodies.
+        max_entry_bytes: Responses larger than this are never cached.
+        heuristic_max_age: Cap (seconds) for the heuristic freshness of responses that only carry
+            Last-Modified (10% of their age, as suggested by RFC 9111).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "http_cache",
+        max_bytes: int = 512 * 1024 * 1024,
+        max_entry_bytes: int = 16 * 1024 * 1024,
+        heuristic_max_age: int = 24 * 3600,
+    ):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.blob_dir = os.path.join(self.cache_dir, "blobs")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.heuristic_max_age = heuristic_max_age
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self.counters: Dict[str, int] = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        with self._connection() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    vary TEXT NOT NULL,
+                    blob TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    fresh_until REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_blob ON entries (blob)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection to the index (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite"), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    @staticmethod
+    def _key(request: requests.PreparedRequest) -> str:
+        return f"{request.method} {request.url}"
+
+    def is_cacheable_request(self, request: requests.PreparedRequest) -> bool:
+        if request.method != "GET":
+            return False
+        if "no-store" in _parse_cache_control(request.headers.get("Cache-Control")):
+            return False
+        if any(name in request.headers for name in _PRIVATE_REQUEST_HEADERS):
+            return False
+        # Range requests return partial bodies
+        return "Range" not in request.headers
+
+    def lookup(self, request: requests.PreparedRequest) -> Optional[CacheEntry]:
+        """Return the stored entry for the request, or None if nothing usable is cached."""
+        row = self._connection().execute("SELECT * FROM entries WHERE key = ?", (self._key(request),)).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(row)
+        for name, value in entry.vary.items():
+            if request.headers.get(name) != value:
+                return None
+        if not os.path.exists(self._blob_path(entry.blob)):
+            return None
+        return entry
+
+    def is_fresh(self, entry: CacheEntry, request: requests.PreparedRequest) -> bool:
+        request_cc = _parse_cache_control(request.headers.get("Cache-Control"))
+        if "no-cache" in request_cc or request_cc.get("max-age") == "0":
+            return False
+        return entry.fresh_until > time.time()
+
+    def add_validators(self, entry: CacheEntry, request: requests.PreparedRequest) -> None:
+        """Turn the request into a conditional request for the stale entry."""
+        if entry.etag is not None:
+            request.headers["If-None-Match"] = entry.etag
+        if entry.last_modified is not None:
+            request.headers["If-Modified-Since"] = entry.last_modified
+
+    def _freshness_lifetime(self, headers: CaseInsensitiveDict) -> Optional[float]:
+        """Seconds the response may be served without revalidation, None if it must not be stored."""
+        cc = _parse_cache_control(headers.get("Cache-Control"))
+        if "no-store" in cc or "private" in cc:
+            return None
+        if "no-cache" in cc:
+            return 0.0
+
+        age = _to_int(headers.get("Age")) or 0
+        max_age = _to_int(cc.get("max-age"))
+        if max_age is not None:
+            return max(max_age - age, 0)
+
+        date = _parse_http_date(headers.get("Date")) or time.time()
+        expires = _parse_http_date(headers.get("Expires"))
+        if headers.get("Expires") is not None:
+            # Invalid Expires values mean "already expired"
+            return max(expires - date, 0) if expires is not None else 0.0
+
+        last_modified = _parse_http_date(headers.get("Last-Modified"))
+        if last_modified is not None:
+            return min(max(date - last_modified, 0) * 0.1, self.heuristic_max_age)
+        return 0.0
+
+    def _body_fits(self, response: requests.Response) -> bool:
+        length = _to_int(response.headers.get("Content-Length"))
+        if length is not None:
+            return length <= self.max_entry_bytes
+        content_type = response.headers.get("Content-Type", "").lower()
+        return any(t in content_type for t in _TEXTUAL_TYPES)
+
+    def store(self, request: requests.PreparedRequest, response: requests.Response) -> requests.Response:
+        """Arrange for a fresh 200 response to be stored once its body has been read completely."""
+        self._count("misses")
+        if response.status_code != 200:
+            return response
+        vary_header = response.headers.get("Vary", "")
+        if "*" in vary_header or "Set-Cookie" in response.headers:
+            return response
+        lifetime = self._freshness_lifetime(response.headers)
+        if lifetime is None:
+            return response
+        if lifetime == 0 and "etag" not in response.headers and "last-modified" not in response.headers:
+            return response
+        if not self._body_fits(response):
+            return response
+
+        vary = {
+            name.strip(): request.headers.get(name.strip()) for name in vary_header.split(",") if name.strip()
+        }
+
+        def write(body: bytes) -> None:
+            try:
+                self._write(request, response, body, lifetime, vary)
+                self._count("stores")
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"HTTP cache: could not store {request.url}: {e}")
+
+        # The body is stored while the caller reads it, so size limits and early aborts of the
+        # caller still apply; only a completely read body ends up in the cache.
+        response.raw = _TeeRaw(response.raw, self.max_entry_bytes, write)
+        return response
+
+    def _write(
+        self,
+        request: requests.PreparedRequest,
+        response: requests.Response,
+        body: bytes,
+        lifetime: float,
+        vary: Dict[str, Optional[str]],
+    ) -> None:
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path))
+            with os.fdopen(handle, "wb") as fh:
+                fh.write(body)
+            os.replace(temp_path, blob_path)
+
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _HOP_HEADERS}
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._key(request),
+                    response.url,
+                    response.status_code,
+                    json.dumps(headers),
+                    json.dumps(vary),
+                    digest,
+                    len(body),
+                    now,
+                    now,
+                    now + lifetime,
+                ),
+            )
+        self._evict()
+
+    def revalidated(self, entry: CacheEntry, not_modified: requests.Response) -> None:
+        """Merge the headers of a 304 answer into the entry and renew its freshness."""
+        self._count("revalidated")
+        headers = CaseInsensitiveDict(entry.headers)
+        for name, value in not_modified.headers.items():
+            if name.lower() not in _HOP_HEADERS:
+                headers[name] = value
+        lifetime = self._freshness_lifetime(headers) or 0.0
+        entry.headers = dict(headers)
+        now = time.time()
+        entry.fresh_until = now + lifetime
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE entries SET headers = ?, last_access = ?, fresh_until = ? WHERE key = ?",
+                (json.dumps(entry.headers), now, entry.fresh_until, entry.key),
+            )
+
+    def hit(self, entry: CacheEntry) -> None:
+        self._count("hits")
+        with self._connection() as conn:
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), entry.key))
+
+    def remove_validators(self, request: requests.PreparedRequest) -> None:
+        """Undo add_validators, to fetch the full body after all."""
+        request.headers.pop("If-None-Match", None)
+        request.headers.pop("If-Modified-Since", None)
+
+    def build_response(
+        self, entry: CacheEntry, request: requests.PreparedRequest, status: str
+    ) -> Optional[requests.Response]:
+        """Recreate a ``requests.Response`` for a cached entry, or None if its body is gone."""
+        try:
+            with open(self._blob_path(entry.blob), "rb") as fh:
+                body = fh.read()
+        except FileNotFoundError:
+            # Evicted (by another thread or process) since the lookup: a miss after all
+            logger.debug(f"HTTP cache: body of {request.url} vanished, dropping the entry")
+            with self._connection() as conn:
+                conn.execute("DELETE FROM entries WHERE key = ? AND blob = ?", (entry.key, entry.blob))
+            return None
+        response = requests.Response()
+        response.status_code = entry.status
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.headers["Content-Length"] = str(len(body))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.reason = "OK"
+        response._content = body
+        response._content_consumed = True
+        response.cache_status = status
+        return response
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is below its size limit."""
+        conn = self._connection()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        with conn:
+            rows = conn.execute("SELECT key, blob, size FROM entries ORDER BY last_access ASC").fetchall()
+            for row in rows:
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM entries WHERE key = ?", (row["key"],))
+                total -= row["size"]
+                self._count("evictions")
+                # Blobs are shared by identical bodies: only delete the last reference
+                if conn.execute("SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (row["blob"],)).fetchone() is None:
+                    try:
+                        os.remove(self._blob_path(row["blob"]))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        row = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self._counter_lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["revalidated"] + counters["misses"]
+        counters["hit_rate"] = (counters["hits"] + counters["revalidated"]) / lookups if lookups else 0.0
+        counters["entries"] = row[0]
+        counters["bytes"] = row[1]
+        return counters
@@ -0,0 +1,255 @@
+"""Shared, pooled HTTP session used by every outbound fetch in ``scripts/``.
+
+All browser tools, the markdown converter and the helper tools talk to the web through one
+``requests.Session`` whose adapters keep connections alive per host, so repeated visits to the
+same site skip the TCP/TLS handshake.
+"""
+import socket
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util import make_headers
+
+from .http_cache import HttpCache
+from .http_retry import HttpRetrier
+from .rate_limiter import HostRateLimiter, get_rate_limiter
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
+
+# gzip/deflate always, br/zstd only if the matching decoder (brotli, zstandard) is installed
+DEFAULT_ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with TCP keep-alive sockets that reports every request to its HttpPool."""
+
+    def __init__(self, http_pool: "HttpPool", keep_alive: bool = True, **kwargs: Any):
+        # Must be set before HTTPAdapter.__init__, which already builds the pool manager
+        self._http_pool = http_pool
+        self._socket_options = None
+        if keep_alive:
+            self._socket_options = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        if self._socket_options is not None:
+            kwargs.setdefault("socket_options", self._socket_options)
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy: str, **proxy_kwargs: Any):
+        if self._socket_options is not None:
+            proxy_kwargs.setdefault("socket_options", self._socket_options)
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        cache = self._http_pool.cache
+        use_cache = cache is not None and cache.is_cacheable_request(request)
+        entry = None
+        if use_cache:
+            entry = cache.lookup(request)
+            if entry is not None and cache.is_fresh(entry, request):
+                cached = cache.build_response(entry, request, "hit")
+                if cached is not None:
+                    cache.hit(entry)
+                    return cached
+                entry = None
+            if entry is not None and entry.has_validators():
+                cache.add_validators(entry, request)
+
+        host = urlparse(request.url).hostname or ""
+        response = self._send(request, host, **kwargs)
+
+        if use_cache:
+            if response.status_code == 304 and entry is not None:
+                response.content  # Drain the empty body so the connection returns to the pool
+                cache.revalidated(entry, response)
+                cached = cache.build_response(entry, request, "revalidated")
+                if cached is not None:
+                    return cached
+                # The body was evicted while revalidating, so ask for it unconditionally
+                cache.remove_validators(request)
+                response = self._send(request, host, **kwargs)
+            response = cache.store(request, response)
+        return response
+
+    def _send(self, request: requests.PreparedRequest, host: str, **kwargs: Any) -> requests.Response:
+        """Send with the retry policy in effect."""
+        # Politeness: every attempt waits for the host's rate limit, which doesn't count as latency
+        return self._http_pool.retrier.send(
+            lambda: self._send_once(request, host, **kwargs),
+            request.method or "GET",
+            host,
+            wait=lambda: self._http_pool.rate_limiter.acquire(host),
+        )
+
+    def _send_once(self, request: requests.PreparedRequest, host: str, **kwargs: Any) -> requests.Response:
+        """One attempt on the network, after the rate limit wait."""
+        # Back off if the host asks for it
+        response = super().send(request, **kwargs)
+        self._http_pool.rate_limiter.observe(host, response.status_code, response.headers)
+        self._http_pool._record(response)
+        return response
+
+    def connection_pools(self):
+        """Yield all urllib3 connection pools held by this adapter (direct and proxied)."""
+        managers = [self.poolmanager] + list(self.proxy_manager.values())
+        for manager in managers:
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is not None:
+                    yield pool
+
+
+class HttpPool:
+    """One configured ``requests.Session`` plus per-host connection pools and usage statistics.
+
+    Args:
+        pool_connections: Number of per-host pools each adapter keeps around.
+        pool_maxsize: Default number of keep-alive connections retained per host.
+        host_pool_sizes: Overrides of ``pool_maxsize`` for individual hosts, e.g. ``{"en.wikipedia.org": 16}``.
+        keep_alive: Reuse connections and enable TCP keep-alive on the sockets. If False, every
+            request sends ``Connection: close``.
+        accept_encoding: Value of the ``Accept-Encoding`` header (gzip/brotli negotiation).
+        user_agent: Default ``User-Agent`` header; callers may still override it per request.
+        cache: Optional HttpCache consulted before any GET goes to the network.
+        rate_limiter: Per-host rate limiter for requests that go to the network. Defaults to the
+            process-wide one, which the async browser and the search tools share.
+        retrier: Retry/hedging layer for requests that go to the network, see HttpRetrier. Its
+            default RetryPolicy can be overridden per tool with retry_policy_scope().
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 32,
+        pool_maxsize: int = 8,
+        host_pool_sizes: Optional[Dict[str, int]] = None,
+        keep_alive: bool = True,
+        accept_encoding: str = DEFAULT_ACCEPT_ENCODING,
+        user_agent: str = DEFAULT_USER_AGENT,
+        cache: Optional[HttpCache] = None,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        retrier: Optional[HttpRetrier] = None,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = dict(host_pool_sizes or {})
+        self.keep_alive = keep_alive
+        self.cache = cache
+        self._rate_limiter = rate_limiter
+        self.retrier = retrier if retrier is not None else HttpRetrier()
+
+        self._lock = threading.Lock()
+        self._requests_per_host: Dict[str, int] = {}
+        self._status_counts: Dict[int, int] = {}
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        self.session.headers["Accept-Encoding"] = accept_encoding
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        # The session is shared by all users of the process: never persist cookies between requests,
+        # just like the former one-shot requests.get() calls did. Per-request cookies still work.
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        self._adapters: Dict[str, PooledAdapter] = {}
+        default_adapter = self._make_adapter(pool_maxsize)
+        self.session.mount("http://", default_adapter)
+        self.session.mount("https://", default_adapter)
+        self._adapters["*"] = default_adapter
+        for host, maxsize in self.host_pool_sizes.items():
+            adapter = self._make_adapter(maxsize)
+            self.session.mount(f"http://{host}/", adapter)
+            self.session.mount(f"https://{host}/", adapter)
+            self._adapters[host] = adapter
+
+    @property
+    def rate_limiter(self) -> HostRateLimiter:
+        return self._rate_limiter if self._rate_limiter is not None else get_rate_limiter()
+
+    def _make_adapter(self, maxsize: int) -> PooledAdapter:
+        return PooledAdapter(
+            self,
+            keep_alive=self.keep_alive,
+            pool_connections=self.pool_connections,
+            pool_maxsize=maxsize,
+        )
+
+    def _record(self, response: requests.Response) -> None:
+        host = urlparse(response.url).hostname or ""
+        with self._lock:
+            self._requests_per_host[host] = self._requests_per_host.get(host, 0) + 1
+            self._status_counts[response.status_code] = self._status_counts.get(response.status_code, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request counts per host and connection reuse figures of the underlying pools."""
+        hosts: Dict[str, Dict[str, int]] = {}
+        for adapter in self._adapters.values():
+            for pool in adapter.connection_pools():
+                entry = hosts.setdefault(
+                    pool.host, {"requests": 0, "new_connections": 0, "reused_connections": 0, "idle_connections": 0}
+                )
+                entry["new_connections"] += pool.num_connections
+                entry["reused_connections"] += max(pool.num_requests - pool.num_connections, 0)
+                if pool.pool is not None:
+                    # The LIFO queue is pre-filled with None placeholders for not yet opened connections
+                    entry["idle_connections"] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+        with self._lock:
+            for host, count in self._requests_per_host.items():
+                hosts.setdefault(
+                    host, {"requests": 0, "new_connections": 0, "reused_connections": 0, "idle_connections": 0}
+                )["requests"] = count
+            status_counts = dict(self._status_counts)
+
+        return {
+            "requests": sum(h["requests"] for h in hosts.values()),
+            "new_connections": sum(h["new_connections"] for h in hosts.values()),
+            "reused_connections": sum(h["reused_connections"] for h in hosts.values()),
+            "status_counts": status_counts,
+            "hosts": hosts,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "rate_limits": self.rate_limiter.stats(),
+            "attempts": self.retrier.stats(),
+        }
+
+    def close(self) -> None:
+        self.session.close()
+        self.retrier.close()
+
+
+_shared_pool: Optional[HttpPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def configure_pool(**kwargs: Any) -> HttpPool:
+    """(Re)create the process-wide pool with the given HttpPool arguments and return it."""
+    global _shared_pool
+    with _shared_pool_lock:
+        old_pool = _shared_pool
+        _shared_pool = HttpPool(**kwargs)
+    if old_pool is not None:
+        old_pool.close()
+    logger.info(f"HTTP pool configured: {kwargs}")
+    return _shared_pool
+
+
+def get_pool() -> HttpPool:
+    """Return the process-wide pool, creating it with default settings on first use."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HttpPool()
+        return _shared_pool
+
+
+def get_session() -> requests.Session:
+    """Return the shared ``requests.Session`` of the process-wide pool."""
+    return get_pool().session
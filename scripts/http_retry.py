@@ -0,0 +1,270 @@
+"""Retries with backoff and hedged requests for the pooled HTTP session.
+
+Transient network errors and 5xx answers are retried with exponential backoff and jitter, but
+only for idempotent methods. Optionally a request is hedged: if the first attempt has not
+produced response headers within the host's p95 latency, a second attempt is sent and whichever
+answers first wins. The first attempt always starts right away on a thread of its own; only the
+second ones share a bounded pool, and no hedge is sent while that pool is busy. Latencies count
+from sending the request, not from waiting for the host's rate limit. The policy can be set per
+tool with retry_policy_scope().
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError
+from concurrent.futures import wait as wait_futures
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import requests
+from loguru import logger
+
+
+class RetryPolicy:
+    """How often and how patiently a request is retried.
+
+    Args:
+        attempts: Total number of attempts (1 disables retries).
+        backoff: Base delay in seconds; attempt n waits up to ``backoff * 2**n`` (full jitter).
+        max_backoff: Upper bound for a single delay.
+        retry_statuses: Status codes that count as transient. 429 is left to the rate limiter.
+        methods: Only these (idempotent) methods are retried or hedged.
+        hedge: Send a second attempt if the first is slower than the host's p95 latency.
+        hedge_min_samples: Latency samples a host needs before requests to it are hedged.
+        hedge_min_delay: Never hedge earlier than this many seconds.
+        retry_timeouts: Also retry connect and read timeouts. Off by default: every such attempt
+            already waited the full socket timeout, so retrying would multiply the time a stalled
+            host blocks the caller.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        retry_statuses: Tuple[int, ...] = (500, 502, 503, 504),
+        methods: Tuple[str, ...] = ("GET", "HEAD", "OPTIONS"),
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.2,
+        retry_timeouts: bool = False,
+    ):
+        self.attempts = max(attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+        self.methods = methods
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.retry_timeouts = retry_timeouts
+
+    def delay(self, retry: int) -> float:
+        """Seconds to sleep before the given retry (0 = first retry)."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**retry))
+
+
+NO_RETRIES = RetryPolicy(attempts=1)
+
+_policy: contextvars.ContextVar[Optional[RetryPolicy]] = contextvars.ContextVar("retry_policy", default=None)
+
+
+@contextmanager
+def retry_policy_scope(policy: Optional[RetryPolicy]) -> Iterator[None]:
+    """Use this policy for all requests made in this context; None keeps the current one."""
+    if policy is None:
+        yield
+        return
+    token = _policy.set(policy)
+    try:
+        yield
+    finally:
+        _policy.reset(token)
+
+
+# Connection problems (and, if the policy says so, timeouts) are worth another try, certificate errors are not
+_TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+_PERMANENT_ERRORS = (requests.exceptions.SSLError, requests.exceptions.InvalidURL)
+
+
+class HttpRetrier:
+    """Runs request attempts under a RetryPolicy and keeps latency samples and attempt metrics per host.
+
+    Args:
+        policy: Default policy, used where no retry_policy_scope() is active.
+        latency_samples: Number of recent time-to-headers samples kept per host for the p95.
+        max_hedges: Size of the thread pool that runs the second attempts of hedged requests.
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, latency_samples: int = 100, max_hedges: int = 8):
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.latency_samples = latency_samples
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._metrics: Dict[str, Dict[str, int]] = {}
+        self.max_hedges = max_hedges
+        self._hedges_running = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_hedges, thread_name_prefix="hedge")
+
+    def current_policy(self) -> RetryPolicy:
+        policy = _policy.get()
+        return policy if policy is not None else self.policy
+
+    def _count(self, host: str, name: str) -> None:
+        with self._lock:
+            metrics = self._metrics.setdefault(host, {})
+            metrics[name] = metrics.get(name, 0) + 1
+
+    def p95(self, host: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(host, ()))
+        if not samples:
+            return None
+        return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+    def _timed(
+        self, attempt: Callable[[], requests.Response], host: str, wait: Optional[Callable[[], None]] = None
+    ) -> requests.Response:
+        """Run one attempt and record its outcome and time to headers (not counting the time in wait)."""
+        if wait is not None:
+            wait()
+        start = time.monotonic()
+        try:
+            response = attempt()
+        except Exception as e:
+            self._count(host, f"error:{type(e).__name__}")
+            raise
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._latencies.setdefault(host, deque(maxlen=self.latency_samples)).append(elapsed)
+        self._count(host, f"status:{response.status_code}")
+        return response
+
+    def send(
+        self,
+        attempt: Callable[[], requests.Response],
+        method: str,
+        host: str,
+        wait: Optional[Callable[[], None]] = None,
+    ) -> requests.Response:
+        """Call ``attempt`` (one network round trip) until it succeeds or the policy gives up.
+
+        ``wait`` is called before every attempt, e.g. to wait for the host's rate limit.
+        """
+        policy = self.current_policy()
+        if method.upper() not in policy.methods:
+            return self._timed(attempt, host, wait)
+
+        error: Optional[Exception] = None
+        for n in range(policy.attempts):
+            if n > 0:
+                delay = policy.delay(n - 1)
+                self._count(host, "retries")
+                logger.info(f"Retrying request to {host} in {delay:.2f} s (attempt {n + 1} of {policy.attempts})")
+                time.sleep(delay)
+            try:
+                if policy.hedge:
+                    response = self._hedged(attempt, host, policy, wait)
+                else:
+                    response = self._timed(attempt, host, wait)
+            except _PERMANENT_ERRORS:
+                raise
+            except _TRANSIENT_ERRORS as e:
+                if isinstance(e, requests.exceptions.Timeout) and not policy.retry_timeouts:
+                    self._count(host, "gave_up")
+                    raise
+                error = e
+                continue
+            if response.status_code in policy.retry_statuses and n < policy.attempts - 1:
+                response.close()
+                continue
+            return response
+        self._count(host, "gave_up")
+        raise error
+
+    def _hedged(
+        self,
+        attempt: Callable[[], requests.Response],
+        host: str,
+        policy: RetryPolicy,
+        wait: Optional[Callable[[], None]] = None,
+    ) -> requests.Response:
+        with self._lock:
+            samples = len(self._latencies.get(host, ()))
+        threshold = self.p95(host)
+        if threshold is None or samples < policy.hedge_min_samples:
+            return self._timed(attempt, host, wait)
+
+        # The caller has to stay free to take whichever answer comes first, so the first attempt
+        # gets a thread of its own instead of queueing in the pool. Attempts run in the caller's
+        # context (rate limit session, retry policy). The hedge deadline starts after the rate limit wait.
+        if wait is not None:
+            wait()
+        first = self._start(attempt, host)
+        try:
+            return first.result(timeout=max(threshold, policy.hedge_min_delay))
+        except TimeoutError:
+            pass
+
+        with self._lock:
+            busy = self._hedges_running >= self.max_hedges
+            if not busy:
+                self._hedges_running += 1
+        if busy:
+            # Hedging a saturated process would only add load
+            self._count(host, "hedges_skipped")
+            return first.result()
+        self._count(host, "hedges")
+        second = self._executor.submit(contextvars.copy_context().run, self._timed, attempt, host, wait)
+        second.add_done_callback(self._hedge_done)
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                if future is second:
+                    self._count(host, "hedge_wins")
+                for loser in pending:
+                    loser.add_done_callback(_close_response)
+                return future.result()
+        raise error
+
+    def _start(self, attempt: Callable[[], requests.Response], host: str) -> Future:
+        """Run an attempt on a new thread and return its future."""
+        future: Future = Future()
+        context = contextvars.copy_context()
+
+        def run() -> None:
+            try:
+                future.set_result(context.run(self._timed, attempt, host))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="hedge-first", daemon=True).start()
+        return future
+
+    def _hedge_done(self, future: Future) -> None:
+        with self._lock:
+            self._hedges_running -= 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            hosts = {host: dict(metrics) for host, metrics in self._metrics.items()}
+        for host, metrics in hosts.items():
+            p95 = self.p95(host)
+            metrics["p95_seconds"] = round(p95, 3) if p95 is not None else None
+        return hosts
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _close_response(future: Future) -> None:
+    """Release the connection of a hedged attempt that lost the race."""
+    if future.exception() is None:
+        future.result().close()
@@ -0,0 +1,68 @@
+"""Memory-mapped text files as page content.
+
+Multi-hundred-MB logs and CSV files would otherwise be read into one Python string (and kept
+there while the page is shown or cached). MappedText maps the file instead and decodes only the
+slices that are asked for, i.e. one viewport at a time. Offsets are byte offsets into the UTF-8
+file; ViewportPages only cuts pages at whitespace or at character boundaries, so every viewport
+decodes cleanly.
+"""
+import mmap
+import os
+from typing import Iterator, Union
+
+# Text files at least this large are mapped instead of read
+MAPPED_TEXT_MIN_BYTES = 16 * 1024 * 1024
+
+
+class MappedText:
+    """Read-only, str-like view of a UTF-8 text file: ``len()`` in bytes, slices decode to str.
+
+    Args:
+        path: The file to map. It must not be empty.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            # The mapping stays valid after the file is closed (or deleted)
+            self.buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def __getitem__(self, key: Union[int, slice]) -> str:
+        if isinstance(key, int):
+            key = slice(key, key + 1 if key != -1 else None)
+        return self.buffer[key].decode("utf-8", errors="replace")
+
+    def char_boundary(self, offset: int) -> int:
+        """Move offset back to the start of the UTF-8 character it points into."""
+        offset = min(offset, len(self.buffer))
+        while 0 < offset < len(self.buffer) and self.buffer[offset] & 0xC0 == 0x80:
+            offset -= 1
+        return offset
+
+    def iter_chunks(self, start: int = 0, chunk_size: int = 1024 * 1024) -> Iterator[str]:
+        """Decode the file piece by piece, cutting only at character boundaries."""
+        while start < len(self.buffer):
+            end = self.char_boundary(start + chunk_size) if start + chunk_size < len(self.buffer) else len(self.buffer)
+            if end <= start:
+                end = min(start + chunk_size, len(self.buffer))
+            yield self[start:end]
+            start = end
+
+    def __str__(self) -> str:
+        return self.buffer[:].decode("utf-8", errors="replace")
+
+    def __repr__(self) -> str:
+        return f"MappedText({self.path!r}, {len(self.buffer)} bytes)"
+
+    def close(self) -> None:
+        self.buffer.close()
+
+
+def should_map(path: str) -> bool:
+    try:
+        return os.path.getsize(path) >= MAPPED_TEXT_MIN_BYTES
+    except OSError:
+        return False
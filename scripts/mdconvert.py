@@ -4,6 +4,8 @@
 import base64
 import copy
 import html
+import io
+import itertools
 import json
 import mimetypes
 import os
@@ -14,7 +16,7 @@ import sys
 import tempfile
 import traceback
 import zipfile
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Union
 from urllib.parse import parse_qs, quote, unquote, urlparse, urlunparse
 from loguru import logger
 
@@ -23,6 +25,10 @@ import markdownify
 import pandas as pd
 import pdfminer
 import pdfminer.high_level
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
 import pptx
 
 # File-format detection
@@ -34,6 +40,15 @@ from bs4 import BeautifulSoup
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import SRTFormatter
 
+from .downloads import SNIFF_BYTES, DownloadWriter, sniff_extension, stream_to_file
+from .http_pool import DEFAULT_USER_AGENT, get_session
+from .mapped_text import MappedText, should_map
+from .rate_limiter import get_rate_limiter
+from .response_limits import ResponseLimits
+
+# Incrementally converted text without line breaks is passed on in pieces of at most this size
+MAX_LINE_CARRY = 1024 * 1024
+
 
 class _CustomMarkdownify(markdownify.MarkdownConverter):
     """
@@ -113,21 +128,57 @@ class _CustomMarkdownify(markdownify.MarkdownConverter):
 class DocumentConverterResult:
     """The result of converting a document to text."""
 
-    def __init__(self, title: Union[str, None] = None, text_content: str = ""):
+    def __init__(self, title: Union[str, None] = None, text_content: Union[str, MappedText] = "", text_chunks: Optional[Iterator[str]] = None):
         self.title: Union[str, None] = title
-        self.text_content: str = text_content
+        self.text_content: Union[str, MappedText] = text_content  # MappedText only for incremental conversions
+        self.truncated: Union[str, None] = None  # Reason, if only part of the source could be read
+        # Incremental conversion: text_content is the beginning of the text, text_chunks produces the rest
+        self.text_chunks: Optional[Iterator[str]] = text_chunks
+
+    def mark_truncated(self, reason: str) -> None:
+        """Flag the result as partial and say so at the end of the text."""
+        self.truncated = reason
+        self.text_content += f"\n\n[... content truncated: {reason} ...]"
 
 
 class DocumentConverter:
-    """Abstract superclass of all DocumentConverters."""
+    """Abstract superclass of all DocumentConverters.
+
+    Converters that can produce long documents piece by piece do so when called with
+    ``incremental=True``: they return a result whose ``text_chunks`` yields the text.
+    """
+
+    # File extensions convert() handles, used to decline downloads early. None: no cheap check possible
+    extensions: Optional[List[str]] = None
 
     def convert(self, local_path: str, **kwargs: Any) -> Union[None, DocumentConverterResult]:
         raise NotImplementedError()
 
+    def accepts(self, extension: str, head: bytes = b"") -> bool:
+        """Whether convert() may handle a file with this extension and these first bytes, without converting anything."""
+        return self.extensions is None or extension.lower() in self.extensions
+
 
 class PlainTextConverter(DocumentConverter):
     """Anything with content type text/plain"""
 
+    def accepts(self, extension: str, head: bytes = b"") -> bool:
+        # convert() takes any known mimetype, but only succeeds if the file decodes as UTF-8
+        content_type, _ = mimetypes.guess_type("__placeholder" + extension)
+        if content_type is None:
+            return False
+        if not head:
+            return True
+        # Even for text/* types: sniffed extensions of binary files can map to those (MZ -> .flt)
+        if b"\x00" in head:
+            return False
+        try:
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off at the end of the sample is fine
+            return e.start >= len(head) - 3
+        return True
+
     def convert(self, local_path: str, **kwargs: Any) -> Union[None, DocumentConverterResult]:
         # Guess the content type from any file extension that might be around
         content_type, _ = mimetypes.guess_type("__placeholder" + kwargs.get("file_extension", ""))
@@ -138,6 +189,17 @@ class PlainTextConverter(DocumentConverter):
         # elif "text/" not in content_type.lower():
         #     return None
 
+        if kwargs.get("incremental"):
+            # The chunks are decoded leniently, so make sure up front that this is text at all; a
+            # binary file must fail here like it does when read as a whole
+            extension = kwargs.get("file_extension", "")
+            if not self.accepts(extension, self._head(local_path)):
+                raise FileConversionException(f"'{local_path}' does not look like UTF-8 text")
+            # Very large files are mapped instead of read
+            if should_map(local_path):
+                return DocumentConverterResult(title=None, text_content=MappedText(local_path))
+            return DocumentConverterResult(title=None, text_chunks=self._read_chunks(local_path))
+
         text_content = ""
         with open(local_path, "rt", encoding="utf-8") as fh:
             text_content = fh.read()
@@ -146,10 +208,26 @@ class PlainTextConverter(DocumentConverter):
             text_content=text_content,
         )
 
+    def _head(self, local_path: str) -> bytes:
+        with open(local_path, "rb") as fh:
+            return fh.read(SNIFF_BYTES)
+
+    def _read_chunks(self, local_path: str, chunk_size: int = 1024 * 1024) -> Iterator[str]:
+        # The chunks are read long after accepts() looked at the head; a stray invalid byte
+        # further in must not fail a page that is already being shown
+        with open(local_path, "rt", encoding="utf-8", errors="replace") as fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
 
 class HtmlConverter(DocumentConverter):
     """Anything with content type text/html"""
 
+    extensions = [".html", ".htm"]
+
     def convert(self, local_path: str, **kwargs: Any) -> Union[None, DocumentConverterResult]:
         # Bail if not html
         extension = kwargs.get("file_extension", "")
@@ -190,6 +268,8 @@ class HtmlConverter(DocumentConverter):
 class WikipediaConverter(DocumentConverter):
     """Handle Wikipedia pages separately, focusing only on the main document content."""
 
+    extensions = [".html", ".htm"]
+
     def convert(self, local_path: str, **kwargs: Any) -> Union[None, DocumentConverterResult]:
         # Bail if not Wikipedia
         extension = kwargs.get("file_extension", "")
@@ -232,9 +312,25 @@ class WikipediaConverter(DocumentConverter):
         )
 
 
+def fetch_youtube_transcript(video_id: str) -> str:
+    """The transcript of a YouTube video in SRT format. Raises if there is none."""
+    # The API uses its own HTTP client, so rate limit it here
+    get_rate_limiter().acquire("www.youtube.com")
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        transcript = YouTubeTranscriptApi.get_transcript(video_id)  # type: ignore
+    else:
+        # youtube_transcript_api >= 1.0; instances are not thread-safe, so one per call
+        transcript = YouTubeTranscriptApi().fetch(video_id)
+    # transcript_text = " ".join([part["text"] for part in transcript])  # type: ignore
+    # Alternative formatting:
+    return SRTFormatter().format_transcript(transcript)
+
+
 class YouTubeConverter(DocumentConverter):
     """Handle YouTube specially, focusing on the video title, description, and transcript."""
 
+    extensions = [".html", ".htm"]
+
     def convert(self, local_path: str, **kwargs: Any) -> Union[None, DocumentConverterResult]:
         # Bail if not YouTube
         extension = kwargs.get("file_extension", "")
@@ -311,11 +407,7 @@ class YouTubeConverter(DocumentConverter):
             assert isinstance(params["v"][0], str)
             video_id = str(params["v"][0])
             try:
-                # Must be a single transcript.
-                transcript = YouTubeTranscriptApi.get_transcript(video_id)  # type: ignore
-                # transcript_text = " ".join([part["text"] for part in transcript])  # type: ignore
-                # Alternative formatting:
-                transcript_text = SRTFormatter().format_transcript(transcript)
+                transcript_text = fetch_youtube_transcript(video_id)
             except Exception:
                 pass
         if transcript_text:
@@ -357,23 +449,55 @@ class PdfConverter(DocumentConverter):
     Converts PDFs to Markdown. Most style information is ignored, so the results are essentially plain-text.
     """
 
+    extensions = [".pdf"]
+
     def convert(self, local_path, **kwargs) -> Union[None, DocumentConverterResult]:
         # Bail if not a PDF
         extension = kwargs.get("file_extension", "")
         if extension.lower() != ".pdf":
             return None
 
+        if kwargs.get("incremental"):
+            return DocumentConverterResult(title=None, text_chunks=self._extract_pages(local_path))
+
         return DocumentConverterResult(
             title=None,
             text_content=pdfminer.high_level.extract_text(local_path),
         )
 
 
+    def _extract_pages(self, local_path: str) -> Iterator[str]:
+        """Yield the text of one PDF page at a time, as pdfminer.high_level.extract_text would produce it."""
+        with open(local_path, "rb") as fh:
+            resource_manager = PDFResourceManager(caching=True)
+            output = io.StringIO()
+            device = TextConverter(resource_manager, output, codec="utf-8", laparams=LAParams())
+            interpreter = PDFPageInterpreter(resource_manager, device)
+            try:
+                for number, page in enumerate(PDFPage.get_pages(fh, caching=True)):
+                    try:
+                        interpreter.process_page(page)
+                    except Exception as e:
+                        # The first page decides whether the file is a PDF at all, later errors end the text
+                        if number == 0:
+                            raise
+                        logger.warning(f"PDF conversion of {local_path} stopped at page {number + 1}: {e}")
+                        yield f"\n\n[... conversion stopped at page {number + 1}: {e} ...]"
+                        return
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+            finally:
+                device.close()
+
+
 class DocxConverter(HtmlConverter):
     """
     Converts DOCX files to Markdown. Style information (e.g.m headings) and tables are preserved where possible.
     """
 
+    extensions = [".docx"]
+
     def convert(self, local_path, **kwargs) -> Union[None, DocumentConverterResult]:
         # Bail if not a DOCX
         extension = kwargs.get("file_extension", "")
@@ -394,6 +518,8 @@ class XlsxConverter(HtmlConverter):
     Converts XLSX files to Markdown, with each sheet presented as a separate Markdown table.
     """
 
+    extensions = [".xlsx", ".xls"]
+
     def convert(self, local_path, **kwargs) -> Union[None, DocumentConverterResult]:
         # Bail if not a XLSX
         extension = kwargs.get("file_extension", "")
@@ -418,6 +544,8 @@ class PptxConverter(HtmlConverter):
     Converts PPTX files to Markdown. Supports heading, tables and images with alt text.
     """
 
+    extensions = [".pptx"]
+
     def convert(self, local_path, **kwargs) -> Union[None, DocumentConverterResult]:
         # Bail if not a PPTX
         extension = kwargs.get("file_extension", "")
@@ -521,6 +649,8 @@ class WavConverter(MediaConverter):
     Converts WAV files to markdown via extraction of metadata (if `exiftool` is installed), and speech transcription (if `speech_recognition` is installed).
     """
 
+    extensions = [".wav"]
+
     def convert(self, local_path, **kwargs) -> Union[None, DocumentConverterResult]:
         # Bail if not a XLSX
         extension = kwargs.get("file_extension", "")
@@ -571,6 +701,8 @@ class Mp3Converter(WavConverter):
     Converts MP3 files to markdown via extraction of metadata (if `exiftool` is installed), and speech transcription (if `speech_recognition` AND `pydub` are installed).
     """
 
+    extensions = [".mp3"]
+
     def convert(self, local_path, **kwargs) -> Union[None, DocumentConverterResult]:
         # Bail if not a MP3
         extension = kwargs.get("file_extension", "")
@@ -631,6 +763,8 @@ class ZipConverter(DocumentConverter):
     Extracts ZIP files to a permanent local directory and returns a listing of extracted files.
     """
 
+    extensions = [".zip"]
+
     def __init__(self, extract_dir: str = "downloads"):
         """
         Initialize with path to extraction directory.
@@ -679,6 +813,8 @@ class ImageConverter(MediaConverter):
     Converts images to markdown via extraction of metadata (if `exiftool` is installed), OCR (if `easyocr` is installed), and description via a multimodal LLM (if an mlm_client is configured).
     """
 
+    extensions = [".jpg", ".jpeg", ".png"]
+
     def convert(self, local_path, **kwargs) -> Union[None, DocumentConverterResult]:
         # Bail if not a XLSX
         extension = kwargs.get("file_extension", "")
@@ -772,14 +908,16 @@ class MarkdownConverter:
         requests_session: Optional[requests.Session] = None,
         mlm_client: Optional[Any] = None,
         mlm_model: Optional[Any] = None,
+        response_limits: Optional[ResponseLimits] = None,
     ):
         if requests_session is None:
-            self._requests_session = requests.Session()
+            self._requests_session = get_session()
         else:
             self._requests_session = requests_session
 
         self._mlm_client = mlm_client
         self._mlm_model = mlm_model
+        self._response_limits = response_limits if response_limits is not None else ResponseLimits()
 
         self._page_converters: List[DocumentConverter] = []
 
@@ -867,8 +1005,7 @@ class MarkdownConverter:
 
     def convert_url(self, url: str, **kwargs: Any) -> DocumentConverterResult:  # TODO: fix kwargs type
         # Send a HTTP request to the URL
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
-        response = self._requests_session.get(url, stream=True, headers={"User-Agent": user_agent})
+        response = self._requests_session.get(url, stream=True, headers={"User-Agent": DEFAULT_USER_AGENT})
         response.raise_for_status()
         return self.convert_response(response, **kwargs)
 
@@ -876,52 +1013,98 @@ class MarkdownConverter:
         self, response: requests.Response, **kwargs: Any
     ) -> DocumentConverterResult:  # TODO fix kwargs type
         # Prepare a list of extensions to try (in order of priority)
-        ext = kwargs.get("file_extension")
-        extensions = [ext] if ext is not None else []
-
-        # Guess from the mimetype
-        content_type = response.headers.get("content-type", "").split(";")[0]
-        self._append_ext(extensions, mimetypes.guess_extension(content_type))
-
-        # Read the content disposition if there is one
-        content_disposition = response.headers.get("content-disposition", "")
-        m = re.search(r"filename=([^;]+)", content_disposition)
-        if m:
-            base, ext = os.path.splitext(m.group(1).strip("\"'"))
-            self._append_ext(extensions, ext)
-
-        # Read from the extension from the path
-        base, ext = os.path.splitext(urlparse(response.url).path)
-        self._append_ext(extensions, ext)
+        extensions = self._response_extensions(
+            response.headers.get("content-type", ""),
+            response.headers.get("content-disposition", ""),
+            response.url,
+            kwargs.get("file_extension"),
+        )
 
         # Save the file locally to a temporary file. It will be deleted before this method exits
         handle, temp_path = tempfile.mkstemp()
-        fh = os.fdopen(handle, "wb")
+        os.close(handle)
         result = None
         try:
-            # Download the file
-            for chunk in response.iter_content(chunk_size=512):
-                fh.write(chunk)
-            fh.close()
-
-            # Use puremagic to check for more extension options
-            self._append_ext(extensions, self._guess_ext_magic(temp_path))
+            # Download the file, within the configured size and time limits. The file type is sniffed on the way.
+            body = self._response_limits.body(response)
+            download = stream_to_file(body, temp_path)
 
             # Convert
-            result = self._convert(temp_path, extensions, url=response.url)
+            result = self.convert_download(download, extensions, url=response.url)
+            if body.truncated:
+                result.mark_truncated(body.truncated)
         except Exception as e:
             logger.error(f"Error in converting: {e}")
 
         # Clean up
         finally:
-            try:
-                fh.close()
-            except Exception:
-                pass
             os.unlink(temp_path)
 
         return result
 
+    def convert_download(
+        self, download: DownloadWriter, extensions: Optional[List[str]] = None, **kwargs: Any
+    ) -> DocumentConverterResult:
+        """Convert a file written by a DownloadWriter, reusing the file type it sniffed while downloading."""
+        extensions = list(extensions) if extensions else []
+        base, ext = os.path.splitext(download.path)
+        self._append_ext(extensions, ext)
+        self._append_ext(extensions, download.magic_extension)
+        return self._convert(download.path, extensions, **kwargs)
+
+    def convert_content(
+        self, content: bytes, content_type: str = "", content_disposition: str = "", url: str = "", **kwargs: Any
+    ) -> DocumentConverterResult:
+        """Convert an already downloaded response body, e.g. one fetched with an async HTTP client."""
+        extensions = self._response_extensions(content_type, content_disposition, url, kwargs.get("file_extension"))
+
+        # Save the file locally to a temporary file. It will be deleted before this method exits
+        handle, temp_path = tempfile.mkstemp()
+        try:
+            with os.fdopen(handle, "wb") as fh:
+                fh.write(content)
+
+            # Use puremagic to check for more extension options
+            self._append_ext(extensions, sniff_extension(content[:SNIFF_BYTES]))
+            return self._convert(temp_path, extensions, url=url)
+        finally:
+            os.unlink(temp_path)
+
+    def probe(self, extensions: List[str], head: bytes = b"") -> Optional[str]:
+        """Check whether any registered converter could handle a download before it is fetched completely.
+
+        ``extensions`` are the candidates from the response headers and url (see _response_extensions),
+        ``head`` the first bytes of the body. Returns None if a converter accepts it, else a reason.
+        """
+        extensions = list(extensions)
+        self._append_ext(extensions, sniff_extension(head[:SNIFF_BYTES]))
+        for ext in extensions:
+            for converter in self._page_converters:
+                if converter.accepts(ext, head):
+                    return None
+        detected = ", ".join(dict.fromkeys(ext.lower() for ext in extensions)) or "unknown"
+        return f"no converter supports this file type (detected: {detected})"
+
+    def _response_extensions(
+        self, content_type: str, content_disposition: str, url: str, file_extension: Optional[str] = None
+    ) -> List[str]:
+        """List the extensions suggested by a response's headers and url, in order of priority."""
+        extensions = [file_extension] if file_extension is not None else []
+
+        # Guess from the mimetype
+        self._append_ext(extensions, mimetypes.guess_extension(content_type.split(";")[0]))
+
+        # Read the content disposition if there is one
+        m = re.search(r"filename=([^;]+)", content_disposition)
+        if m:
+            base, ext = os.path.splitext(m.group(1).strip("\"'"))
+            self._append_ext(extensions, ext)
+
+        # Read from the extension from the path
+        base, ext = os.path.splitext(urlparse(url).path)
+        self._append_ext(extensions, ext)
+        return extensions
+
     def _convert(self, local_path: str, extensions: List[Union[str, None]], **kwargs) -> DocumentConverterResult:
         error_trace = ""
         for ext in extensions + [None]:  # Try last with no extension
@@ -945,13 +1128,22 @@ class MarkdownConverter:
                 # If we hit an error log it and keep trying
                 try:
                     res = converter.convert(local_path, **_kwargs)
+                    if res is not None and isinstance(res.text_content, MappedText):
+                        # Shown as it is in the file, normalizing would mean reading it into memory
+                        return res
+                    if res is not None and res.text_chunks is not None:
+                        # Convert the first piece now, so that a file the converter can't read fails here
+                        chunks = self._normalized_chunks(itertools.chain([res.text_content], res.text_chunks))
+                        res.text_content = next(chunks, "")
+                        res.text_chunks = chunks
+                        return res
                 except Exception:
                     error_trace = ("\n\n" + traceback.format_exc()).strip()
+                    res = None
 
                 if res is not None:
                     # Normalize the content
-                    res.text_content = "\n".join([line.rstrip() for line in re.split(r"\r?\n", res.text_content)])
-                    res.text_content = re.sub(r"\n{3,}", "\n\n", res.text_content)
+                    res.text_content = self._normalize(res.text_content)
 
                     # Todo
                     return res
@@ -967,6 +1159,29 @@ class MarkdownConverter:
             f"Could not convert '{local_path}' to Markdown. The formats {extensions} are not supported."
         )
 
+    def _normalize(self, text: str) -> str:
+        text = "\n".join([line.rstrip() for line in re.split(r"\r?\n", text)])
+        return re.sub(r"\n{3,}", "\n\n", text)
+
+    def _normalized_chunks(self, chunks: Iterator[str]) -> Iterator[str]:
+        """Normalize incrementally converted text like a whole text, cutting it only at line breaks."""
+        carry = ""
+        for chunk in chunks:
+            text = carry + chunk
+            cut = text.rstrip("\r\n").rfind("\n")
+            if cut < 0:
+                if len(text) > MAX_LINE_CARRY:
+                    # One endless line: pass it on as it is, keeping trailing whitespace for the line end
+                    keep = len(text[:MAX_LINE_CARRY].rstrip(" \t\r")) or MAX_LINE_CARRY
+                    yield text[:keep]
+                    text = text[keep:]
+                carry = text
+                continue
+            carry = text[cut + 1 :]
+            yield self._normalize(text[: cut + 1])
+        if carry:
+            yield self._normalize(carry)
+
     def _append_ext(self, extensions, ext):
         """Append a unique non-None, non-empty extension to a list of extensions."""
         if ext is None:
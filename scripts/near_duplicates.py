@@ -0,0 +1,234 @@
+"""Near-duplicate detection of visited pages by SimHash.
+
+Syndicated news, mirrored documentation and copies of press releases put the same text under
+many urls. Every page shown gets a 64-bit SimHash of its word 3-grams (computed with NumPy over
+the whole page at once); pages whose fingerprints differ in at most a few bits have nearly the
+same text. Fingerprints are looked up in the index of the current research session and in a
+SQLite store shared by all sessions. Candidates are found by banding: the 64 bits are split into
+four 16-bit bands, and two fingerprints within three bits of each other agree on at least one band.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from .url_utils import canonicalize_url
+
+# Fingerprints differing in at most this many bits are near-duplicates (needs <= BANDS - 1)
+MAX_DISTANCE = 3
+BANDS = 4
+SHINGLE_SIZE = 3
+
+# Pages shorter than this are not compared (error pages, stubs, cookie walls look alike)
+MIN_CHARS = 1500
+# Only the beginning of long pages is fingerprinted
+FINGERPRINT_CHARS = 256 * 1024
+
+_TOKEN = re.compile(r"\w+")
+_BAND_BITS = 64 // BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def _word_hash(word: str) -> int:
+    # Stable across processes (unlike hash()), so fingerprints can be stored
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash of the word 3-grams of text, or None if it has too few words."""
+    tokens = _TOKEN.findall(text[:FINGERPRINT_CHARS].lower())
+    if len(tokens) < SHINGLE_SIZE + 1:
+        return None
+    vocabulary: Dict[str, int] = {}
+    ids = np.fromiter((vocabulary.setdefault(t, len(vocabulary)) for t in tokens), dtype=np.int64, count=len(tokens))
+    hashes = np.fromiter((_word_hash(word) for word in vocabulary), dtype=np.uint64, count=len(vocabulary))[ids]
+
+    # Shingle hashes: combine neighbouring word hashes, then mix (splitmix64 finalizer)
+    with np.errstate(over="ignore"):
+        shingles = hashes[: -SHINGLE_SIZE + 1].copy()
+        for offset in range(1, SHINGLE_SIZE):
+            shingles = shingles * np.uint64(0x9E3779B97F4A7C15) ^ hashes[offset : len(hashes) - SHINGLE_SIZE + 1 + offset]
+        shingles ^= shingles >> np.uint64(30)
+        shingles *= np.uint64(0xBF58476D1CE4E5B9)
+        shingles ^= shingles >> np.uint64(27)
+        shingles *= np.uint64(0x94D049BB133111EB)
+        shingles ^= shingles >> np.uint64(31)
+
+    # Majority vote per bit over all shingles
+    bits = np.unpackbits(shingles.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(fingerprint: int) -> List[int]:
+    return [(fingerprint >> (i * _BAND_BITS)) & _BAND_MASK for i in range(BANDS)]
+
+
+class FingerprintIndex:
+    """In-memory fingerprints of the pages of one research session.
+
+    Args:
+        max_distance: Largest Hamming distance that counts as a near-duplicate.
+    """
+
+    def __init__(self, max_distance: int = MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[int, str, Optional[str]]] = []  # (fingerprint, canonical url, title)
+        self._bands: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, fingerprint: int, url: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(url, title) of a near-duplicate of fingerprint under another url, or None."""
+        key = canonicalize_url(url)
+        with self._lock:
+            seen = set()
+            for band, value in enumerate(_bands(fingerprint)):
+                for i in self._bands.get((band, value), ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    other, other_url, title = self._entries[i]
+                    if other_url != key and hamming_distance(fingerprint, other) <= self.max_distance:
+                        return other_url, title
+        return None
+
+    def add(self, fingerprint: int, url: str, title: Optional[str] = None) -> None:
+        with self._lock:
+            i = len(self._entries)
+            self._entries.append((fingerprint, canonicalize_url(url), title))
+            for band, value in enumerate(_bands(fingerprint)):
+                self._bands.setdefault((band, value), []).append(i)
+
+
+class FingerprintStore:
+    """Fingerprints of the pages of all research sessions, in SQLite.
+
+    Args:
+        path: SQLite file; several processes may share it.
+        max_distance: Largest Hamming distance that counts as a near-duplicate.
+        max_age: Fingerprints older than this many seconds are ignored and eventually deleted.
+    """
+
+    def __init__(self, path: str = "fingerprints.sqlite", max_distance: int = MAX_DISTANCE, max_age: float = 30 * 24 * 3600):
+        self.path = os.path.abspath(path)
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self._local = threading.local()
+        self._inserts = 0
+        with self._connection() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS fingerprints (
+                    url TEXT PRIMARY KEY,
+                    fingerprint INTEGER NOT NULL,
+                    title TEXT,
+                    b0 INTEGER NOT NULL, b1 INTEGER NOT NULL, b2 INTEGER NOT NULL, b3 INTEGER NOT NULL,
+                    seen_at REAL NOT NULL
+                )"""
+            )
+            for band in range(BANDS):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS fingerprints_b{band} ON fingerprints (b{band})")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def find(self, fingerprint: int, url: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(url, title) of a stored near-duplicate of fingerprint under another url, or None."""
+        bands = _bands(fingerprint)
+        rows = self._connection().execute(
+            "SELECT url, fingerprint, title FROM fingerprints WHERE (b0 = ? OR b1 = ? OR b2 = ? OR b3 = ?) AND url != ? AND seen_at >= ?",
+            (*bands, canonicalize_url(url), time.time() - self.max_age),
+        )
+        for other_url, other, title in rows:
+            # SQLite integers are signed
+            if hamming_distance(fingerprint, other & 0xFFFFFFFFFFFFFFFF) <= self.max_distance:
+                return other_url, title
+        return None
+
+    def add(self, fingerprint: int, url: str, title: Optional[str] = None) -> None:
+        signed = fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (canonicalize_url(url), signed, title, *_bands(fingerprint), time.time()),
+            )
+            self._inserts += 1
+            if self._inserts % 1000 == 0:
+                conn.execute("DELETE FROM fingerprints WHERE seen_at < ?", (time.time() - self.max_age,))
+
+
+class NearDuplicates:
+    """Near-duplicate check of one research session, backed by the cross-session store if given.
+
+    Args:
+        store: Fingerprints of earlier sessions; None compares within the session only.
+        max_distance: Largest Hamming distance that counts as a near-duplicate.
+    """
+
+    def __init__(self, store: Optional[FingerprintStore] = None, max_distance: int = MAX_DISTANCE):
+        self.session = FingerprintIndex(max_distance)
+        self.store = store
+        self._lock = threading.Lock()
+        self.counters = {"checked": 0, "session_duplicates": 0, "earlier_duplicates": 0}
+
+    def check(self, url: str, text: str, title: Optional[str] = None) -> Optional[Tuple[str, Optional[str], bool]]:
+        """Record the page and return (url, title, seen in this session) of a near-duplicate seen before, or None."""
+        if len(text) < MIN_CHARS:
+            return None
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return None
+        with self._lock:
+            self.counters["checked"] += 1
+        duplicate = self.session.find(fingerprint, url)
+        in_session = duplicate is not None
+        if duplicate is None and self.store is not None:
+            try:
+                duplicate = self.store.find(fingerprint, url)
+            except sqlite3.Error as e:
+                logger.warning(f"Fingerprint store lookup failed: {e}")
+        if not in_session:
+            # Shown in full, so later copies in this session can point to it
+            self.session.add(fingerprint, url, title)
+        if duplicate is None:
+            if self.store is not None:
+                try:
+                    self.store.add(fingerprint, url, title)
+                except sqlite3.Error as e:
+                    logger.warning(f"Fingerprint store update failed: {e}")
+            return None
+        with self._lock:
+            self.counters["session_duplicates" if in_session else "earlier_duplicates"] += 1
+        logger.info(f"{url} is a near-duplicate of {duplicate[0]}")
+        return duplicate[0], duplicate[1], in_session
+
+
+_shared_store: Optional[FingerprintStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def get_fingerprint_store(path: str = "fingerprints.sqlite") -> FingerprintStore:
+    """Return the process-wide fingerprint store shared by all sessions."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = FingerprintStore(path)
+        return _shared_store
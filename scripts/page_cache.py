@@ -0,0 +1,129 @@
+"""In-memory cache of converted pages for back/forward navigation and revisits.
+
+Agents often return to a page they saw a few steps earlier, typically after a detour through a
+web search. Fetching and converting it again costs a network round trip and, for PDFs and office
+documents, seconds of conversion. The PageCache keeps the converted text of recently shown pages,
+their viewport split and the viewport the agent was on, keyed by canonical url.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .url_utils import canonicalize_url
+from .viewport import ViewportPages
+
+
+class CachedPage:
+    """Converted state of one page: title, text, viewport split and last viewport position."""
+
+    __slots__ = ("url", "title", "truncated", "pages", "position", "stored_at", "size")
+
+    def __init__(self, url: str, title: Optional[str], truncated: Optional[str], pages: ViewportPages):
+        self.url = url
+        self.title = title
+        self.truncated = truncated
+        self.pages = pages  # Holds the text; a page still being converted keeps its source
+        self.position = 0
+        self.stored_at = time.time()
+        self.size = self.measure()
+
+    @property
+    def content(self) -> str:
+        return self.pages.content
+
+    def measure(self) -> int:
+        # The text dominates; the page bounds are two ints per viewport
+        return sys.getsizeof(self.pages.content) + 16 * self.pages.computed
+
+
+class PageCache:
+    """Bounded LRU cache of CachedPage entries with a time to live.
+
+    Args:
+        max_entries: Number of pages kept.
+        max_bytes: Upper bound for the (estimated) memory held by all entries.
+        ttl: Seconds after which an entry is stale and the page is fetched again.
+        max_page_bytes: Pages larger than this are not cached at all.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 50,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 15 * 60,
+        max_page_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_page_bytes = max_page_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._bytes = 0
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "too_large": 0}
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        key = canonicalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if time.time() - entry.stored_at > self.ttl:
+                self._remove(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry
+
+    def put(self, entry: CachedPage) -> bool:
+        """Add or replace the entry for its url. Returns False if the page is too large to cache."""
+        if entry.size > self.max_page_bytes:
+            self.counters["too_large"] += 1
+            return False
+        key = canonicalize_url(entry.url)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return True
+
+    def update(self, entry: CachedPage) -> None:
+        """Account for text an entry's page has materialized since it was added."""
+        key = canonicalize_url(entry.url)
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            size = entry.measure()
+            self._bytes += size - entry.size
+            entry.size = size
+            if size > self.max_page_bytes:
+                self._remove(key)
+                self.counters["too_large"] += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes)
@@ -0,0 +1,169 @@
+"""Search over the text of the current page, used by find_on_page / find_next.
+
+A query matches a viewport if its regex (see normalize_query) matches the viewport's normalized
+text: its words joined by single spaces and lowercased, the normalization the browser's Ctrl+F
+always used. Matches never span viewports, so a phrase cut by a page break is not found, as before.
+
+The first queries on a page are answered by a scan (ScanPageSearch): each viewport is lowercased and
+checked for the query's words, and only viewports containing all of them are normalized and
+matched. Queries whose words are rare or missing are cheap that way; common ones normalize most of
+the page each time. Once the scans have normalized as much text as the page has, it is indexed
+instead (PageSearchIndex): the normalized text of every viewport, one per line, so a query is a
+single regex search over one string. The index grows with the page when more of a lazily converted
+page arrives. Every lookup returns all hits, so the browser can jump straight to the viewport of the
+next hit.
+
+Memory-mapped pages are never indexed, that would copy them into memory after all; they are
+scanned one decoded viewport at a time, once per query.
+"""
+import bisect
+import re
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+from .mapped_text import MappedText
+from .viewport import ViewportPages
+
+_TOKEN = re.compile(r"\w+")
+
+# Number of queries whose hits are remembered per page
+QUERY_CACHE_SIZE = 16
+
+
+def normalize_query(query: str) -> Optional[str]:
+    """Turn a Ctrl+F query into a regex over normalized text, e.g. "Foo* bar" -> " foo.* bar ". None if empty."""
+    if query is None:
+        return None
+    nquery = re.sub(r"\*", "__STAR__", query)
+    nquery = " " + (" ".join(re.split(r"\W+", nquery))).strip() + " "
+    nquery = nquery.replace(" __STAR__ ", "__STAR__ ")  # Merge isolated stars with prior word
+    nquery = nquery.replace("__STAR__", ".*").lower()
+    if nquery.strip() == "":
+        return None
+    return nquery
+
+
+def normalize_text(text: str) -> str:
+    """The normalized text of a viewport that queries are matched against, e.g. "Foo, bar!" -> " foo bar "."""
+    return " " + " ".join(_TOKEN.findall(text)).lower() + " "
+
+
+class PageSearch:
+    """Base of the page searches: caches the hits of recent queries and maps hits to viewports."""
+
+    def __init__(self, length: int):
+        self.length = length  # Length of the text searched, to notice when a page has grown
+        self._hits: "OrderedDict[str, Tuple[List[int], List[int]]]" = OrderedDict()
+
+    def extend(self, content: Union[str, MappedText]) -> None:
+        """Search content from now on: the same page with more text converted (it starts with the text so far)."""
+        self.length = len(content)
+        self._hits.clear()
+
+    def find(self, query: str, pages: ViewportPages) -> Tuple[List[int], List[int]]:
+        """All hits of query: their offsets in the original text and the sorted viewports containing them.
+
+        A hit is reported at the start of its viewport, which is all the browser needs to jump there.
+        """
+        nquery = normalize_query(query)
+        if nquery is None:
+            return [], []
+        result = self._hits.get(nquery)
+        if result is None:
+            hits = self._search(nquery, pages)
+            result = self._hits[nquery] = (hits, self.viewports(hits, pages))
+            while len(self._hits) > QUERY_CACHE_SIZE:
+                self._hits.popitem(last=False)
+        else:
+            self._hits.move_to_end(nquery)
+        return result
+
+    def _search(self, nquery: str, pages: ViewportPages) -> List[int]:
+        raise NotImplementedError()
+
+    def viewports(self, hits: List[int], pages: ViewportPages) -> List[int]:
+        """Sorted indexes of the viewports that contain at least one of the hits."""
+        result: List[int] = []
+        for offset in hits:
+            page = pages.page_of(offset)
+            if not result or result[-1] != page:
+                result.append(page)
+        return result
+
+
+class PageSearchIndex(PageSearch):
+    """The normalized text of all viewports of a page, one line per viewport.
+
+    Queries contain no line breaks and "." does not match one, so no match spans viewports.
+
+    Args:
+        content: The page text.
+    """
+
+    def __init__(self, content: str):
+        super().__init__(len(content))
+        self.normalized = ""
+        self._starts: List[int] = []  # Start of each indexed viewport's line in normalized
+        self._bounds: List[Tuple[int, int]] = []  # The indexed viewports
+
+    def __len__(self) -> int:
+        """Number of viewports indexed so far."""
+        return len(self._bounds)
+
+    def _index(self, pages: ViewportPages) -> None:
+        """Index the viewports of the text so far that are not indexed yet."""
+        if self._bounds and self._bounds[-1][1] >= self.length:
+            return
+        last = pages.page_of(max(self.length - 1, 0))
+        lines = []
+        position = len(self.normalized) + 1 if self._bounds else 0
+        for page in range(len(self._bounds), last + 1):
+            start, end = pages[page]
+            line = normalize_text(pages.content[start:end])
+            self._starts.append(position)
+            self._bounds.append((start, end))
+            lines.append(line)
+            position += len(line) + 1
+        if lines:
+            self.normalized += ("\n" if self.normalized else "") + "\n".join(lines)
+
+    def _search(self, nquery: str, pages: ViewportPages) -> List[int]:
+        self._index(pages)
+        hits = []
+        for match in re.finditer(nquery, self.normalized):
+            page = bisect.bisect_right(self._starts, match.start()) - 1
+            hits.append(self._bounds[page][0])
+        return hits
+
+
+class ScanPageSearch(PageSearch):
+    """Search without an index: every new query scans the viewports once.
+
+    Args:
+        content: The page text, or a mapped page.
+    """
+
+    def __init__(self, content: Union[str, MappedText]):
+        super().__init__(len(content))
+        self.content = content
+        self.scanned = 0  # Characters normalized by all queries so far
+
+    def extend(self, content: Union[str, MappedText]) -> None:
+        super().extend(content)
+        self.content = content
+
+    def _search(self, nquery: str, pages: ViewportPages) -> List[int]:
+        pattern = re.compile(nquery)
+        # Cheap substring check first: most viewports lack one of the query's words
+        words = [word for token in nquery.split() for word in token.split(".*") if word]
+        hits: List[int] = []
+        # Only the text converted so far, even if the pages have been computed further meanwhile
+        for page in range(pages.page_of(max(self.length - 1, 0)) + 1):
+            start, end = pages[page]
+            text = self.content[start:end]
+            lowered = text.lower()
+            if not all(word in lowered for word in words):
+                continue
+            self.scanned += len(text)
+            hits.extend(start for _ in pattern.finditer(normalize_text(text)))
+        return hits
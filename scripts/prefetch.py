@@ -0,0 +1,168 @@
+"""Background prefetching of search result pages.
+
+After a web search the agent usually visits several of the listed results one after another.
+The Prefetcher loads the top results in a small thread pool while the agent is still thinking,
+so that a later visit_page call for one of them is answered from memory. Like the PageCache,
+prefetched pages are keyed by canonical url and go stale after a while.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .url_utils import canonicalize_url
+
+
+class Prefetcher:
+    """Fetches and converts the top-N result urls of a search in the background.
+
+    One Prefetcher belongs to one browser session; its limits apply to that session.
+
+    Args:
+        top_n: Number of result urls to prefetch per search.
+        max_workers: Size of the thread pool, i.e. concurrent prefetches.
+        max_urls: Maximum number of urls prefetched over the whole session.
+        max_bytes: Maximum total size of prefetched page texts over the whole session.
+        max_page_bytes: Prefetched pages larger than this are dropped instead of kept in memory.
+        ttl: Seconds after which a prefetched page is stale and no longer served (as in the PageCache).
+    """
+
+    def __init__(
+        self,
+        top_n: int = 3,
+        max_workers: int = 3,
+        max_urls: int = 50,
+        max_bytes: int = 20 * 1024 * 1024,
+        max_page_bytes: int = 2 * 1024 * 1024,
+        ttl: float = 15 * 60,
+    ):
+        self.top_n = top_n
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.max_page_bytes = max_page_bytes
+        self.ttl = ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}  # By canonical url
+        self._loaded_at: Dict[str, float] = {}  # Completion time of the prefetched pages, by canonical url
+        self._urls_used = 0
+        self._bytes_used = 0  # Session budget, never decreases
+        self._bytes_held = 0  # Prefetched pages not yet taken
+        self.counters: Dict[str, int] = {
+            "scheduled": 0,
+            "completed": 0,
+            "failed": 0,
+            "skipped": 0,
+            "hits": 0,
+            "joined": 0,
+            "expired": 0,
+        }
+
+    def prefetch(self, urls: List[str], load: Callable[[str], Any]) -> None:
+        """Schedule the first ``top_n`` http(s) urls. ``load`` returns a LoadedPage or None."""
+        candidates: Dict[str, str] = {}
+        for url in urls:
+            if len(candidates) >= self.top_n:
+                break
+            if url.startswith("http:") or url.startswith("https:"):
+                candidates.setdefault(canonicalize_url(url), url)
+
+        with self._lock:
+            self._drop_expired()
+            for key, url in candidates.items():
+                if key in self._futures:
+                    continue
+                if self._urls_used >= self.max_urls or self._bytes_used >= self.max_bytes:
+                    self.counters["skipped"] += 1
+                    continue
+                self._urls_used += 1
+                self.counters["scheduled"] += 1
+                # Run in the caller's context, so the fetches count towards its rate limit session
+                context = contextvars.copy_context()
+                self._futures[key] = self._executor.submit(context.run, self._run, key, url, load)
+
+    def _run(self, key: str, url: str, load: Callable[[str], Any]) -> Any:
+        try:
+            page = load(url)
+        except Exception as e:
+            logger.warning(f"Prefetch of {url} failed: {e}")
+            page = None
+
+        # Only keep successfully converted pages that fit into the session budget
+        size = _page_bytes(page) if page is not None else 0
+        with self._lock:
+            if page is None or page.error or size > self.max_page_bytes or self._bytes_used + size > self.max_bytes:
+                self.counters["failed"] += 1
+                self._futures.pop(key, None)
+                return None
+            self._bytes_used += size
+            self._bytes_held += size
+            self._loaded_at[key] = time.time()
+            self.counters["completed"] += 1
+        logger.debug(f"Prefetched {url} ({size} bytes)")
+        return page
+
+    def take(self, url: str) -> Optional[Any]:
+        """Return the prefetched page for the url (waiting for an in-flight prefetch) or None."""
+        key = canonicalize_url(url)
+        with self._lock:
+            self._drop_expired()
+            future = self._futures.pop(key, None)
+            if future is None:
+                return None
+            self._loaded_at.pop(key, None)
+            in_flight = not future.done()
+        try:
+            page = future.result()
+        except Exception:
+            page = None
+        if page is None:
+            return None
+
+        with self._lock:
+            self._bytes_held -= _page_bytes(page)
+            self.counters["joined" if in_flight else "hits"] += 1
+        logger.info(f"Serving {url} from prefetch")
+        return page
+
+    def _drop_expired(self) -> None:
+        """Forget prefetched pages older than the ttl (called with the lock held)."""
+        now = time.time()
+        for key, loaded_at in list(self._loaded_at.items()):
+            future = self._futures.get(key)
+            if now - loaded_at <= self.ttl or (future is not None and not future.done()):
+                continue
+            del self._loaded_at[key]
+            if future is not None:
+                del self._futures[key]
+                self._bytes_held -= _page_bytes(future.result())
+            self.counters["expired"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["pending"] = len(self._futures)
+            stats["bytes_used"] = self._bytes_used
+            stats["bytes_in_memory"] = self._bytes_held
+            stats["urls_used"] = self._urls_used
+        served = stats["hits"] + stats["joined"]
+        stats["hit_rate"] = served / stats["scheduled"] if stats["scheduled"] else 0.0
+        return stats
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._futures.clear()
+            self._loaded_at.clear()
+            self._bytes_held = 0
+
+
+def _page_bytes(page: Any) -> int:
+    """Memory a prefetched page holds; memory-mapped text files are not held in memory."""
+    if not isinstance(page.content, str):
+        return 0
+    return len(page.content.encode("utf-8", errors="ignore"))
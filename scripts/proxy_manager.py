@@ -1,12 +1,14 @@
 from typing import Optional, List
 import random
 import time
-import requests
 from threading import Lock
 from loguru import logger
 import re
 from bs4 import BeautifulSoup
 
+from .http_pool import get_session
+from .http_retry import NO_RETRIES, retry_policy_scope
+
 class ProxyManager:
     def __init__(self, min_proxies: int = 5, timeout: int = 10):
         logger.info(f'Starting ProxyManager initialization with min_proxies={min_proxies}, timeout={timeout}')
@@ -73,7 +75,9 @@ class ProxyManager:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
-            response = requests.get(url, headers=headers, timeout=10)
+            # Keine Wiederholungen: eine ausgefallene Quelle wird übersprungen
+            with retry_policy_scope(NO_RETRIES):
+                response = get_session().get(url, headers=headers, timeout=10)
             
             if response.status_code != 200:
                 return []
@@ -97,7 +101,8 @@ class ProxyManager:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
-            response = requests.get(url, headers=headers, timeout=10)
+            with retry_policy_scope(NO_RETRIES):
+                response = get_session().get(url, headers=headers, timeout=10)
             
             if response.status_code != 200:
                 return []
@@ -134,7 +139,9 @@ class ProxyManager:
                 "http": proxy,
                 "https": proxy
             }
-            response = requests.get(test_url, proxies=proxies, timeout=5)  # Kürzerer Timeout
+            # Keine Wiederholungen: ein toter Proxy soll schnell verworfen werden
+            with retry_policy_scope(NO_RETRIES):
+                response = get_session().get(test_url, proxies=proxies, timeout=5)  # Kürzerer Timeout
             return response.status_code == 200
         except Exception:
             return False
@@ -0,0 +1,245 @@
+"""Per-host politeness scheduling for all outbound fetches.
+
+Every request to a host first takes a token from that host's bucket. Buckets refill at a
+configurable rate up to a burst size; when a host answers 429/503 with Retry-After, the bucket
+is closed until then. Requests waiting for the same host are served round-robin per research
+session, so one busy session cannot starve the others.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from loguru import logger
+
+# (requests per second, burst) by host suffix, "*" applies to all other hosts
+DEFAULT_HOST_RATES: Dict[str, Tuple[float, int]] = {
+    "*": (4.0, 8),
+    "duckduckgo.com": (0.5, 2),
+    "archive.org": (1.0, 3),
+    "youtube.com": (1.0, 3),
+}
+
+# How often async waiters check whether it is their turn
+ASYNC_POLL_INTERVAL = 0.05
+
+# Without a Retry-After header a 429 closes the bucket for this long
+DEFAULT_BACKOFF = 5.0
+
+_session_id: ContextVar[str] = ContextVar("rate_limit_session", default="default")
+
+
+@contextmanager
+def rate_limit_session(session_id: str) -> Iterator[None]:
+    """Attribute all fetches in this context (thread, task) to one research session for fair queuing."""
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _HostBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+        # Waiting tickets per session; the first session in the dict is served next
+        self.queues: "OrderedDict[str, Deque[object]]" = OrderedDict()
+        self.counters: Dict[str, Any] = {"requests": 0, "waited": 0, "wait_seconds": 0.0, "deferrals": 0}
+
+    def _wait_time(self, now: float) -> float:
+        """Refill the bucket and return how long until a token is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def _next_ticket(self) -> Optional[object]:
+        for queue in self.queues.values():
+            return queue[0]
+        return None
+
+
+class HostRateLimiter:
+    """Token buckets keyed by host with fair queuing across sessions and Retry-After support.
+
+    Args:
+        host_rates: ``{host suffix: (requests per second, burst)}``, merged over DEFAULT_HOST_RATES.
+            A suffix covers its subdomains, e.g. "archive.org" also limits "web.archive.org", and
+            they share one bucket.
+        max_wait: Upper bound in seconds for a single wait; a request that would wait longer is
+            sent anyway (and logged) instead of stalling the research step.
+    """
+
+    def __init__(self, host_rates: Optional[Dict[str, Tuple[float, int]]] = None, max_wait: float = 60.0):
+        self.host_rates = dict(DEFAULT_HOST_RATES)
+        if host_rates:
+            self.host_rates.update(host_rates)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _HostBucket] = {}
+
+    def _bucket_key(self, host: str) -> Tuple[str, Tuple[float, int]]:
+        host = (host or "").lower().split(":")[0]
+        best = None
+        for suffix in self.host_rates:
+            if suffix != "*" and (host == suffix or host.endswith("." + suffix)):
+                if best is None or len(suffix) > len(best):
+                    best = suffix
+        if best is None:
+            return host, self.host_rates["*"]
+        return best, self.host_rates[best]
+
+    def _bucket(self, host: str) -> _HostBucket:
+        key, (rate, burst) = self._bucket_key(host)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _HostBucket(rate, burst)
+            return bucket
+
+    def acquire(self, host: str) -> float:
+        """Block until a request to host may be sent. Returns the seconds waited."""
+        bucket, session, ticket = self._enqueue(host)
+        start = time.monotonic()
+        with bucket.condition:
+            try:
+                while True:
+                    wait = self._try_take(bucket, ticket, host, start)
+                    if wait == 0:
+                        return self._count_wait(bucket, start)
+                    bucket.condition.wait(wait)
+            finally:
+                self._dequeue(bucket, session, ticket)
+
+    async def aacquire(self, host: str) -> float:
+        """Like acquire(), but waits on the event loop instead of blocking a thread."""
+        bucket, session, ticket = self._enqueue(host)
+        start = time.monotonic()
+        try:
+            while True:
+                with bucket.condition:
+                    wait = self._try_take(bucket, ticket, host, start)
+                    if wait == 0:
+                        return self._count_wait(bucket, start)
+                # Waiters behind another session have no deadline of their own, poll for their turn
+                await asyncio.sleep(wait if wait is not None else ASYNC_POLL_INTERVAL)
+        finally:
+            with bucket.condition:
+                self._dequeue(bucket, session, ticket)
+
+    def _enqueue(self, host: str) -> Tuple[_HostBucket, str, object]:
+        bucket = self._bucket(host)
+        session = _session_id.get()
+        ticket = object()
+        with bucket.condition:
+            bucket.queues.setdefault(session, deque()).append(ticket)
+        return bucket, session, ticket
+
+    def _try_take(self, bucket: _HostBucket, ticket: object, host: str, start: float) -> Optional[float]:
+        """Take a token if it is the ticket's turn. Returns 0 on success, else the time to wait (None: until notified)."""
+        if bucket._next_ticket() is not ticket:
+            return None
+        now = time.monotonic()
+        wait = bucket._wait_time(now)
+        if wait > 0 and now - start < self.max_wait:
+            return min(wait, self.max_wait - (now - start))
+        if wait > 0:
+            logger.warning(f"Rate limit for {host}: gave up waiting after {now - start:.1f} s")
+        bucket.tokens -= 1
+        return 0
+
+    def _count_wait(self, bucket: _HostBucket, start: float) -> float:
+        waited = time.monotonic() - start
+        bucket.counters["requests"] += 1
+        if waited > 0.001:
+            bucket.counters["waited"] += 1
+            bucket.counters["wait_seconds"] += waited
+        return waited
+
+    def _dequeue(self, bucket: _HostBucket, session: str, ticket: object) -> None:
+        # Leave the queue and let the next session take its turn
+        queue = bucket.queues.get(session)
+        if queue is not None:
+            queue.remove(ticket)
+            if queue:
+                bucket.queues.move_to_end(session)
+            else:
+                del bucket.queues[session]
+        bucket.condition.notify_all()
+
+    def defer(self, host: str, seconds: float) -> None:
+        """Close the host's bucket for the given time, e.g. after a 429 response."""
+        bucket = self._bucket(host)
+        with bucket.condition:
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+            bucket.tokens = 0.0
+            bucket.counters["deferrals"] += 1
+            bucket.condition.notify_all()
+        logger.info(f"Rate limit: pausing requests to {host} for {seconds:.1f} s")
+
+    def observe(self, host: str, status_code: int, headers: Any) -> None:
+        """Honour Retry-After (or back off) when a host signals overload."""
+        if status_code not in (429, 503):
+            return
+        delay = parse_retry_after(headers.get("retry-after"))
+        if delay is None:
+            if status_code != 429:
+                return
+            delay = DEFAULT_BACKOFF
+        self.defer(host, min(delay, self.max_wait))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        stats = {}
+        for key, bucket in buckets.items():
+            with bucket.condition:
+                stats[key] = dict(bucket.counters, queued=sum(len(q) for q in bucket.queues.values()))
+        return stats
+
+
+_shared_limiter: Optional[HostRateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+
+def configure_rate_limiter(**kwargs: Any) -> HostRateLimiter:
+    """(Re)create the process-wide rate limiter with the given HostRateLimiter arguments."""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        _shared_limiter = HostRateLimiter(**kwargs)
+    logger.info(f"Rate limiter configured: {kwargs}")
+    return _shared_limiter
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """Return the process-wide rate limiter, creating it with default rates on first use."""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = HostRateLimiter()
+        return _shared_limiter
@@ -0,0 +1,82 @@
+"""BM25 ranking of the viewports of a page against a natural-language query.
+
+The term counts of all viewports are computed once per page as a sparse matrix; scoring a query
+then only touches the columns of its terms, so asking several questions about the same long
+document costs a few vectorized operations each.
+"""
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from .viewport import ViewportPages
+
+
+class ViewportRanker:
+    """Okapi BM25 over a fixed set of texts (the viewports of one page).
+
+    Args:
+        texts: The viewport texts (consumed once, may be a generator).
+        k1: Term frequency saturation.
+        b: Strength of the length normalization.
+    """
+
+    def __init__(self, texts: Iterable[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._vectorizer = CountVectorizer(lowercase=True, dtype=np.float32)
+        try:
+            self._counts = self._vectorizer.fit_transform(texts).tocsc()
+        except ValueError:
+            # Only stop words or no words at all
+            self._counts = None
+            return
+        lengths = np.asarray(self._counts.sum(axis=1)).ravel()
+        mean_length = lengths.mean() if lengths.size else 0.0
+        self._norm = k1 * (1 - b + b * lengths / mean_length) if mean_length > 0 else np.full(lengths.shape, k1)
+        document_frequency = np.diff(self._counts.indptr)
+        n = self._counts.shape[0]
+        self._idf = np.log1p((n - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every text for query (zeros if no query term occurs)."""
+        if self._counts is None:
+            return np.zeros(0)
+        scores = np.zeros(self._counts.shape[0], dtype=np.float64)
+        vocabulary = self._vectorizer.vocabulary_
+        analyzer = self._vectorizer.build_analyzer()
+        for term in set(analyzer(query)):
+            column = vocabulary.get(term)
+            if column is None:
+                continue
+            start, end = self._counts.indptr[column], self._counts.indptr[column + 1]
+            rows = self._counts.indices[start:end]
+            tf = self._counts.data[start:end]
+            scores[rows] += self._idf[column] * tf * (self.k1 + 1) / (tf + self._norm[rows])
+        return scores
+
+    def top(self, query: str, k: int = 3) -> List[Tuple[int, float]]:
+        """The k best (index, score) pairs with a positive score, best first."""
+        scores = self.scores(query)
+        if not scores.size:
+            return []
+        k = min(k, scores.size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(i), float(scores[i])) for i in best if scores[i] > 0]
+
+
+def best_excerpt(text: str, chars: int, query: Optional[str] = None) -> Tuple[int, int]:
+    """Bounds of the at most chars long window of text that best matches query (the first one without a query).
+
+    Windows end on whitespace like viewports do; text that fits into chars is returned whole.
+    """
+    if len(text) <= chars:
+        return 0, len(text)
+    overshoot = max(chars // 8, 1)
+    windows = ViewportPages(text, max(chars - overshoot, 1), max_overshoot=overshoot)
+    if not query:
+        return windows[0]
+    bounds = list(windows)
+    best = ViewportRanker(text[start:end] for start, end in bounds).top(query, 1)
+    return bounds[best[0][0]] if best else bounds[0]
@@ -0,0 +1,154 @@
+"""Byte and time limits for reading HTTP response bodies.
+
+A huge download or a server that drips a few bytes per second must not stall a research step
+for minutes or fill the disk. Bodies are read through a LimitedBody, which stops at a per
+content-type byte limit or a total deadline and records why it stopped.
+"""
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from .cleanup import format_size
+
+MB = 1024 * 1024
+
+# Longest matching content-type prefix wins, "*" applies to everything else
+DEFAULT_MAX_BYTES: Dict[str, int] = {
+    "text/html": 10 * MB,
+    "text/": 20 * MB,
+    "application/pdf": 50 * MB,
+    "image/": 20 * MB,
+    "audio/": 50 * MB,
+    "*": 100 * MB,
+}
+
+
+def _trim_partial_utf8(data: bytes) -> bytes:
+    """Drop an incomplete UTF-8 sequence at the end of a cut-off text body."""
+    end = len(data)
+    i = end - 1
+    # Skip back over up to three continuation bytes to the lead byte
+    while i >= 0 and end - i <= 3 and (data[i] & 0xC0) == 0x80:
+        i -= 1
+    if i >= 0 and data[i] >= 0xC0:
+        needed = 2 if data[i] < 0xE0 else 3 if data[i] < 0xF0 else 4
+        if end - i < needed:
+            return data[:i]
+    return data
+
+
+class LimitedBody:
+    """Iterates over a response body (``requests`` or ``httpx``) until it ends or a limit is hit.
+
+    After iteration ``truncated`` holds the reason if the body was cut off, and ``bytes_read``
+    the number of (decoded) bytes delivered.
+    """
+
+    def __init__(self, response: Any, max_bytes: int, deadline: float, chunk_size: int):
+        self.response = response
+        self.max_bytes = max_bytes
+        self.deadline = deadline
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.truncated: Optional[str] = None
+
+        # Time spent waiting for the headers counts towards the deadline too
+        elapsed = 0.0
+        try:
+            elapsed = response.elapsed.total_seconds()
+        except (AttributeError, RuntimeError):  # httpx only knows elapsed after the response is closed
+            pass
+        self._deadline_at = time.monotonic() - elapsed + deadline
+
+    def _take(self, chunk: bytes) -> bytes:
+        """Account for a chunk and cut it at the byte limit."""
+        remaining = self.max_bytes - self.bytes_read
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+            self.truncated = f"response exceeded the limit of {format_size(self.max_bytes)}"
+        elif time.monotonic() > self._deadline_at:
+            self.truncated = f"download took longer than {self.deadline:g} s"
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def _last(self, chunk: bytes) -> bytes:
+        if self.truncated:
+            trimmed = _trim_partial_utf8(chunk)
+            self.bytes_read -= len(chunk) - len(trimmed)
+            return trimmed
+        return chunk
+
+    def __iter__(self) -> Iterator[bytes]:
+        # The previous chunk is held back one step, so a cut-off multi-byte character can be removed from it
+        pending = b""
+        for chunk in self.response.iter_content(chunk_size=self.chunk_size):
+            if not chunk:
+                continue
+            chunk = self._take(chunk)
+            if pending:
+                yield pending
+            pending = chunk
+            if self.truncated:
+                break
+        if pending:
+            yield self._last(pending)
+        if self.truncated:
+            # Abort the transfer instead of draining the rest of the body
+            self.response.close()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        pending = b""
+        async for chunk in self.response.aiter_bytes(self.chunk_size):
+            if not chunk:
+                continue
+            chunk = self._take(chunk)
+            if pending:
+                yield pending
+            pending = chunk
+            if self.truncated:
+                break
+        if pending:
+            yield self._last(pending)
+        if self.truncated:
+            await self.response.aclose()
+
+
+class ResponseLimits:
+    """Per content-type byte limits plus a total deadline for reading one response.
+
+    Args:
+        max_bytes: Maps content-type prefixes to byte limits, see DEFAULT_MAX_BYTES.
+        deadline: Seconds a single fetch (headers and body) may take in total. This is independent of
+            the socket timeout in request_kwargs, which only bounds the wait for a single read.
+        chunk_size: Read size; also the granularity in which the deadline is checked.
+    """
+
+    def __init__(self, max_bytes: Optional[Dict[str, int]] = None, deadline: float = 120.0, chunk_size: int = 64 * 1024):
+        self.max_bytes = dict(DEFAULT_MAX_BYTES)
+        if max_bytes:
+            self.max_bytes.update(max_bytes)
+        self.deadline = deadline
+        self.chunk_size = chunk_size
+
+    def max_bytes_for(self, content_type: str) -> int:
+        content_type = content_type.split(";")[0].strip().lower()
+        best = None
+        for prefix in self.max_bytes:
+            if prefix != "*" and content_type.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return self.max_bytes[best] if best is not None else self.max_bytes["*"]
+
+    def declared_too_large(self, headers: Any) -> Optional[str]:
+        """Return a reason if the Content-Length already exceeds the limit for the content type."""
+        content_type = headers.get("content-type", "")
+        try:
+            length = int(headers.get("content-length", ""))
+        except ValueError:
+            return None
+        limit = self.max_bytes_for(content_type)
+        if length > limit:
+            return f"the file is {format_size(length)}, the limit for '{content_type or 'unknown'}' is {format_size(limit)}"
+        return None
+
+    def body(self, response: Any) -> LimitedBody:
+        content_type = response.headers.get("content-type", "")
+        return LimitedBody(response, self.max_bytes_for(content_type), self.deadline, self.chunk_size)
@@ -0,0 +1,176 @@
+"""Merging and re-ranking of web search results.
+
+A batched search runs variations of a query at once. Their result lists overlap, often with
+slightly different urls for the same page (tracking parameters, fragments, host case), so the
+results are keyed by canonical url and fused by reciprocal rank: a page found near the top by
+several queries ends up above one found by a single query.
+
+The SearchReranker reorders a result list before the agent sees it: BM25 of title and snippet
+against the search query, the research question and the strategy of the current round, blended
+with the search engine's own order and the domain health scoreboard. A result list has only a
+handful of short documents, so this is a few small NumPy operations.
+"""
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .url_utils import canonicalize_url
+
+# Damping of reciprocal rank fusion; larger values flatten the influence of the rank
+RRF_K = 60
+
+
+def result_url(result: Dict[str, str]) -> str:
+    """The url of a DDGS / SerpAPI result dict."""
+    return result.get("href", result.get("link", ""))
+
+
+class FusedResult:
+    """One distinct page of a batched search, with the queries (and ranks) that found it."""
+
+    def __init__(self, result: Dict[str, str]):
+        self.result = result  # The first result dict seen for the page
+        self.found_by: List[Tuple[str, int]] = []  # (query, 1-based rank)
+        self.score = 0.0
+        self.note: Optional[str] = None  # Source health note for the agent, if any
+
+    @property
+    def url(self) -> str:
+        return result_url(self.result)
+
+
+def fuse_results(batches: Sequence[Tuple[str, List[Dict[str, str]]]], k: int = RRF_K) -> List[FusedResult]:
+    """Merge (query, results) lists into distinct pages, best reciprocal rank fusion score first.
+
+    Ties keep the order in which the pages were first seen, i.e. query order, then rank.
+    """
+    fused: Dict[str, FusedResult] = {}
+    for query, results in batches:
+        for rank, result in enumerate(results, 1):
+            url = result_url(result)
+            if not url:
+                continue
+            key = canonicalize_url(url)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = FusedResult(result)
+            elif any(q == query for q, _ in entry.found_by):
+                continue  # Same page twice in one list, only its best rank counts
+            entry.found_by.append((query, rank))
+            entry.score += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda entry: -entry.score)
+
+
+_TERM = re.compile(r"\w{2,}")
+
+
+def _terms(text: str) -> List[str]:
+    return _TERM.findall(text.lower())
+
+
+class SearchReranker:
+    """Reorders and trims search results by relevance to the research at hand.
+
+    One reranker serves all tabs of a research session; set_context tells it the question and
+    the strategy of the current round.
+
+    Args:
+        context_weight: Weight of the strategy terms relative to the query and question terms.
+        rank_weight: Weight of the search engine's own order (the top result gets all of it).
+        unhealthy_factor: Score factor for results from slow or unreliable domains.
+        min_results: Results kept at least, even if they match nothing.
+        max_results: Results kept at most; None keeps all matching ones.
+        k1: BM25 term frequency saturation.
+        b: BM25 length normalization.
+    """
+
+    def __init__(
+        self,
+        context_weight: float = 0.5,
+        rank_weight: float = 0.3,
+        unhealthy_factor: float = 0.5,
+        min_results: int = 5,
+        max_results: Optional[int] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.context_weight = context_weight
+        self.rank_weight = rank_weight
+        self.unhealthy_factor = unhealthy_factor
+        self.min_results = min_results
+        self.max_results = max_results
+        self.k1 = k1
+        self.b = b
+        self._question_terms: frozenset = frozenset()
+        self._strategy_terms: frozenset = frozenset()
+
+    def set_context(self, question: Optional[str] = None, strategy: Optional[str] = None) -> None:
+        """The research question and the current round's strategy text; either may be None."""
+        self._question_terms = frozenset(_terms(question or ""))
+        self._strategy_terms = frozenset(_terms(strategy or ""))
+
+    def order(
+        self, query: str, results: Sequence[Dict[str, str]], domain_health: Optional[Any] = None
+    ) -> List[Tuple[int, Optional[str]]]:
+        """(index into results, source health note) of the results to show, best first."""
+        n = len(results)
+        if n == 0:
+            return []
+        docs = [_terms(f"{r.get('title', '')} {r.get('body', r.get('snippet', ''))}") for r in results]
+        query_terms = frozenset(_terms(query))
+        main_terms = query_terms | self._question_terms
+        columns = {term: j for j, term in enumerate(main_terms | self._strategy_terms)}
+
+        tf = np.zeros((n, max(len(columns), 1)))
+        for i, doc in enumerate(docs):
+            for term in doc:
+                j = columns.get(term)
+                if j is not None:
+                    tf[i, j] += 1
+        lengths = np.array([len(doc) for doc in docs], dtype=np.float64)
+        mean_length = lengths.mean() or 1.0
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        if n >= 4:
+            # Context terms in most results (stop words, the topic itself) do not discriminate; the
+            # search query's own terms always count, a result list that matches them throughout is a good one
+            common = df > n / 2
+            for term, j in columns.items():
+                if common[j] and term not in query_terms:
+                    idf[j] = 0.0
+        bm25 = idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * lengths / mean_length)[:, None])
+        weights = np.full(tf.shape[1], self.context_weight)
+        for term, j in columns.items():
+            if term in main_terms:
+                weights[j] = 1.0
+        relevance = bm25 @ weights
+        top = relevance.max()
+        scores = (relevance / top if top > 0 else relevance) + self.rank_weight * (1 - np.arange(n) / n)
+
+        health = [(0, None)] * n
+        if domain_health is not None:
+            health = [domain_health.describe(result_url(r)) for r in results]
+        for i, (rank, _) in enumerate(health):
+            if rank == 1:
+                scores[i] *= self.unhealthy_factor
+        # Domains with an open circuit breaker last, as without reranking
+        ordered = sorted(range(n), key=lambda i: (health[i][0] == 2, -scores[i]))
+
+        if relevance.max() == relevance.min():
+            # Relevance doesn't tell the results apart, so it is no reason to drop any
+            kept = [(i, health[i][1]) for i in ordered]
+            return kept[: self.max_results] if self.max_results is not None else kept
+
+        # Every matching result stays; non-matching ones only fill up to min_results
+        padding = max(self.min_results - int(np.count_nonzero(relevance > 0)), 0)
+        kept = []
+        for i in ordered:
+            if relevance[i] <= 0:
+                if padding == 0:
+                    continue
+                padding -= 1
+            kept.append((i, health[i][1]))
+        if self.max_results is not None:
+            kept = kept[: self.max_results]
+        return kept
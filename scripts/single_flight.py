@@ -0,0 +1,154 @@
+"""Coalescing of identical concurrent work across all browsers of the process ("single flight").
+
+When several research sessions visit the same url or run the same search at the same time, the
+first caller does the work and the others wait for it and get the same result. Nothing is kept
+once the work is done; repeating it later is up to the caches (HTTP cache, page cache).
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers of the same key share its result.
+
+    Args:
+        name: Shown in the logs and metrics.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.counters = {"calls": 0, "executed": 0, "coalesced": 0, "errors": 0}
+
+    def do(
+        self, key: Hashable, fn: Callable[[], Any], share: Optional[Callable[[Any, int], Any]] = None
+    ) -> Tuple[Any, bool]:
+        """Return (result of fn, whether it was shared from a call already in flight).
+
+        If the call in flight raises, every caller waiting for it gets the exception. share, if
+        given, is called by the caller that ran fn with its result and the number of callers that
+        joined, before any of them gets it; what it returns is the result.
+        """
+        with self._lock:
+            self.counters["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters["executed"] += 1
+            else:
+                call.waiters += 1
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            logger.debug(f"Single flight {self.name}: joining the call in flight for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            result = fn()
+            with self._lock:
+                # No one can join any more
+                del self._calls[key]
+            call.result = share(result, call.waiters) if share is not None else result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._calls.pop(key, None)
+                self.counters["errors"] += 1
+            raise
+        finally:
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["in_flight"] = len(self._calls)
+        stats["coalesced_rate"] = stats["coalesced"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+
+class SharedChunks:
+    """Thread-safe replay of an iterator, so that several consumers can read one lazily produced text.
+
+    Every reader() yields all chunks from the start; each chunk is produced once. Once expect()
+    says how many readers there are, a chunk is dropped as soon as all of them have read it.
+    """
+
+    def __init__(self, source: Iterator[str]):
+        self._source: Optional[Iterator[str]] = source
+        self._chunks: Dict[int, str] = {}
+        self._reads: Dict[int, int] = {}
+        self._produced = 0
+        self._readers: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def expect(self, readers: int) -> None:
+        """Tell how many readers will read the chunks (None of them may have started yet)."""
+        with self._lock:
+            self._readers = readers
+
+    def _chunk(self, index: int) -> Optional[str]:
+        with self._lock:
+            while index >= self._produced and self._source is not None:
+                chunk = next(self._source, None)
+                if chunk is None:
+                    self._source = None
+                else:
+                    self._chunks[self._produced] = chunk
+                    self._produced += 1
+            if index >= self._produced:
+                return None
+            chunk = self._chunks[index]
+            reads = self._reads.get(index, 0) + 1
+            if self._readers is not None and reads >= self._readers:
+                del self._chunks[index]
+                self._reads.pop(index, None)
+            else:
+                self._reads[index] = reads
+            return chunk
+
+    def reader(self) -> Iterator[str]:
+        index = 0
+        while True:
+            chunk = self._chunk(index)
+            if chunk is None:
+                return
+            yield chunk
+            index += 1
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Return the process-wide SingleFlight of that name (e.g. "pages", "search"), creating it on first use."""
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
+
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """Coalescing counters of all process-wide SingleFlights, by name."""
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.stats() for name, flight in flights.items()}
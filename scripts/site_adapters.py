@@ -0,0 +1,194 @@
+"""Lean endpoints for well-known sites, tried before the page itself is fetched.
+
+Some sites offer their content without the page around it: Wikipedia serves the article body
+alone through its REST API, arXiv the metadata and abstract of a paper as a small Atom feed, and
+YouTube transcripts only need the video id. A SiteAdapter recognizes such urls and produces the
+same DocumentConverterResult as the converter of the full page would, from a fraction of the
+bytes. If an adapter fails (or does not apply after all) the page is fetched as usual.
+"""
+import re
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, List, Optional
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from loguru import logger
+
+from .mdconvert import DocumentConverterResult, _CustomMarkdownify, fetch_youtube_transcript
+
+# Timeout of the requests to the lean endpoints; a slow adapter should not delay the fallback much
+ADAPTER_TIMEOUT = 20
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+class SiteAdapter:
+    """Base class of the site adapters."""
+
+    name = "site"
+
+    def match(self, url: str) -> Optional[Any]:
+        """What the adapter needs to know about url (e.g. an id), or None if it does not handle the url."""
+        raise NotImplementedError()
+
+    def convert(self, match: Any, get: Callable[..., requests.Response]) -> Optional[DocumentConverterResult]:
+        """Fetch and convert the content for a match with get (like requests.get). None falls back to fetching the page."""
+        raise NotImplementedError()
+
+
+class WikipediaAdapter(SiteAdapter):
+    """Wikipedia articles from the REST API (Parsoid HTML of the article body, no skin or navigation)."""
+
+    name = "wikipedia"
+    _URL = re.compile(r"^https?://([a-zA-Z]{2,3}(?:-[a-zA-Z]+)?)\.(?:m\.)?wikipedia\.org/wiki/([^?#]+)(?:#.*)?$")
+
+    def match(self, url: str) -> Optional[Any]:
+        m = self._URL.match(url)
+        if m is None:
+            return None
+        title = unquote(m.group(2))
+        if re.match(r"^(Special|Spezial):", title):
+            # Generated pages have no stored content
+            return None
+        return m.group(1).lower(), title
+
+    def convert(self, match: Any, get: Callable[..., requests.Response]) -> Optional[DocumentConverterResult]:
+        language, title = match
+        response = get(
+            f"https://{language}.wikipedia.org/api/rest_v1/page/html/{quote(title, safe='')}",
+            timeout=ADAPTER_TIMEOUT,
+        )
+        if response.status_code != 200:
+            return None
+        soup = BeautifulSoup(response.text, "html.parser")
+        for element in soup(["script", "style", "link", "meta"]):
+            element.extract()
+        main_title = soup.title.string if soup.title is not None and soup.title.string else title.replace("_", " ")
+        body = soup.find("body") or soup
+        return DocumentConverterResult(
+            title=main_title,
+            text_content=f"# {main_title}\n\n" + _CustomMarkdownify().convert_soup(body),
+        )
+
+
+class ArxivAdapter(SiteAdapter):
+    """arXiv abstract pages from the export API (title, authors, dates, abstract and links)."""
+
+    name = "arxiv"
+    _URL = re.compile(r"^https?://(?:www\.|export\.)?arxiv\.org/abs/([\w.\-/]+?)(?:v\d+)?/?(?:[?#].*)?$")
+
+    def match(self, url: str) -> Optional[Any]:
+        m = self._URL.match(url)
+        return m.group(1) if m is not None else None
+
+    def convert(self, match: Any, get: Callable[..., requests.Response]) -> Optional[DocumentConverterResult]:
+        response = get(
+            "https://export.arxiv.org/api/query", params={"id_list": match, "max_results": 1}, timeout=ADAPTER_TIMEOUT
+        )
+        if response.status_code != 200:
+            return None
+        entry = ET.fromstring(response.content).find(f"{_ATOM}entry")
+        if entry is None or entry.find(f"{_ATOM}title") is None:
+            return None
+
+        def text(tag: str) -> str:
+            element = entry.find(f"{_ATOM}{tag}")
+            return " ".join((element.text or "").split()) if element is not None else ""
+
+        title = text("title")
+        authors = [" ".join((name.text or "").split()) for name in entry.iter(f"{_ATOM}name")]
+        categories = [c.get("term", "") for c in entry.findall(f"{_ATOM}category")]
+        pdf = next((link.get("href") for link in entry.findall(f"{_ATOM}link") if link.get("title") == "pdf"), None)
+
+        webpage_text = f"# {title}\n\n"
+        webpage_text += f"- **arXiv:** {match}\n"
+        if authors:
+            webpage_text += f"- **Authors:** {', '.join(authors)}\n"
+        if text("published"):
+            webpage_text += f"- **Published:** {text('published')[:10]}\n"
+        if text("updated") and text("updated") != text("published"):
+            webpage_text += f"- **Updated:** {text('updated')[:10]}\n"
+        if categories:
+            webpage_text += f"- **Categories:** {', '.join(categories)}\n"
+        if pdf:
+            webpage_text += f"- **Full text (PDF):** {pdf}\n"
+        webpage_text += f"\n## Abstract\n\n{text('summary')}\n"
+        return DocumentConverterResult(title=f"[{match}] {title}", text_content=webpage_text)
+
+
+class YouTubeAdapter(SiteAdapter):
+    """YouTube videos as title (from oEmbed) and transcript, without loading the watch page."""
+
+    name = "youtube"
+
+    def match(self, url: str) -> Optional[Any]:
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").lower()
+        if host == "youtu.be":
+            video_id = parsed.path.strip("/").split("/")[0]
+        elif host in ("www.youtube.com", "youtube.com", "m.youtube.com"):
+            if parsed.path == "/watch":
+                video_id = parse_qs(parsed.query).get("v", [""])[0]
+            else:
+                m = re.match(r"^/(?:shorts|embed|live)/([\w-]+)", parsed.path)
+                video_id = m.group(1) if m else ""
+        else:
+            return None
+        return video_id if re.fullmatch(r"[\w-]{11}", video_id) else None
+
+    def convert(self, match: Any, get: Callable[..., requests.Response]) -> Optional[DocumentConverterResult]:
+        try:
+            transcript = fetch_youtube_transcript(match)
+        except Exception as e:
+            # No transcript: the watch page still has the description
+            logger.debug(f"No transcript for YouTube video {match}: {e}")
+            return None
+        watch_url = f"https://www.youtube.com/watch?v={match}"
+        response = get(
+            "https://www.youtube.com/oembed", params={"url": watch_url, "format": "json"}, timeout=ADAPTER_TIMEOUT
+        )
+        metadata = response.json() if response.status_code == 200 else {}
+        title = metadata.get("title") or watch_url
+
+        webpage_text = f"# YouTube\n\n## {title}\n"
+        if metadata.get("author_name"):
+            webpage_text += f"\n### Video Metadata\n- **Channel:** {metadata['author_name']}\n"
+        webpage_text += f"\n### Transcript\n{transcript}\n"
+        return DocumentConverterResult(title=title, text_content=webpage_text)
+
+
+class SiteAdapters:
+    """Registry of site adapters, consulted before a page is fetched.
+
+    Args:
+        adapters: The adapters to use; None registers the default ones.
+    """
+
+    def __init__(self, adapters: Optional[List[SiteAdapter]] = None):
+        self._adapters: List[SiteAdapter] = []
+        for adapter in adapters if adapters is not None else [WikipediaAdapter(), ArxivAdapter(), YouTubeAdapter()]:
+            self.register(adapter)
+
+    def register(self, adapter: SiteAdapter) -> None:
+        # Like the page converters: later registrations are tried first
+        self._adapters.insert(0, adapter)
+
+    def convert(self, url: str, get: Callable[..., requests.Response]) -> Optional[DocumentConverterResult]:
+        """The content of url from the first adapter that handles it, or None to fetch the page as usual.
+
+        get is called like requests.get, e.g. a bound Session.get with the browser's request arguments.
+        """
+        for adapter in self._adapters:
+            match = adapter.match(url)
+            if match is None:
+                continue
+            try:
+                result = adapter.convert(match, get)
+            except Exception as e:
+                logger.warning(f"Site adapter {adapter.name} failed for {url}, fetching the page instead: {e}")
+                continue
+            if result is not None:
+                logger.info(f"Site adapter {adapter.name} served {url}")
+                return result
+        return None
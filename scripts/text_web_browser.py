@@ -1,26 +1,76 @@
 # Shamelessly stolen from Microsoft Autogen team: thanks to them for this great resource!
 # https://github.com/microsoft/autogen/blob/gaia_multiagent_v01_march_1st/autogen/browser_utils.py
+import bisect
+import contextvars
+import hashlib
+import itertools
 import mimetypes
 import os
 import pathlib
 import re
 import time
-import uuid
-from typing import Any, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from urllib.parse import unquote, urljoin, urlparse
 
 import pathvalidate
 import requests
 from ddgs import DDGS
+from ddgs.exceptions import RatelimitException
 from serpapi import GoogleSearch
 
 from smolagents import Tool
 
 from .cookies import COOKIES
-from .mdconvert import FileConversionException, MarkdownConverter, UnsupportedFormatException
+from .browser_history import NavigationHistory
+from .browser_tabs import TabbedBrowser
+from .domain_health import DomainHealth, http_failure
+from .downloads import DownloadStore, DownloadWriter
+from .http_pool import get_session
+from .http_retry import RetryPolicy, retry_policy_scope
+from .mapped_text import MappedText
+from .mdconvert import DocumentConverterResult, FileConversionException, MarkdownConverter, UnsupportedFormatException
+from .near_duplicates import FINGERPRINT_CHARS, NearDuplicates
+from .page_cache import CachedPage, PageCache
+from .page_search import PageSearch, PageSearchIndex, ScanPageSearch
+from .prefetch import Prefetcher
+from .rate_limiter import DEFAULT_BACKOFF, get_rate_limiter
+from .relevance import ViewportRanker, best_excerpt
+from .response_limits import ResponseLimits
+from .search_results import FusedResult, SearchReranker, fuse_results
+from .single_flight import SharedChunks, get_single_flight
+from .site_adapters import SiteAdapters
+from .url_utils import canonicalize_url
+from .viewport import ViewportPages
 from loguru import logger
 
 
+# DDGS talks to DuckDuckGo through its own HTTP client, so it is rate limited under this host explicitly
+DDG_HOST = "duckduckgo.com"
+
+
+class LoadedPage:
+    """A fetched and converted page, ready to be shown in the browser."""
+
+    def __init__(
+        self,
+        title: Any,
+        content: str,
+        address: Optional[str] = None,
+        error: bool = False,
+        truncated: Optional[str] = None,
+        failure: Optional[str] = None,
+        more: Optional[Iterator[str]] = None,
+    ):
+        self.title = title
+        self.content = content
+        self.more = more  # Produces the rest of the content, for documents converted incrementally
+        self.address = address  # Set if the page is shown under another address (e.g. a downloaded file)
+        self.error = error
+        self.truncated = truncated  # Reason, if only part of the response was read
+        self.failure = failure  # Kind of failure for the domain health scoreboard, e.g. "network", "timeout" or "http_403"
+
+
 class SimpleTextBrowser:
     """(In preview) An extremely simple text-based web browser comparable to Lynx. Suitable for Agentic use."""
 
@@ -31,21 +81,49 @@ class SimpleTextBrowser:
         downloads_folder: Optional[Union[str, None]] = None,
         serpapi_key: Optional[Union[str, None]] = None,
         request_kwargs: Optional[Union[Dict[str, Any], None]] = None,
+        session: Optional[requests.Session] = None,
+        prefetcher: Optional[Prefetcher] = None,
+        response_limits: Optional[ResponseLimits] = None,
+        download_store: Optional[DownloadStore] = None,
+        max_history: int = 1000,
+        domain_health: Optional[DomainHealth] = None,
+        page_cache: Optional[PageCache] = None,
+        site_adapters: Optional[SiteAdapters] = None,
+        near_duplicates: Optional[NearDuplicates] = None,
+        search_reranker: Optional[SearchReranker] = None,
     ):
         logger.info(f'Initialisiere SimpleTextBrowser mit start_page={start_page}')
         self.start_page: str = start_page if start_page else "about:blank"
         self.viewport_size = viewport_size  # Applies only to the standard uri types
         self.downloads_folder = downloads_folder
-        self.history: List[Tuple[str, float]] = list()
+        self.download_store = download_store  # Created on the first download if not given
+        self.history = NavigationHistory(max_entries=max_history)
         self.page_title: Optional[str] = None
         self.viewport_current_page = 0
-        self.viewport_pages: List[Tuple[int, int]] = list()
+        self.viewport_pages = ViewportPages("")
+        self.prefetcher = prefetcher  # Optional: loads top search results in the background
+        self.domain_health = domain_health  # Optional: per-domain scoreboard and circuit breaker
+        self.response_limits = response_limits if response_limits is not None else ResponseLimits()
+        self.page_truncated: Optional[str] = None
+        self.tab_name: Optional[str] = None  # Set when the browser is a tab of a TabbedBrowser
+        # Converted pages for back/forward and revisits
+        self.page_cache = page_cache if page_cache is not None else PageCache()
+        self.page_from_cache: Optional[float] = None  # When the shown page was cached, if it came from the cache
+        self._cached_entry: Optional[CachedPage] = None  # Cache entry of the shown page
+        # Lean endpoints for Wikipedia, arXiv, YouTube etc., tried before fetching the page
+        self.site_adapters = site_adapters if site_adapters is not None else SiteAdapters()
+        self.near_duplicates = near_duplicates  # Optional: flags pages whose text was already seen
+        self.page_duplicate_of: Optional[Tuple[str, Optional[str], bool]] = None  # (url, title, in this session)
+        self.search_reranker = search_reranker  # Optional: orders search results by relevance to the research
         self.set_address(self.start_page)
         self.serpapi_key = serpapi_key
         self.request_kwargs = request_kwargs
         self.request_kwargs["cookies"] = COOKIES
-        self._mdconvert = MarkdownConverter()
-        self._page_content: str = ""
+        # Pooled keep-alive session shared with the converter and all tools
+        self.session = session if session is not None else get_session()
+        self._mdconvert = MarkdownConverter(requests_session=self.session, response_limits=self.response_limits)
+        self._page_index: Optional[PageSearch] = None
+        self._ranker: Optional[ViewportRanker] = None
         
         # DuckDuckGo-Parameter
         self.ddg_max_results = 10
@@ -54,15 +132,38 @@ class SimpleTextBrowser:
 
         self._find_on_page_query: Union[str, None] = None
         self._find_on_page_last_result: Union[int, None] = None  # Location of the last result
+        self._find_on_page_hits: List[int] = []  # Offsets of all matches of the last search
 
     @property
     def address(self) -> str:
         """Return the address of the current page."""
-        return self.history[-1][0]
+        return self.history.current.url
 
     def set_address(self, uri_or_path: str, filter_year: Optional[int] = None) -> None:
         # TODO: Handle anchors
-        self.history.append((uri_or_path, time.time()))
+        self.history.visit(uri_or_path)
+        self._navigate(uri_or_path, filter_year=filter_year)
+
+    def back(self) -> Optional[str]:
+        """Go back to the previous page in the history. Returns its viewport, or None if there is none."""
+        address = self.history.back()
+        if address is None:
+            return None
+        self._navigate(address, restore_position=True)
+        return self.viewport
+
+    def forward(self) -> Optional[str]:
+        """Undo a back(). Returns the viewport of the next page, or None if there is none."""
+        address = self.history.forward()
+        if address is None:
+            return None
+        self._navigate(address, restore_position=True)
+        return self.viewport
+
+    def _navigate(self, uri_or_path: str, filter_year: Optional[int] = None, restore_position: bool = False) -> None:
+        """Load and show the current history entry; restore_position returns to the viewport last shown of it."""
+        self._leave_page()
+        self.viewport_current_page = 0
 
         # Handle special URIs
         if uri_or_path == "about:blank":
@@ -72,35 +173,86 @@ class SimpleTextBrowser:
         elif uri_or_path.startswith("duckduckgo:"):
             self._ddg_search(uri_or_path[len("duckduckgo:") :].strip())
         else:
-            if (
-                not uri_or_path.startswith("http:")
-                and not uri_or_path.startswith("https:")
-                and not uri_or_path.startswith("file:")
-            ):
-                if len(self.history) > 1:
-                    prior_address = self.history[-2][0]
-                    uri_or_path = urljoin(prior_address, uri_or_path)
-                    # Update the address with the fully-qualified path
-                    self.history[-1] = (uri_or_path, self.history[-1][1])
-            self._fetch_page(uri_or_path)
+            url = self._qualify_address(uri_or_path)
+            if not self._show_cached(url, restore_position):
+                self._fetch_page(url)
 
-        self.viewport_current_page = 0
         self.find_on_page_query = None
         self.find_on_page_viewport = None
 
+    def _leave_page(self) -> None:
+        """Remember the viewport of the page being left in its cache entry and reset the page state."""
+        if self._cached_entry is not None:
+            self._cached_entry.position = self.viewport_current_page
+            # More of a lazily converted page may have been materialized meanwhile
+            self.page_cache.update(self._cached_entry)
+            self._cached_entry = None
+        self.page_truncated = None
+        self.page_from_cache = None
+        self.page_duplicate_of = None
+
+    def _show_cached(self, url: str, restore_position: bool = False) -> bool:
+        """Show url from the page cache. Returns False if it is not cached (or stale)."""
+        entry = self.page_cache.get(url)
+        if entry is None:
+            return False
+        logger.debug(f"Page cache hit: {url}")
+        self.page_title = entry.title
+        self.page_truncated = entry.truncated
+        self._set_page_content(entry.pages.content, pages=entry.pages)
+        if restore_position and entry.pages.has_page(entry.position):
+            self.viewport_current_page = entry.position
+        self.page_from_cache = entry.stored_at
+        self._cached_entry = entry
+        return True
+
+    def _qualify_address(self, uri_or_path: str) -> str:
+        """Resolve a relative address against the previous page and record the result in the history."""
+        if (
+            not uri_or_path.startswith("http:")
+            and not uri_or_path.startswith("https:")
+            and not uri_or_path.startswith("file:")
+        ):
+            if self.history.previous is not None:
+                prior_address = self.history.previous.url
+                uri_or_path = urljoin(prior_address, uri_or_path)
+                # Update the address with the fully-qualified path
+                self.history.replace_current(uri_or_path)
+        return uri_or_path
+
     @property
     def viewport(self) -> str:
         """Return the content of the current viewport."""
         bounds = self.viewport_pages[self.viewport_current_page]
-        return self.page_content[bounds[0] : bounds[1]]
+        return self._page_content[bounds[0] : bounds[1]]
+
+    @property
+    def page_content(self) -> Union[str, MappedText]:
+        """Return the full contents of the current page (converting the rest of it, if it is still incomplete).
+
+        Very large text files are a MappedText: slicing it decodes just that part.
+        """
+        self.viewport_pages.materialize()
+        return self.viewport_pages.content
 
     @property
-    def page_content(self) -> str:
-        """Return the full contents of the current page."""
-        return self._page_content
+    def _page_content(self) -> Union[str, MappedText]:
+        """The text of the current page converted so far."""
+        return self.viewport_pages.content
 
     def _ddg_search(self, query: str) -> None:
         """Führt eine DuckDuckGo-Suche durch und versucht verschiedene Backends bei Rate-Limiting."""
+        results, error_msg, proxy_info = self._ddg_results(query)
+        self._show_ddg_results(query, results, error_msg, proxy_info)
+
+    def _ddg_results(self, query: str) -> Tuple[List[Dict[str, str]], str, str]:
+        """Fragt DuckDuckGo ab, ohne den Browser-Zustand zu verändern. Returns (results, error_msg, proxy_info)."""
+        # Gleichzeitige identische Suchen (auch aus anderen Sitzungen) nur einmal senden
+        key = ("ddg", query, self.ddg_region, self.ddg_safesearch, self.ddg_max_results, repr(self.request_kwargs.get("proxies")))
+        result, _ = get_single_flight("search").do(key, lambda: self._ddg_query(query))
+        return result
+
+    def _ddg_query(self, query: str) -> Tuple[List[Dict[str, str]], str, str]:
         results = []
         error_msg = ""
         proxy_info = ""
@@ -113,6 +265,7 @@ class SimpleTextBrowser:
             if proxies:
                 proxy_info = f"Using proxy: {proxies.get('https', proxies.get('http', 'None'))}"
             
+            get_rate_limiter().acquire(DDG_HOST)
             with DDGS(proxies=proxies, timeout=timeout) as ddgs:
                 results = list(ddgs.text(
                     query=query,
@@ -120,10 +273,18 @@ class SimpleTextBrowser:
                     safesearch=self.ddg_safesearch,
                     max_results=self.ddg_max_results
                 ))
+        except RatelimitException as e:
+            # DuckDuckGo sends no Retry-After, pause all sessions' searches for a while
+            get_rate_limiter().defer(DDG_HOST, DEFAULT_BACKOFF)
+            error_msg = f"DDGS search failed: {str(e)}"
+            logger.error(error_msg)
         except Exception as e:
             error_msg = f"DDGS search failed: {str(e)}"
             logger.error(error_msg)
-            
+
+        return results, error_msg, proxy_info
+
+    def _show_ddg_results(self, query: str, results: List[Dict[str, str]], error_msg: str, proxy_info: str) -> None:
         # Formatiere die Suchergebnisse
         content = []
         content.append(f"Search results for: {query}")
@@ -132,10 +293,14 @@ class SimpleTextBrowser:
         content.append("")  # Leerzeile für bessere Formatierung
         
         if results:
-            for i, r in enumerate(results, 1):
+            ranked = self._rank_results(results, query)
+            for i, (r, note) in enumerate(ranked, 1):
                 content.append(f"{i}. {r['title']}")
-                content.append(f"   URL: {r['link']}")
+                content.append(f"   URL: {r.get('href', r.get('link'))}")
+                if note:
+                    content.append(f"   Source health: {note}")
                 content.append(f"   {r['body']}\n")
+            self._prefetch_search_results([r.get("href", r.get("link", "")) for r, _ in ranked])
         else:
             content.append(f"No results found for: {query}")
             if error_msg:
@@ -144,7 +309,8 @@ class SimpleTextBrowser:
         self._set_page_content("\n".join(content))
 
     def page_down(self) -> None:
-        self.viewport_current_page = min(self.viewport_current_page + 1, len(self.viewport_pages) - 1)
+        if self.viewport_pages.has_page(self.viewport_current_page + 1):
+            self.viewport_current_page += 1
 
     def page_up(self) -> None:
         self.viewport_current_page = max(self.viewport_current_page - 1, 0)
@@ -179,7 +345,8 @@ class SimpleTextBrowser:
             starting_viewport = 0
         else:
             starting_viewport += 1
-            if starting_viewport >= len(self.viewport_pages):
+            # has_page only converts up to that page, len() would convert the whole document
+            if not self.viewport_pages.has_page(starting_viewport):
                 starting_viewport = 0
 
         viewport_match = self._find_next_viewport(self._find_on_page_query, starting_viewport)
@@ -192,104 +359,351 @@ class SimpleTextBrowser:
             return self.viewport
 
     def _find_next_viewport(self, query: str, starting_viewport: int) -> Union[int, None]:
-        """Search for matches between the starting viewport looping when reaching the end."""
+        """Return the first viewport from starting_viewport on (looping when reaching the end) that has a match."""
 
         if query is None:
             return None
 
-        # Normalize the query, and convert to a regular expression
-        nquery = re.sub(r"\*", "__STAR__", query)
-        nquery = " " + (" ".join(re.split(r"\W+", nquery))).strip() + " "
-        nquery = nquery.replace(" __STAR__ ", "__STAR__ ")  # Merge isolated stars with prior word
-        nquery = nquery.replace("__STAR__", ".*").lower()
-
-        if nquery.strip() == "":
-            return None
-
-        idxs = list()
-        idxs.extend(range(starting_viewport, len(self.viewport_pages)))
-        idxs.extend(range(0, starting_viewport))
-
-        for i in idxs:
-            bounds = self.viewport_pages[i]
-            content = self.page_content[bounds[0] : bounds[1]]
-
-            # TODO: Remove markdown links and images
-            ncontent = " " + (" ".join(re.split(r"\W+", content))).strip().lower() + " "
-            if re.search(nquery, ncontent):
-                return i
-
-        return None
+        # TODO: Remove markdown links and images
+        while True:
+            partial = self.viewport_pages.partial
+            self._find_on_page_hits, viewports = self._search_index().find(query, self.viewport_pages)
+            i = bisect.bisect_left(viewports, starting_viewport)
+            if i < len(viewports):
+                return viewports[i]
+            if not partial:
+                return viewports[0] if viewports else None
+            # Nothing further down in the part converted so far, the rest of the page decides
+            self.viewport_pages.materialize()
+
+    def _search_index(self) -> PageSearch:
+        """The search of the current page: scans at first, an index once they have cost as much as building one."""
+        content = self._page_content
+        if self._page_index is None:
+            self._page_index = ScanPageSearch(content)
+        elif self._page_index.length != len(content):
+            self._page_index.extend(content)
+        if (
+            isinstance(self._page_index, ScanPageSearch)
+            and not isinstance(content, MappedText)
+            and self._page_index.scanned >= len(content)
+        ):
+            self._page_index = PageSearchIndex(content)
+        return self._page_index
+
+    def find_relevant(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Rank all viewports against a natural-language query (BM25) and scroll to the best one.
+
+        Returns the top_k (viewport index, score) pairs, best first; empty if no query word occurs.
+        """
+        if self._ranker is None:
+            content = self.page_content
+            # A generator, so that mapped pages are decoded one viewport at a time
+            self._ranker = ViewportRanker(content[start:end] for start, end in self.viewport_pages)
+        best = self._ranker.top(query, top_k)
+        if best:
+            self.viewport_current_page = best[0][0]
+        return best
 
     def visit_page(self, path_or_uri: str, filter_year: Optional[int] = None) -> str:
         """Update the address, visit the page, and return the content of the viewport."""
         self.set_address(path_or_uri, filter_year=filter_year)
         return self.viewport
 
-    def _set_page_content(self, content: str) -> None:
-        """Sets the text content of the current page."""
-        self._page_content = content
-        self._split_pages()
-        if self.viewport_current_page >= len(self.viewport_pages):
+    def _set_page_content(
+        self, content: str, pages: Optional[ViewportPages] = None, more: Optional[Iterator[str]] = None
+    ) -> None:
+        """Sets the text content of the current page.
+
+        pages reuses a split computed before (content is then ignored); more produces the rest of a
+        page that is still being converted, pulled as the viewports are needed.
+        """
+        self._page_index = None
+        self._ranker = None
+        self._find_on_page_hits = []
+        if pages is not None:
+            self.viewport_pages = pages
+        else:
+            self._split_pages(content, more)
+        if not self.viewport_pages.has_page(self.viewport_current_page):
             self.viewport_current_page = len(self.viewport_pages) - 1
 
-    def _split_pages(self) -> None:
+    def _split_pages(self, content: str, more: Optional[Iterator[str]] = None) -> None:
         # Do not split search results
         if self.address.startswith("google:") or self.address.startswith("duckduckgo:"):
-            self.viewport_pages = [(0, len(self._page_content))]
+            self.viewport_pages = ViewportPages(content, source=more)
             return
 
-        # Handle empty pages
-        if len(self._page_content) == 0:
-            self.viewport_pages = [(0, 0)]
-            return
-
-        # Break the viewport into pages
-        self.viewport_pages = []
-        start_idx = 0
-        while start_idx < len(self._page_content):
-            end_idx = min(start_idx + self.viewport_size, len(self._page_content))  # type: ignore[operator]
-            # Adjust to end on a space
-            while end_idx < len(self._page_content) and self._page_content[end_idx - 1] not in [" ", "\t", "\r", "\n"]:
-                end_idx += 1
-            self.viewport_pages.append((start_idx, end_idx))
-            start_idx = end_idx
+        # Page bounds (and the text itself, with more) are computed on demand, see ViewportPages
+        self.viewport_pages = ViewportPages(content, self.viewport_size, source=more)
 
     def _serpapi_search(self, query: str, filter_year: Optional[int] = None) -> None:
+        self._show_serpapi_results(query, self._serpapi_results(query, filter_year=filter_year))
+
+    def _serpapi_results(
+        self, query: str, filter_year: Optional[int] = None, ddgs: Optional[DDGS] = None
+    ) -> List[Dict[str, str]]:
+        """Search results for query; pass ddgs to reuse an open DDGS (and its connections) across queries."""
+        def search() -> List[Dict[str, str]]:
+            get_rate_limiter().acquire(DDG_HOST)
+            try:
+                if ddgs is not None:
+                    return self._ddgs_text(ddgs, query)
+                with DDGS() as fresh_ddgs:
+                    return self._ddgs_text(fresh_ddgs, query)
+            except RatelimitException:
+                get_rate_limiter().defer(DDG_HOST, DEFAULT_BACKOFF)
+                raise
+
+        # Identical searches running at the same time (e.g. in other sessions) are sent once
+        key = ("text", query, self.ddg_region, self.ddg_safesearch, self.ddg_max_results)
+        results, _ = get_single_flight("search").do(key, search)
+        return results
+
+    def _ddgs_text(self, ddgs: DDGS, query: str) -> List[Dict[str, str]]:
+        return ddgs.text(
+            query,
+            max_results=self.ddg_max_results,
+            region=self.ddg_region,
+            safesearch=self.ddg_safesearch
+        )
+
+    def search_many(
+        self, queries: List[str], max_workers: int = 4
+    ) -> Tuple[List[FusedResult], Dict[str, str]]:
+        """Run several searches concurrently over one DDGS and merge their results by canonical url.
+
+        Does not change the shown page. Returns the fused results (best first, failing domains
+        last) and the error message of each query that failed.
+        """
+        errors: Dict[str, str] = {}
+
+        def search(ddgs: DDGS, query: str) -> List[Dict[str, str]]:
+            try:
+                return self._serpapi_results(query, ddgs=ddgs) or []
+            except Exception as e:
+                logger.error(f"Search for '{query}' failed: {e}")
+                errors[query] = str(e)
+                return []
+
         with DDGS() as ddgs:
-            results = ddgs.text(
-                query,
-                max_results=self.ddg_max_results,
-                region=self.ddg_region,
-                safesearch=self.ddg_safesearch
-            )
+            if len(queries) <= 1:
+                batches = [(query, search(ddgs, query)) for query in queries]
+            else:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(queries)), thread_name_prefix="search") as executor:
+                    futures = [executor.submit(contextvars.copy_context().run, search, ddgs, query) for query in queries]
+                    batches = [(query, future.result()) for query, future in zip(queries, futures)]
+
+        fused = fuse_results(batches)
+        if self.search_reranker is not None:
+            order = self.search_reranker.order(" ".join(queries), [entry.result for entry in fused], self.domain_health)
+            for i, note in order:
+                fused[i].note = note
+            fused = [fused[i] for i, _ in order]
+        elif self.domain_health is not None:
+            # Like single searches: results from failing or slow domains go last
+            ranks = {}
+            for entry in fused:
+                ranks[id(entry)], entry.note = self.domain_health.describe(entry.url)
+            fused.sort(key=lambda entry: ranks[id(entry)])
+        return fused, errors
+
+    def _show_serpapi_results(self, query: str, results: List[Dict[str, str]]) -> None:
         self.page_title = f"{query} - Search"
         if not results:
             self._set_page_content(f"No results found for '{query}'. Try with a more general query, or remove the year filter.")
             return
         result_strings = []
-        for res in results:
+        ranked = self._rank_results(results, query)
+        for res, note in ranked:
             title = res.get("title", "")
             href = res.get("href", "")
             body = res.get("body", "")
+            if note:
+                href += f"\n(Source health: {note})"
             result_strings.append(f"{title}\n{href}\n{body}")
         self._set_page_content("\n\n".join(result_strings))
+        self._prefetch_search_results([res.get("href", "") for res, _ in ranked])
+
+    def _rank_results(
+        self, results: List[Dict[str, str]], query: Optional[str] = None
+    ) -> List[Tuple[Dict[str, str], Optional[str]]]:
+        """Move results from failing or slow domains to the end, with a note for the agent.
+
+        With a search reranker, results are also reordered (and trimmed) by relevance to the query
+        and the research context; otherwise the search engine's order is kept.
+        """
+        if self.search_reranker is not None and query:
+            start = time.perf_counter()
+            order = self.search_reranker.order(query, results, self.domain_health)
+            logger.debug(f"Reranked {len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return [(results[i], note) for i, note in order]
+        if self.domain_health is None:
+            return [(r, None) for r in results]
+        described = [(r, self.domain_health.describe(r.get("href", r.get("link", "")))) for r in results]
+        described.sort(key=lambda item: item[1][0])
+        return [(r, note) for r, (_, note) in described]
+
+    def _prefetch_search_results(self, urls: List[str]) -> None:
+        """Let the prefetcher (if any) load the top results while the agent reads the result list."""
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(urls, lambda url: self._load_page(url, allow_download=False))
 
     def _fetch_page(self, url: str) -> None:
+        page = None
+        if self.prefetcher is not None and (url.startswith("http:") or url.startswith("https:")):
+            page = self.prefetcher.take(url)
+        if page is None:
+            page = self._load_page(url)
+        self._show_page(url, page)
+
+    def _show_page(self, url: str, page: LoadedPage) -> None:
+        # Downloads are rendered from the local copy, which becomes the current address
+        if page.address is not None and page.address != url:
+            self.history.visit(page.address)
+        self.page_title = page.title
+        self.page_truncated = page.truncated
+        self._set_page_content(page.content, more=page.more)
+        # Error pages are not cached, the next visit tries again; downloads are shown under their local path
+        if not page.error and (page.address is None or page.address == url):
+            entry = CachedPage(url, page.title, page.truncated, self.viewport_pages)
+            if self.page_cache.put(entry):
+                self._cached_entry = entry
+            self.page_duplicate_of = self._duplicate_of(url, page.title, self.viewport_pages)
+            if self.page_duplicate_of is not None and self.page_duplicate_of[2] and self._cached_entry is not None:
+                # Already read in this session: show a notice instead; visiting again shows the cached page
+                other_url, other_title, _ = self.page_duplicate_of
+                self._cached_entry = None
+                self._set_page_content(
+                    f"# Duplicate page\n\nThe text of this page is nearly identical to {other_url}"
+                    + (f" ({other_title})" if other_title else "")
+                    + ", which was already visited in this research session, so it is not shown again. "
+                    + "Visit this url once more if you need it anyway."
+                )
+
+    def _duplicate_of(self, url: str, title: Any, pages: ViewportPages) -> Optional[Tuple[str, Optional[str], bool]]:
+        """Check a loaded page against the pages seen before; returns (url, title, in this session) of a near-duplicate."""
+        if self.near_duplicates is None:
+            return None
+        # Lazily converted pages are checked on what has been converted so far
+        text = pages.content[:FINGERPRINT_CHARS]
+        return self.near_duplicates.check(url, text, title if isinstance(title, str) else None)
+
+    def load_pages(
+        self, urls: List[str], max_workers: int = 4
+    ) -> List[Tuple[str, LoadedPage, ViewportPages, float, Optional[float]]]:
+        """Fetch and convert several urls concurrently, without changing the shown page.
+
+        Returns (url, page, viewports, seconds, cached_at) per url, in the order given; cached_at
+        is set for pages served from the page cache. Loaded pages are cached, so visiting one of
+        them afterwards does not fetch it again.
+        """
+        urls = [url if re.match(r"^(https?|file):", url) else urljoin(self.address, url) for url in urls]
+
+        def load(url: str) -> Tuple[str, LoadedPage, ViewportPages, float, Optional[float]]:
+            start = time.monotonic()
+            entry = self.page_cache.get(url)
+            if entry is not None:
+                page = LoadedPage(entry.title, entry.pages.content, truncated=entry.truncated)
+                return url, page, entry.pages, time.monotonic() - start, entry.stored_at
+            page = None
+            if self.prefetcher is not None and (url.startswith("http:") or url.startswith("https:")):
+                page = self.prefetcher.take(url)
+            if page is None:
+                try:
+                    page = self._load_page(url)
+                except Exception as e:
+                    # One broken page must not fail the others
+                    logger.error(f"Could not load {url}: {e}")
+                    page = LoadedPage("Error", f"## Error\n\n{e}", error=True)
+            pages = ViewportPages(page.content, self.viewport_size, source=page.more)
+            if not page.error and page.address is None:
+                self.page_cache.put(CachedPage(url, page.title, page.truncated, pages))
+            return url, page, pages, time.monotonic() - start, None
+
+        if len(urls) <= 1:
+            return [load(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls)), thread_name_prefix="visit") as executor:
+            # Each job needs its own copy of the context (retry policy, rate limiting session)
+            futures = [executor.submit(contextvars.copy_context().run, load, url) for url in urls]
+            return [future.result() for future in futures]
+
+    def _load_page(self, url: str, allow_download: bool = True) -> Optional[LoadedPage]:
+        """Fetch and convert a page without touching the browser state, so it can also run in worker threads.
+
+        Returns None if the url points to a binary file and allow_download is False. Concurrent
+        loads of the same url with the same request arguments, by any browser of the process, are
+        done once and shared.
+        """
+        if not (url.startswith("http:") or url.startswith("https:")):
+            return self._fetch_and_convert(url, allow_download)
+        page, _ = get_single_flight("pages").do(
+            (canonicalize_url(url), allow_download, self._request_digest()),
+            lambda: self._load_checked_page(url, allow_download),
+            share=self._share_page,
+        )
+        if page is None or not isinstance(page.more, SharedChunks):
+            return page
+        # Each caller converts the rest of the document through its own reader
+        return LoadedPage(
+            page.title, page.content, page.address, page.error, page.truncated, page.failure, more=page.more.reader()
+        )
+
+    def _request_digest(self) -> str:
+        """Digest of the request arguments that may change what a url returns (proxies, cookies, headers, auth)."""
+        kwargs = self.request_kwargs or {}
+        parts = []
+        for name in sorted(kwargs):
+            if name in ("timeout", "stream"):
+                continue
+            value = kwargs[name]
+            if isinstance(value, dict):
+                value = sorted(value.items(), key=lambda item: str(item[0]))
+            parts.append(f"{name}={value!r}")
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _share_page(page: Optional[LoadedPage], followers: int) -> Optional[LoadedPage]:
+        """Let the callers that joined a page load read the rest of a lazily converted page too.
+
+        Without followers the page is returned as it is, so its chunks are not kept a second time.
+        """
+        if page is not None and page.more is not None and followers > 0:
+            page.more = SharedChunks(page.more)
+            page.more.expect(followers + 1)
+        return page
+
+    def _load_checked_page(self, url: str, allow_download: bool = True) -> Optional[LoadedPage]:
+        if self.domain_health is None:
+            return self._fetch_and_convert(url, allow_download)
+
+        # Fail fast on domains that keep failing
+        reason = self.domain_health.check(url)
+        if reason is not None:
+            return LoadedPage("Error", f"## Error\n\nNot visiting {url}: {reason}. Try another source.", error=True)
+        start = time.monotonic()
+        page = self._fetch_and_convert(url, allow_download)
+        self.domain_health.record(url, time.monotonic() - start, page.failure if page is not None else None)
+        return page
+
+    def _fetch_and_convert(self, url: str, allow_download: bool = True) -> Optional[LoadedPage]:
         download_path = ""
         try:
             if url.startswith("file://"):
                 download_path = os.path.normcase(os.path.normpath(unquote(url[7:])))
-                res = self._mdconvert.convert_local(download_path)
-                self.page_title = res.title
-                self._set_page_content(res.text_content)
+                res = self._mdconvert.convert_local(download_path, incremental=True)
+                return LoadedPage(res.title, res.text_content, more=res.text_chunks)
             else:
+                res = self._adapted_page(url)
+                if res is not None:
+                    return LoadedPage(res.title, res.text_content)
+
                 # Prepare the request parameters
                 request_kwargs = self.request_kwargs.copy() if self.request_kwargs is not None else {}
                 request_kwargs["stream"] = True
 
                 # Send a HTTP request to the URL
-                response = requests.get(url, **request_kwargs)
+                response = self.session.get(url, **request_kwargs)
                 response.raise_for_status()
 
                 # If the HTTP request was successful
@@ -298,94 +712,245 @@ class SimpleTextBrowser:
                 # Text or HTML
                 if "text/" in content_type.lower():
                     res = self._mdconvert.convert_response(response)
-                    self.page_title = res.title
-                    self._set_page_content(res.text_content)
+                    if res is None:
+                        return LoadedPage("Error", f"## Error\n\nCould not convert {url}", error=True, failure="conversion")
+                    return LoadedPage(res.title, res.text_content, truncated=res.truncated)
                 # A download
                 else:
-                    # Try producing a safe filename
-                    fname = None
-                    download_path = None
-                    try:
-                        fname = pathvalidate.sanitize_filename(os.path.basename(urlparse(url).path)).strip()
-                        download_path = os.path.abspath(os.path.join(self.downloads_folder, fname))
-
-                        suffix = 0
-                        while os.path.exists(download_path) and suffix < 1000:
-                            suffix += 1
-                            base, ext = os.path.splitext(fname)
-                            new_fname = f"{base}__{suffix}{ext}"
-                            download_path = os.path.abspath(os.path.join(self.downloads_folder, new_fname))
-
-                    except NameError:
-                        pass
-
-                    # No suitable name, so make one
-                    if fname is None:
-                        extension = mimetypes.guess_extension(content_type)
-                        if extension is None:
-                            extension = ".download"
-                        fname = str(uuid.uuid4()) + extension
-                        download_path = os.path.abspath(os.path.join(self.downloads_folder, fname))
-
-                    # Open a file for writing
-                    with open(download_path, "wb") as fh:
-                        for chunk in response.iter_content(chunk_size=512):
-                            fh.write(chunk)
+                    if not allow_download:
+                        response.close()
+                        return None
+
+                    # Don't even start downloads that are known to exceed the size limit
+                    too_large = self.response_limits.declared_too_large(response.headers)
+                    if too_large:
+                        response.close()
+                        return LoadedPage("Download skipped", f"# Download skipped\n\nNot downloading {url}: {too_large}.")
+
+                    # Look at the first chunk before committing to the whole download
+                    body = self.response_limits.body(response)
+                    chunks = iter(body)
+                    head = next(chunks, b"")
+                    extensions = self._download_extensions(url, response.headers)
+                    declined = self._probe_download(url, response.headers, head, extensions)
+                    if declined is not None:
+                        response.close()
+                        return declined
+
+                    # Write the file in one pass, sniffing its type and hashing it on the way
+                    store = self._download_store()
+                    with store.writer() as download:
+                        for chunk in itertools.chain([head], chunks):
+                            download.write(chunk)
+                    download_path = store.commit(
+                        download, self._download_name(url, content_type, response.headers.get("content-disposition", ""))
+                    )
+
+                    # A partial binary file can't be converted
+                    if body.truncated:
+                        return LoadedPage(
+                            "Download truncated",
+                            f"# Download truncated\n\nStopped the download because the {body.truncated}. The partial file was saved to '{download_path}'.",
+                            truncated=body.truncated,
+                        )
 
                     # Render it
-                    local_uri = pathlib.Path(download_path).as_uri()
-                    self.set_address(local_uri)
+                    return self._render_download(download, extensions)
 
         except UnsupportedFormatException as e:
             logger.error(e)
-            self.page_title = ("Download complete.",)
-            self._set_page_content(f"# Download complete\n\nSaved file to '{download_path}'")
+            return LoadedPage(("Download complete.",), f"# Download complete\n\nSaved file to '{download_path}'")
         except FileConversionException as e:
             logger.error(e)
-            self.page_title = ("Download complete.",)
-            self._set_page_content(f"# Download complete\n\nSaved file to '{download_path}'")
+            return LoadedPage(
+                ("Download complete.",), f"# Download complete\n\nSaved file to '{download_path}'", failure="conversion"
+            )
         except FileNotFoundError:
-            self.page_title = "Error 404"
-            self._set_page_content(f"## Error 404\n\nFile not found: {download_path}")
+            return LoadedPage("Error 404", f"## Error 404\n\nFile not found: {download_path}", error=True)
         except requests.exceptions.RequestException as request_exception:
             try:
-                self.page_title = f"Error {response.status_code}"
-
                 # If the error was rendered in HTML we might as well render it
                 content_type = response.headers.get("content-type", "")
                 if content_type is not None and "text/html" in content_type.lower():
                     res = self._mdconvert.convert(response)
-                    self.page_title = f"Error {response.status_code}"
-                    self._set_page_content(f"## Error {response.status_code}\n\n{res.text_content}")
+                    return LoadedPage(
+                        f"Error {response.status_code}",
+                        f"## Error {response.status_code}\n\n{res.text_content}",
+                        error=True,
+                        failure=http_failure(response.status_code),
+                    )
                 else:
                     text = ""
                     for chunk in response.iter_content(chunk_size=512, decode_unicode=True):
                         text += chunk
-                    self.page_title = f"Error {response.status_code}"
-                    self._set_page_content(f"## Error {response.status_code}\n\n{text}")
+                    return LoadedPage(
+                        f"Error {response.status_code}",
+                        f"## Error {response.status_code}\n\n{text}",
+                        error=True,
+                        failure=http_failure(response.status_code),
+                    )
             except NameError:
-                self.page_title = "Error"
-                self._set_page_content(f"## Error\n\n{str(request_exception)}")
+                failure = "timeout" if isinstance(request_exception, requests.exceptions.Timeout) else "network"
+                return LoadedPage("Error", f"## Error\n\n{str(request_exception)}", error=True, failure=failure)
+
+    def _adapted_page(self, url: str) -> Optional[DocumentConverterResult]:
+        """The page from a site adapter's lean endpoint, if one handles the url."""
+        if self.site_adapters is None:
+            return None
+        request_kwargs = self.request_kwargs.copy() if self.request_kwargs is not None else {}
+        request_kwargs.pop("timeout", None)
+        return self.site_adapters.convert(url, lambda api_url, **kwargs: self.session.get(api_url, **request_kwargs, **kwargs))
+
+    def _download_extensions(self, url: str, headers: Any) -> List[str]:
+        """The file extensions suggested by a download's headers and url, in order of priority."""
+        return self._mdconvert._response_extensions(
+            headers.get("content-type", ""), headers.get("content-disposition", ""), url
+        )
+
+    def _probe_download(self, url: str, headers: Any, head: bytes, extensions: List[str]) -> Optional[LoadedPage]:
+        """Return a "Download skipped" page if no converter can handle the file, judging by headers and first bytes."""
+        content_type = headers.get("content-type", "")
+        reason = self._mdconvert.probe(extensions, head)
+        if reason is None:
+            return None
+        logger.info(f"Not downloading {url}: {reason}")
+        return LoadedPage(
+            "Download skipped",
+            f"# Download skipped\n\nNot downloading {url} (content type '{content_type or 'unknown'}'): {reason}. Use download_file to save it anyway.",
+        )
+
+    def _render_download(self, download: DownloadWriter, extensions: Optional[List[str]] = None) -> LoadedPage:
+        """Convert a finished download without reading it again for type detection.
+
+        extensions are the ones the download was probed with, so that the file is converted as what it was accepted as.
+        """
+        logger.debug(f"Downloaded {download.path} ({download.size} bytes, sha256 {download.sha256})")
+        local_uri = pathlib.Path(download.path).as_uri()
+        try:
+            res = self._mdconvert.convert_download(download, extensions, incremental=True)
+        except (UnsupportedFormatException, FileConversionException) as e:
+            logger.error(e)
+            return LoadedPage(
+                ("Download complete.",),
+                f"# Download complete\n\nSaved file to '{download.path}'",
+                address=local_uri,
+                failure="conversion" if isinstance(e, FileConversionException) else None,
+            )
+        return LoadedPage(res.title, res.text_content, address=local_uri, more=res.text_chunks)
+
+    def _download_store(self) -> DownloadStore:
+        if self.download_store is None:
+            self.download_store = DownloadStore(self.downloads_folder)
+        return self.download_store
+
+    def _download_name(self, url: str, content_type: str, content_disposition: str = "") -> str:
+        """Pick a file name for the download. It need not be unique: the DownloadStore files it under its hash."""
+        # The server's name for the file comes first, e.g. "setup.exe" for a url ending in /exe
+        m = re.search(r"filename\*\s*=\s*[^']*'[^']*'([^;]+)", content_disposition, re.IGNORECASE)
+        if m:
+            name = unquote(m.group(1).strip())
+        else:
+            m = re.search(r"filename\s*=\s*(\"[^\"]*\"|[^;]+)", content_disposition, re.IGNORECASE)
+            name = m.group(1).strip().strip("\"'") if m else ""
+        fname = pathvalidate.sanitize_filename(os.path.basename(name.replace("\\", "/"))).strip()
+        if fname:
+            return fname
+
+        # Try producing a safe filename
+        fname = pathvalidate.sanitize_filename(os.path.basename(urlparse(url).path)).strip()
+        if fname:
+            return fname
+
+        # No suitable name, so make one
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if extension is None:
+            extension = ".download"
+        return "download" + extension
 
     def _state(self) -> Tuple[str, str]:
-        header = f"Address: {self.address}\n"
+        header = f"Tab: {self.tab_name}\n" if self.tab_name is not None else ""
+        header += f"Address: {self.address}\n"
         if self.page_title is not None:
             header += f"Title: {self.page_title}\n"
 
         current_page = self.viewport_current_page
-        total_pages = len(self.viewport_pages)
+        if self.viewport_pages.partial:
+            # Still converting: only count what is known (and whether there is a next page), instead of converting the rest now
+            self.viewport_pages.has_page(current_page + 1)
+            total_pages = f"at least {self.viewport_pages.computed}"
+        else:
+            total_pages = len(self.viewport_pages)
+
+        if self.page_from_cache is not None:
+            header += f"Note: served from cache (loaded {round(time.time() - self.page_from_cache)} seconds ago).\n"
+
+        if self.page_duplicate_of is not None:
+            seen = "in this research session" if self.page_duplicate_of[2] else "in an earlier research session"
+            header += f"Note: this page is nearly identical to {self.page_duplicate_of[0]}, seen {seen}.\n"
 
-        address = self.address
-        for i in range(len(self.history) - 2, -1, -1):  # Start from the second last
-            if self.history[i][0] == address:
-                header += f"You previously visited this page {round(time.time() - self.history[i][1])} seconds ago.\n"
-                break
+        if self.page_truncated:
+            header += f"Note: this page is truncated ({self.page_truncated}), only the part received is shown.\n"
+
+        previous_visit = self.history.current.previous_visit
+        if previous_visit is not None:
+            header += f"You previously visited this page {round(time.time() - previous_visit)} seconds ago.\n"
 
         header += f"Viewport position: Showing page {current_page + 1} of {total_pages}.\n"
+        if self._find_on_page_hits and self._find_on_page_last_result == current_page:
+            _, viewports = self._search_index().find(self._find_on_page_query, self.viewport_pages)
+            listed = ", ".join(str(i + 1) for i in viewports[:20])
+            if len(viewports) > 20:
+                listed += f" and {len(viewports) - 20} more"
+            header += (
+                f"Search: '{self._find_on_page_query}' matches {len(self._find_on_page_hits)} times on this page, "
+                f"on pages {listed}.\n"
+            )
         return (header, self.viewport)
 
 
-class SearchInformationTool(Tool):
+# The optional tab argument of the browser tools
+TAB_INPUT = {
+    "type": "string",
+    "description": "[Optional parameter]: the browser tab to use. Pages opened in parallel get their own tab, named in the result; pass that name to keep working on the page.",
+    "nullable": True,
+}
+
+
+class BrowserTool(Tool):
+    """Base class of the browser tools. With a TabbedBrowser, each call runs in the tab named by its tab argument."""
+
+    # Whether the tool works in a tab (web_search_many only shows its results)
+    uses_tab = True
+    # Navigating calls without a tab name open a new tab if the default one is busy
+    opens_pages = False
+
+    def __init__(self, browser):
+        super().__init__()
+        self.browser = browser
+
+    def __call__(self, *args, **kwargs):
+        if not self.uses_tab or not isinstance(self.browser, TabbedBrowser):
+            return super().__call__(*args, **kwargs)
+        arguments = args[0] if len(args) == 1 and isinstance(args[0], dict) else kwargs
+        with self.browser.use_tab(arguments.get("tab"), new_if_busy=self.opens_pages):
+            return super().__call__(*args, **kwargs)
+
+
+class FetchingTool(BrowserTool):
+    """Base class of the browser tools that go to the network; their requests use the tool's retry policy."""
+
+    opens_pages = True
+
+    def __init__(self, browser, retry_policy: Optional[RetryPolicy] = None):
+        super().__init__(browser)
+        self.retry_policy = retry_policy  # None: the HTTP pool's default policy
+
+    def __call__(self, *args, **kwargs):
+        with retry_policy_scope(self.retry_policy):
+            return super().__call__(*args, **kwargs)
+
+
+class SearchInformationTool(FetchingTool):
     name = "web_search"
     description = "Perform a web search query (think a google search) and returns the search results."
     inputs = {"query": {"type": "string", "description": "The web search query to perform."}}
@@ -394,35 +959,173 @@ class SearchInformationTool(Tool):
         "description": "[Optional parameter]: filter the search results to only include pages from a specific year. For example, '2020' will only include pages from 2020. Make sure to use this parameter if you're trying to search for articles from a specific date!",
         "nullable": True,
     }
+    inputs["tab"] = TAB_INPUT
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
-    def forward(self, query: str, filter_year: Optional[int] = None) -> str:
+    def forward(self, query: str, filter_year: Optional[int] = None, tab: Optional[str] = None) -> str:
         self.browser.visit_page(f"google: {query}", filter_year=filter_year)
         header, content = self.browser._state()
         return header.strip() + "\n=======================\n" + content
 
 
-class VisitTool(Tool):
+class BatchSearchTool(FetchingTool):
+    name = "web_search_many"
+    description = (
+        "Run several web search queries at once (e.g. variations or sub-questions of one topic) and return a single "
+        "ranked list of the distinct results, noting which queries found each one. Faster than several web_search calls."
+    )
+    inputs = {
+        "queries": {"type": "array", "description": "The web search queries to perform (at most 8)."},
+        "max_results": {
+            "type": "integer",
+            "description": "[Optional parameter]: how many of the merged results to list. Defaults to 20.",
+            "nullable": True,
+        },
+    }
+    output_type = "string"
+    uses_tab = False
+
+    max_queries = 8
+    max_workers = 4
+    # Result snippets are cut to this length to keep the list compact
+    snippet_chars = 240
+
+    def forward(self, queries: List[str], max_results: Optional[int] = None) -> str:
+        if isinstance(queries, str):
+            queries = [queries]
+        queries = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))
+        if not queries:
+            raise Exception("Pass at least one query.")
+        skipped = queries[self.max_queries :]
+        queries = queries[: self.max_queries]
+
+        start = time.monotonic()
+        fused, errors = self.browser.search_many(queries, max_workers=self.max_workers)
+        elapsed = time.monotonic() - start
+        total = sum(len(entry.found_by) for entry in fused)
+        shown = fused[: max_results or 20]
+
+        lines = [f"Searched {len(queries)} queries in {elapsed:.2f} seconds: {total} results, {len(fused)} distinct pages."]
+        if skipped:
+            lines.append(f"Skipped {len(skipped)} further queries, run at most {self.max_queries} at once.")
+        for query, error in errors.items():
+            lines.append(f"Query '{query}' failed: {error}")
+        lines.append("=======================")
+        if not shown:
+            lines.append("No results found. Try more general queries.")
+        for i, entry in enumerate(shown, 1):
+            found_by = ", ".join(f"'{query}' (#{rank})" for query, rank in entry.found_by)
+            body = " ".join(entry.result.get("body", "").split())
+            if len(body) > self.snippet_chars:
+                body = body[: self.snippet_chars].rsplit(" ", 1)[0] + " ..."
+            lines.append(f"{i}. {entry.result.get('title', '')}")
+            lines.append(f"   URL: {entry.url}")
+            lines.append(f"   Found by: {found_by}")
+            if entry.note:
+                lines.append(f"   Source health: {entry.note}")
+            lines.append(f"   {body}\n")
+        self.browser._prefetch_search_results([entry.url for entry in shown])
+        return "\n".join(lines)
+
+
+class VisitTool(FetchingTool):
     name = "visit_page"
     description = "Visit a webpage at a given URL and return its text. Given a url to a YouTube video, this returns the transcript."
-    inputs = {"url": {"type": "string", "description": "The relative or absolute url of the webpage to visit."}}
+    inputs = {
+        "url": {"type": "string", "description": "The relative or absolute url of the webpage to visit."},
+        "tab": TAB_INPUT,
+    }
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
-    def forward(self, url: str) -> str:
+    def forward(self, url: str, tab: Optional[str] = None) -> str:
         self.browser.visit_page(url)
         header, content = self.browser._state()
         return header.strip() + "\n=======================\n" + content
 
 
-class DownloadTool(Tool):
+class VisitPagesTool(FetchingTool):
+    name = "visit_pages"
+    description = (
+        "Visit several webpages at once and return a condensed view of each: its beginning, or the passage "
+        "that best matches the given keywords. Much faster than calling visit_page for each url in turn; "
+        "use visit_page afterwards to read one of them in full."
+    )
+    inputs = {
+        "urls": {"type": "array", "description": "The urls of the webpages to visit (at most 10)."},
+        "keywords": {
+            "type": "string",
+            "description": "[Optional parameter]: what you are looking for. If given, each page is shown at its best matching passage instead of its beginning.",
+            "nullable": True,
+        },
+        "max_chars": {
+            "type": "integer",
+            "description": "[Optional parameter]: total length of the returned text, shared by all pages. Defaults to 20000.",
+            "nullable": True,
+        },
+        "tab": TAB_INPUT,
+    }
+    output_type = "string"
+
+    max_urls = 10
+    max_workers = 4
+    # Keyword excerpts are looked for in this much of each page
+    scan_chars = 2 * 1024 * 1024
+
+    def forward(
+        self, urls: List[str], keywords: Optional[str] = None, max_chars: Optional[int] = None, tab: Optional[str] = None
+    ) -> str:
+        if isinstance(urls, str):
+            urls = [urls]
+        urls = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+        if not urls:
+            raise Exception("Pass at least one url.")
+        skipped = urls[self.max_urls :]
+        urls = urls[: self.max_urls]
+
+        start = time.monotonic()
+        results = self.browser.load_pages(urls, max_workers=self.max_workers)
+        elapsed = time.monotonic() - start
+        share = max((max_chars or 20000) // len(results), 500)
+
+        header = f"Visited {len(results)} pages in {elapsed:.2f} seconds ({min(self.max_workers, len(results))} at a time).\n"
+        header += "Per page: " + ", ".join(
+            f"{i}. {seconds:.2f} s{' (cache)' if cached_at is not None else ''}"
+            for i, (_, _, _, seconds, cached_at) in enumerate(results, 1)
+        ) + "\n"
+        if skipped:
+            header += f"Skipped {len(skipped)} further urls, visit at most {self.max_urls} at once.\n"
+        query = keywords if keywords and keywords.strip() else None
+        sections = []
+        for i, (url, page, pages, seconds, cached_at) in enumerate(results, 1):
+            timing = f"served from cache in {seconds:.2f} seconds" if cached_at is not None else f"loaded in {seconds:.2f} seconds"
+            section = f"## {i}. {page.title or url}\nAddress: {url}\nTiming: {timing}\n"
+            if page.truncated:
+                section += f"Note: this page is truncated ({page.truncated}).\n"
+            if page.error:
+                sections.append(section + "\n" + str(page.content)[:share])
+                continue
+            duplicate = self.browser._duplicate_of(url, page.title, pages) if cached_at is None else None
+            if duplicate is not None:
+                seen = "in this research session" if duplicate[2] else "in an earlier research session"
+                section += f"Note: this page is nearly identical to {duplicate[0]}, seen {seen}.\n"
+                if duplicate[2]:
+                    sections.append(section + "\nNot shown again; use visit_page on this url if you need it anyway.")
+                    continue
+            limit = self.scan_chars if query else share + 1
+            pages.materialize(limit)
+            text = pages.content[:limit]
+            excerpt_start, excerpt_end = best_excerpt(text, share, query)
+            if not pages.partial and excerpt_start == 0 and excerpt_end >= len(pages.content):
+                section += f"Showing: the whole page ({len(pages.content)} characters).\n"
+            else:
+                length = f"at least {len(pages.content)}" if pages.partial else str(len(pages.content))
+                what = f"best match for '{query}'" if query else "beginning"
+                section += f"Showing: {what}, characters {excerpt_start}-{excerpt_end} of {length}.\n"
+            sections.append(section + "\n" + text[excerpt_start:excerpt_end].strip())
+        return header + "=======================\n" + "\n\n".join(sections)
+
+
+class DownloadTool(FetchingTool):
     name = "download_file"
     description = """
 Download a file at a given URL. The file should be of this format: [".xlsx", ".pptx", ".wav", ".mp3", ".png", ".docx"]
@@ -431,31 +1134,41 @@ DO NOT use this tool for .pdf or .txt or .htm files: for these types of files us
     inputs = {"url": {"type": "string", "description": "The relative or absolute url of the file to be downloaded."}}
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
     def forward(self, url: str) -> str:
+        # Runs in a tab of its own (the default one, or a new one if that is busy), like visit_page
         if "arxiv" in url:
             url = url.replace("abs", "pdf")
-        response = requests.get(url)
-        content_type = response.headers.get("content-type", "")
-        extension = mimetypes.guess_extension(content_type)
-        if extension and isinstance(extension, str):
-            new_path = f"./downloads/file{extension}"
-        else:
-            new_path = "./downloads/file.object"
-
-        with open(new_path, "wb") as f:
-            f.write(response.content)
-
-        if "pdf" in extension or "txt" in extension or "htm" in extension:
-            raise Exception("Do not use this tool for pdf or txt or html files: use visit_page instead.")
-
+        request_kwargs = self.browser.request_kwargs.copy() if self.browser.request_kwargs is not None else {}
+        request_kwargs["stream"] = True
+        response = self.browser.session.get(url, **request_kwargs)
+        try:
+            response.raise_for_status()
+            too_large = self.browser.response_limits.declared_too_large(response.headers)
+            if too_large:
+                raise Exception(f"Not downloading {url}: {too_large}.")
+            content_type = response.headers.get("content-type", "")
+            name = self.browser._download_name(url, content_type, response.headers.get("content-disposition", ""))
+            extension = os.path.splitext(name)[1].lower() or mimetypes.guess_extension(content_type.split(";")[0].strip()) or ""
+            if "pdf" in extension or "txt" in extension or "htm" in extension:
+                raise Exception("Do not use this tool for pdf or txt or html files: use visit_page instead.")
+        except Exception:
+            response.close()
+            raise
+
+        # Filed in the browser's download store like the downloads of visit_page
+        body = self.browser.response_limits.body(response)
+        store = self.browser._download_store()
+        with store.writer() as download:
+            for chunk in body:
+                download.write(chunk)
+        new_path = store.commit(download, name)
+
+        if body.truncated:
+            return f"File was only partially downloaded (the {body.truncated}) and saved under path {new_path}."
         return f"File was downloaded and saved under path {new_path}."
 
 
-class ArchiveSearchTool(Tool):
+class ArchiveSearchTool(FetchingTool):
     name = "find_archived_url"
     description = "Given a url, searches the Wayback Machine and returns the archived version of the url that's closest in time to the desired date."
     inputs = {
@@ -464,18 +1177,15 @@ class ArchiveSearchTool(Tool):
             "type": "string",
             "description": "The date that you want to find the archive for. Give this date in the format 'YYYYMMDD', for instance '27 June 2008' is written as '20080627'.",
         },
+        "tab": TAB_INPUT,
     }
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
-    def forward(self, url, date) -> str:
+    def forward(self, url, date, tab: Optional[str] = None) -> str:
         no_timestamp_url = f"https://archive.org/wayback/available?url={url}"
         archive_url = no_timestamp_url + f"&timestamp={date}"
-        response = requests.get(archive_url).json()
-        response_notimestamp = requests.get(no_timestamp_url).json()
+        response = self.browser.session.get(archive_url).json()
+        response_notimestamp = self.browser.session.get(no_timestamp_url).json()
         if "archived_snapshots" in response and "closest" in response["archived_snapshots"]:
             closest = response["archived_snapshots"]["closest"]
             logger.info(f"Archive found! {closest}")
@@ -496,56 +1206,45 @@ class ArchiveSearchTool(Tool):
         )
 
 
-class PageUpTool(Tool):
+class PageUpTool(BrowserTool):
     name = "page_up"
     description = "Scroll the viewport UP one page-length in the current webpage and return the new viewport content."
-    inputs = {}
+    inputs = {"tab": TAB_INPUT}
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
-    def forward(self) -> str:
+    def forward(self, tab: Optional[str] = None) -> str:
         self.browser.page_up()
         header, content = self.browser._state()
         return header.strip() + "\n=======================\n" + content
 
 
-class PageDownTool(Tool):
+class PageDownTool(BrowserTool):
     name = "page_down"
     description = (
         "Scroll the viewport DOWN one page-length in the current webpage and return the new viewport content."
     )
-    inputs = {}
+    inputs = {"tab": TAB_INPUT}
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
-    def forward(self) -> str:
+    def forward(self, tab: Optional[str] = None) -> str:
         self.browser.page_down()
         header, content = self.browser._state()
         return header.strip() + "\n=======================\n" + content
 
 
-class FinderTool(Tool):
+class FinderTool(BrowserTool):
     name = "find_on_page_ctrl_f"
     description = "Scroll the viewport to the first occurrence of the search string. This is equivalent to Ctrl+F."
     inputs = {
         "search_string": {
             "type": "string",
             "description": "The string to search for on the page. This search string supports wildcards like '*'",
-        }
+        },
+        "tab": TAB_INPUT,
     }
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
-    def forward(self, search_string: str) -> str:
+    def forward(self, search_string: str, tab: Optional[str] = None) -> str:
         find_result = self.browser.find_on_page(search_string)
         header, content = self.browser._state()
 
@@ -558,17 +1257,44 @@ class FinderTool(Tool):
             return header.strip() + "\n=======================\n" + content
 
 
-class FindNextTool(Tool):
+class RelevantSectionTool(BrowserTool):
+    name = "find_relevant_section"
+    description = (
+        "Rank all pages of the current (long) document by relevance to a question or topic and scroll the viewport to the best one. "
+        "Use this instead of paging down repeatedly when looking for a specific section."
+    )
+    inputs = {
+        "query": {
+            "type": "string",
+            "description": "What you are looking for, in natural language or as keywords.",
+        },
+        "top_k": {
+            "type": "integer",
+            "description": "How many of the best matching pages to list. Defaults to 3.",
+            "nullable": True,
+        },
+        "tab": TAB_INPUT,
+    }
+    output_type = "string"
+
+    def forward(self, query: str, top_k: Optional[int] = None, tab: Optional[str] = None) -> str:
+        best = self.browser.find_relevant(query, top_k=top_k or 3)
+        header, content = self.browser._state()
+
+        if not best:
+            return header.strip() + f"\n=======================\nNo section of this page matches '{query}'."
+        ranking = ", ".join(f"page {i + 1} (score {score:.2f})" for i, score in best)
+        header += f"Most relevant pages for '{query}': {ranking}. Showing the best one.\n"
+        return header.strip() + "\n=======================\n" + content
+
+
+class FindNextTool(BrowserTool):
     name = "find_next"
     description = "Scroll the viewport to next occurrence of the search string. This is equivalent to finding the next match in a Ctrl+F search."
-    inputs = {}
+    inputs = {"tab": TAB_INPUT}
     output_type = "string"
 
-    def __init__(self, browser):
-        super().__init__()
-        self.browser = browser
-
-    def forward(self) -> str:
+    def forward(self, tab: Optional[str] = None) -> str:
         find_result = self.browser.find_next()
         header, content = self.browser._state()
 
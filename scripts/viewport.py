@@ -0,0 +1,164 @@
+"""Pagination of page text into viewports.
+
+A page is cut every ``viewport_size`` characters, moved forward to just after the next
+whitespace so that words are not split. The whitespace is found with one compiled regex search
+per page, bounded by ``max_overshoot``, so text without any whitespace (minified scripts,
+extracted PDF garbage) is cut hard instead of being scanned character by character. Boundaries
+are computed only up to the page that is asked for.
+
+The text itself may also arrive lazily: given a ``source`` iterator (e.g. a PDF converted page by
+page), only as much of it is pulled as the requested pages need. A MappedText is paginated in
+place, on its bytes.
+"""
+import bisect
+import re
+import threading
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .mapped_text import MappedText
+
+# Pages are extended by at most this many characters to end on whitespace
+MAX_OVERSHOOT = 2048
+
+_WHITESPACE = re.compile(r"[ \t\r\n]")
+_WHITESPACE_BYTES = re.compile(rb"[ \t\r\n]")
+
+
+class ViewportPages:
+    """Lazily computed ``(start, end)`` bounds of the viewports of a text.
+
+    Behaves like the list of bounds it replaces: ``len()``, indexing (also negative) and
+    iteration. Indexing computes the boundaries up to that page only; ``len()`` needs all of
+    them, which is a single pass of regex searches (and, with a source, the whole text).
+
+    Args:
+        content: The page text, or its beginning if a source follows, or a MappedText (offsets are then bytes).
+        viewport_size: Target number of characters per page; None puts the whole text on one page.
+        max_overshoot: How far a page may be extended to end on whitespace.
+        source: Iterator producing the rest of the text, consumed on demand.
+    """
+
+    def __init__(
+        self,
+        content: Union[str, MappedText],
+        viewport_size: Optional[int] = None,
+        max_overshoot: int = MAX_OVERSHOOT,
+        source: Optional[Iterator[str]] = None,
+    ):
+        self.content = content
+        self.viewport_size = viewport_size
+        self.max_overshoot = max_overshoot
+        self._source = source
+        self._ends: List[int] = []
+        self._complete = False
+        # Cached pages can be shown in several browser tabs at once
+        self._lock = threading.RLock()
+        if source is not None and not viewport_size:
+            self.materialize()
+        if self._source is None and (len(content) == 0 or not viewport_size or viewport_size >= len(content)):
+            # Empty pages still have one (empty) viewport
+            self._ends.append(len(content))
+            self._complete = True
+
+    @property
+    def partial(self) -> bool:
+        """Whether the source may still add text, i.e. the page count is not known yet."""
+        return self._source is not None
+
+    def materialize(self, length: Optional[int] = None) -> None:
+        """Pull text from the source until content has at least length characters (None: all of it)."""
+        if self._source is None or (length is not None and len(self.content) >= length):
+            return
+        with self._lock:
+            self._materialize(length)
+
+    def _materialize(self, length: Optional[int]) -> None:
+        if self._source is None or (length is not None and len(self.content) >= length):
+            return
+        # Grow at least geometrically, so joining the parts stays linear overall
+        target = None if length is None else max(length, 2 * len(self.content))
+        parts = [self.content]
+        size = len(self.content)
+        for chunk in self._source:
+            parts.append(chunk)
+            size += len(chunk)
+            if target is not None and size >= target:
+                break
+        else:
+            self._source = None
+        self.content = "".join(parts)
+
+    def _next_end(self, start: int) -> int:
+        self.materialize(start + self.viewport_size + self.max_overshoot)
+        length = len(self.content)
+        end = start + self.viewport_size
+        if end >= length:
+            return length
+        # Like before: the page ends right after the first whitespace at or after end - 1
+        if isinstance(self.content, MappedText):
+            match = _WHITESPACE_BYTES.search(self.content.buffer, end - 1, min(end - 1 + self.max_overshoot, length))
+        else:
+            match = _WHITESPACE.search(self.content, end - 1, min(end - 1 + self.max_overshoot, length))
+        if match is None:
+            end = min(end - 1 + self.max_overshoot, length)
+            if isinstance(self.content, MappedText):
+                # Never cut a mapped text inside a multi-byte character
+                end = max(self.content.char_boundary(end), start + 1)
+            return end
+        return match.end()
+
+    def _extend(self, index: int) -> bool:
+        """Compute boundaries until page ``index`` exists or the text ends. Returns whether it exists."""
+        if index < len(self._ends) or self._complete:
+            return index < len(self._ends)
+        with self._lock:
+            return self._extend_locked(index)
+
+    def _extend_locked(self, index: int) -> bool:
+        while len(self._ends) <= index and not self._complete:
+            start = self._ends[-1] if self._ends else 0
+            end = self._next_end(start)
+            if end == start and self._ends:
+                # The source ran dry exactly at the end of the last page
+                self._complete = True
+                break
+            self._ends.append(end)
+            if end >= len(self.content) and self._source is None:
+                self._complete = True
+        return index < len(self._ends)
+
+    def has_page(self, index: int) -> bool:
+        return index >= 0 and self._extend(index)
+
+    def page_of(self, offset: int) -> int:
+        """Index of the page containing the character at offset (the last page for offsets past the end)."""
+        while not self._complete and (not self._ends or self._ends[-1] <= offset):
+            self._extend(len(self._ends) + 64)
+        return min(bisect.bisect_right(self._ends, offset), len(self._ends) - 1)
+
+    @property
+    def computed(self) -> int:
+        """Number of pages whose bounds have been computed so far."""
+        return len(self._ends)
+
+    def __len__(self) -> int:
+        while not self._complete:
+            self._extend(len(self._ends) + 1024)
+        return len(self._ends)
+
+    def __getitem__(self, index: int) -> Tuple[int, int]:
+        if index < 0:
+            index += len(self)
+        if index < 0 or not self._extend(index):
+            raise IndexError("viewport page index out of range")
+        return (self._ends[index - 1] if index > 0 else 0, self._ends[index])
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        index = 0
+        while self.has_page(index):
+            yield self[index]
+            index += 1
+
+    def __repr__(self) -> str:
+        state = "complete" if self._complete else "partial"
+        return f"ViewportPages({len(self._ends)} pages computed, {state}{', text partial' if self.partial else ''})"
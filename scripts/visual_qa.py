@@ -7,7 +7,6 @@ from io import BytesIO
 from typing import Optional
 from loguru import logger
 
-import requests
 from dotenv import load_dotenv
 from huggingface_hub import InferenceClient
 from PIL import Image
@@ -15,6 +14,8 @@ from transformers import AutoProcessor
 
 from smolagents import Tool, tool
 
+from .http_pool import DEFAULT_USER_AGENT, get_session
+
 
 load_dotenv(override=True)
 
@@ -69,14 +70,13 @@ def process_images_and_text(image_path, query, client):
 # Function to encode the image
 def encode_image(image_path):
     if image_path.startswith("http"):
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
         request_kwargs = {
-            "headers": {"User-Agent": user_agent},
+            "headers": {"User-Agent": DEFAULT_USER_AGENT},
             "stream": True,
         }
 
         # Send a HTTP request to the URL
-        response = requests.get(image_path, **request_kwargs)
+        response = get_session().get(image_path, **request_kwargs)
         response.raise_for_status()
         content_type = response.headers.get("content-type", "")
 
@@ -180,7 +180,7 @@ def visualizer(image_path: str, question: Optional[str] = None) -> str:
         ],
         "max_tokens": 1000,
     }
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+    response = get_session().post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
     try:
         output = response.json()["choices"][0]["message"]["content"]
     except Exception: